@@ -1,9 +1,12 @@
-from django.contrib import admin
-from django.utils.html import format_html
+from django import forms
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.admin import AdminSite
-from django.urls import path
-from django.shortcuts import render
+from django.contrib.admin.views.main import IS_POPUP_VAR
+from django.core.exceptions import ValidationError
+from django.urls import path, reverse
+from django.conf import settings
+from django.shortcuts import redirect, render
 from django.db.models import Sum
 from .models import (
     CustomUser,
@@ -18,7 +21,9 @@ from .models import (
     ConsumoProduto,
     CategoriaDespesa,
 )
-from . import views as admin_views
+from .invalidacao import invalidar
+from .paginacao import TabelaGrandeMixin
+from . import exportacao, imagens, instrumentacao, views as admin_views
 
 
 # ===========================
@@ -33,6 +38,14 @@ class CustomAdminSite(AdminSite):
         urls = super().get_urls()
         custom_urls = [
             path('', self.admin_view(self.custom_index), name='index'),
+            # p50/p95/p99 por endpoint (amostras deste processo)
+            path('instrumentacao/', self.admin_view(self.instrumentacao), name='instrumentacao'),
+            # Bundle: vários gráficos em um único request (?charts=a,b,c)
+            path('dashboard/bundle/',
+                 self.admin_view(admin_views.dashboard_bundle), name='dashboard_bundle'),
+            # Variantes assíncronas (ASGI): a checagem de staff fica na própria view
+            path('dashboard/async/bundle/', admin_views.dashboard_bundle_async, name='dashboard_bundle_async'),
+            path('dashboard/async/<slug:nome>-json/', admin_views.grafico_json_async, name='grafico_json_async'),
             # URLs JSON para os gráficos
             path('dashboard/agendamentos-por-tratamento-json/', 
                  self.admin_view(admin_views.agendamentos_por_tratamento), name='agendamentos_por_tratamento_json'),
@@ -96,10 +109,25 @@ class CustomAdminSite(AdminSite):
             self.each_context(request),
             despesas_em_aberto=despesas_em_aberto,
             receitas=receitas_recebidas,
-            caixa=caixa_atual
+            caixa=caixa_atual,
+            # sob ASGI o dashboard usa o bundle assíncrono
+            url_bundle=reverse(f"{self.name}:{'dashboard_bundle_async' if settings.DASHBOARD_ASYNC else 'dashboard_bundle'}"),
         )
         return render(request, 'admin/index.html', context)
 
+    def instrumentacao(self, request):
+        if request.method == 'POST':
+            instrumentacao.amostras.limpar()
+            return redirect(request.path)
+        context = dict(
+            self.each_context(request),
+            title='Desempenho por endpoint',
+            linhas=instrumentacao.amostras.resumo(),
+            amostragem=settings.INSTRUMENTACAO_AMOSTRAGEM,
+            limite_lento_ms=settings.INSTRUMENTACAO_LIMITE_LENTO_MS,
+        )
+        return render(request, 'admin/instrumentacao.html', context)
+
 
 # ===========================
 # Instância da AdminSite customizada
@@ -107,6 +135,67 @@ class CustomAdminSite(AdminSite):
 custom_admin_site = CustomAdminSite(name='custom_admin')
 
 
+# ===========================
+# Autocomplete (FKs com muitas linhas)
+# ===========================
+class AutocompleteMixin:
+    """
+    Rótulos de autocomplete a partir de uma única consulta: `campos_rotulo` são as
+    colunas usadas no __str__ e `relacionados_rotulo` os FKs que ele percorre (JOIN).
+    Vale para o endpoint de busca (já paginado pelo Django) e para a opção
+    selecionada nos formulários que apontam para este model.
+    """
+    campos_rotulo = None
+    relacionados_rotulo = ()
+
+    def queryset_rotulo(self, queryset):
+        if self.relacionados_rotulo:
+            queryset = queryset.select_related(*self.relacionados_rotulo)
+        return queryset.only(*self.campos_rotulo) if self.campos_rotulo else queryset
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if request.path.endswith('/autocomplete/'):
+            queryset = self.queryset_rotulo(queryset)
+        return queryset, may_have_duplicates
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # FK em autocomplete_fields: o rótulo da opção já selecionada também vem enxuto
+        relacionado = self.admin_site._registry.get(db_field.remote_field.model)
+        if db_field.name in self.get_autocomplete_fields(request) and isinstance(relacionado, AutocompleteMixin):
+            kwargs.setdefault('queryset', relacionado.queryset_rotulo(relacionado.get_queryset(request)))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+# ===========================
+# Exportação (CSV/XLSX em streaming)
+# ===========================
+class ExportacaoMixin:
+    """Ações de exportação dos itens selecionados (com "selecionar todos", tudo o que está filtrado)."""
+    nome_exportacao = None
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        if IS_POPUP_VAR in request.GET or not self.has_view_permission(request):
+            return actions
+        for nome in ('exportar_csv', 'exportar_xlsx'):
+            funcao, nome, descricao = self.get_action(nome)
+            actions[nome] = (funcao, nome, descricao)
+        return actions
+
+    def _exportar(self, queryset, formato):
+        definicao = exportacao.EXPORTACOES[self.nome_exportacao]
+        return exportacao.resposta(definicao, definicao.filtrar(queryset), formato)
+
+    @admin.action(description='Exportar selecionados (CSV)')
+    def exportar_csv(self, request, queryset):
+        return self._exportar(queryset, 'csv')
+
+    @admin.action(description='Exportar selecionados (Excel)')
+    def exportar_xlsx(self, request, queryset):
+        return self._exportar(queryset, 'xlsx')
+
+
 # ===========================
 # Admins dos Models
 # ===========================
@@ -115,7 +204,10 @@ class CustomUserAdmin(UserAdmin):
 
     def profile_picture_tag(self, obj):
         if obj.profile_picture:
-            return format_html('<img src="{}" width="40" height="40" style="border-radius:50%;" />', obj.profile_picture.url)
+            return imagens.imagem(
+                obj.profile_picture, sizes='40px', width=40, height=40,
+                style='border-radius:50%;object-fit:cover;', alt='',
+            )
         return "-"
     profile_picture_tag.short_description = 'Foto'
 
@@ -124,60 +216,148 @@ class CustomUserAdmin(UserAdmin):
     add_fieldsets = UserAdmin.add_fieldsets + (('Informações adicionais', {'fields': ('profile_picture',)}),)
 
 
-class ClienteAdmin(admin.ModelAdmin):
+class ClienteAdminForm(forms.ModelForm):
+    def clean(self):
+        dados = super().clean()
+        # chave_contato não está no formulário: sem isto a unique_cliente_contato viraria erro 500
+        chave = Cliente.normalizar_chave_contato(dados.get('telefone'), dados.get('email'))
+        if chave and Cliente.objects.filter(chave_contato=chave).exclude(pk=self.instance.pk).exists():
+            raise ValidationError("Já existe um cliente com este telefone e e-mail.")
+        return dados
+
+
+class ClienteAdmin(AutocompleteMixin, admin.ModelAdmin):
+    form = ClienteAdminForm
     list_display = ('nome', 'telefone', 'email')
     search_fields = ('nome', 'telefone', 'email')
+    ordering = ('nome',)
+    campos_rotulo = ('id', 'nome')
 
 
-class TratamentoAdmin(admin.ModelAdmin):
-    list_display = ('nome_tratamento', 'tipo_tratamento', 'duracao', 'preco')
+class TratamentoAdmin(AutocompleteMixin, admin.ModelAdmin):
+    list_display = ('nome_tratamento', 'tipo_tratamento', 'duracao', 'preco', 'destaque', 'ordem_destaque')
+    list_editable = ('destaque', 'ordem_destaque')
     search_fields = ('nome_tratamento',)
-    list_filter = ('tipo_tratamento',)
+    ordering = ('nome_tratamento',)
+    campos_rotulo = ('id', 'nome_tratamento')
+    list_filter = ('tipo_tratamento', 'destaque')
+    actions = ['marcar_destaque', 'remover_destaque']
+
+    # update() não dispara signals: a versão de Tratamento (cache da home) é invalidada aqui
+    @admin.action(description='Mostrar na home (destaque)')
+    def marcar_destaque(self, request, queryset):
+        atualizados = queryset.update(destaque=True)
+        invalidar(Tratamento)
+        self.message_user(request, f"{atualizados} tratamento(s) em destaque.", messages.SUCCESS)
+
+    @admin.action(description='Remover da home (destaque)')
+    def remover_destaque(self, request, queryset):
+        atualizados = queryset.update(destaque=False)
+        invalidar(Tratamento)
+        self.message_user(request, f"{atualizados} tratamento(s) removido(s) do destaque.", messages.SUCCESS)
 
 
 # Inline para registrar consumos diretamente no Agendamento
-class ConsumoProdutoInline(admin.TabularInline):
+class ConsumoProdutoInline(AutocompleteMixin, admin.TabularInline):
     model = ConsumoProduto
     extra = 1
     autocomplete_fields = ['produto']  # opcional: facilita seleção do produto no admin
 
+    def get_queryset(self, request):
+        # só as colunas exibidas no inline; o nome do produto vem no mesmo JOIN
+        return super().get_queryset(request).select_related('produto').only(
+            'id', 'agendamento_id', 'quantidade', 'produto__id', 'produto__nome'
+        )
+
 
-class AgendamentoAdmin(admin.ModelAdmin):
+class AgendamentoAdmin(TabelaGrandeMixin, ExportacaoMixin, AutocompleteMixin, admin.ModelAdmin):
     list_display = ('cliente', 'tratamento', 'data', 'hora', 'tipo_agendamento', 'status')
-    list_filter = ('data', 'tipo_agendamento', 'status')
+    list_filter = ('tipo_agendamento', 'status')
+    date_hierarchy = 'data'
     search_fields = ('cliente__nome', 'tratamento__nome_tratamento')
+    list_select_related = ('cliente', 'tratamento')
+    autocomplete_fields = ('cliente', 'tratamento')
+    # Agendamento.__str__: cliente, tratamento, data e hora no mesmo JOIN
+    campos_rotulo = ('id', 'data', 'hora', 'cliente__nome', 'tratamento__nome_tratamento')
+    relacionados_rotulo = ('cliente', 'tratamento')
+    nome_exportacao = 'agendamentos'
     inlines = [ConsumoProdutoInline]  # agora é possível cadastrar consumos diretamente
-
-
-class ReceitaAdmin(admin.ModelAdmin):
+    actions = ['concluir_agendamentos']
+
+    @admin.action(description='Concluir agendamentos selecionados (descontar estoque)')
+    def concluir_agendamentos(self, request, queryset):
+        try:
+            concluidos, falhas = Agendamento.concluir_em_lote(list(queryset.values_list('id', flat=True)))
+        except ValidationError as erro:
+            self.message_user(request, ' '.join(erro.messages), messages.ERROR)
+            return
+        if concluidos:
+            self.message_user(request, f"{len(concluidos)} agendamento(s) concluído(s) e estoque atualizado!", messages.SUCCESS)
+        for agendamento_id, erro in falhas.items():
+            self.message_user(request, f"Agendamento {agendamento_id}: {erro}", messages.ERROR)
+
+
+class ReceitaAdmin(ExportacaoMixin, AutocompleteMixin, admin.ModelAdmin):
     list_display = ('descricao', 'valor', 'data_recebimento', 'forma_pagamento')
     list_filter = ('forma_pagamento', 'data_recebimento')
     search_fields = ('descricao',)
+    list_select_related = ('agendamento__cliente',)  # usado por Receita.__str__
+    autocomplete_fields = ('agendamento',)
+    nome_exportacao = 'receitas'
 
 
-class DespesaAdmin(admin.ModelAdmin):
+class DespesaAdmin(ExportacaoMixin, admin.ModelAdmin):
     list_display = ('nome_despesa', 'valor', 'data_vencimento', 'categoria')
     list_filter = ('categoria', 'data_vencimento')
     search_fields = ('nome_despesa',)
+    list_select_related = ('categoria',)
+    nome_exportacao = 'despesas'
 
 class CategoriaDespesaAdmin(admin.ModelAdmin):
     list_display = ('nome',)
     search_fields = ('nome',)
 
 class CaixaAdmin(admin.ModelAdmin):
-    list_display = ('ano', 'mes', 'total_receitas', 'total_despesas', 'saldo')
-
-
-class ProdutoAdmin(admin.ModelAdmin):
+    list_display = ('ano', 'mes', 'total_receitas', 'total_despesas', 'saldo', 'calculado_em', 'fechado')
+    list_filter = ('fechado', 'ano')
+    readonly_fields = ('receitas_total', 'despesas_total', 'calculado_em')
+    actions = ['recalcular_mes', 'fechar_mes']
+
+    @admin.action(description='Recalcular mês (reconciliar com Receitas/Despesas)')
+    def recalcular_mes(self, request, queryset):
+        recalculados = sum(1 for caixa in queryset if caixa.recalcular())
+        ignorados = queryset.count() - recalculados
+        self.message_user(request, f"{recalculados} caixa(s) recalculado(s).", messages.SUCCESS)
+        if ignorados:
+            self.message_user(request, f"{ignorados} caixa(s) fechado(s) não foram alterados.", messages.WARNING)
+
+    @admin.action(description='Fechar mês (congelar totais)')
+    def fechar_mes(self, request, queryset):
+        abertos = queryset.filter(fechado=False)
+        for caixa in abertos:
+            caixa.recalcular()
+        atualizados = abertos.update(fechado=True)
+        self.message_user(request, f"{atualizados} caixa(s) fechado(s).", messages.SUCCESS)
+        ja_fechados = queryset.count() - atualizados
+        if ja_fechados:
+            self.message_user(request, f"{ja_fechados} caixa(s) já estavam fechados.", messages.WARNING)
+
+
+class ProdutoAdmin(AutocompleteMixin, admin.ModelAdmin):
     list_display = ('nome', 'marca', 'preco_venda', 'data_validade', 'quantidade_estoque')
     list_filter = ('marca',)
     search_fields = ('nome', 'marca')
+    ordering = ('nome',)
+    campos_rotulo = ('id', 'nome')
 
 
-class MovimentacaoEstoqueAdmin(admin.ModelAdmin):
+class MovimentacaoEstoqueAdmin(TabelaGrandeMixin, ExportacaoMixin, admin.ModelAdmin):
     list_display = ('produto', 'tipo', 'quantidade', 'motivo', 'data')
-    list_filter = ('tipo', 'data')
+    list_filter = ('tipo',)
+    date_hierarchy = 'data'
+    nome_exportacao = 'movimentacoes'
     search_fields = ('produto__nome', 'motivo')
+    list_select_related = ('produto',)
 
 
 # ===========================
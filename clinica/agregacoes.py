@@ -0,0 +1,65 @@
+from datetime import date, datetime, time
+
+from dateutil.relativedelta import relativedelta
+from django.db import models
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+# =============================
+# Séries mensais para os gráficos do dashboard
+# =============================
+def ultimos_meses(quantidade, referencia=None):
+    """Primeiro dia de cada um dos últimos `quantidade` meses de calendário (o mais antigo primeiro)."""
+    referencia = (referencia or date.today()).replace(day=1)
+    return [referencia - relativedelta(months=i) for i in range(quantidade - 1, -1, -1)]
+
+
+def rotulos_meses(meses):
+    return [m.strftime("%b/%Y") for m in meses]
+
+
+def serie_mensal(queryset, campo_data, meses, **agregacoes):
+    """
+    Agrega `queryset` por mês de `campo_data` em UMA query (TruncMonth + GROUP BY)
+    e devolve {nome_agregacao: [valor_mes_1, ..., valor_mes_n]}, preenchendo com 0
+    os meses sem movimento. `agregacoes` aceita Sum/Count com `filter=Q(...)`.
+    """
+    if not meses:
+        return {nome: [] for nome in agregacoes}
+
+    inicio = meses[0]
+    fim = meses[-1] + relativedelta(months=1)
+    if isinstance(queryset.model._meta.get_field(campo_data), models.DateTimeField):
+        # limites no fuso local, coerentes com o TruncMonth
+        inicio = timezone.make_aware(datetime.combine(inicio, time.min))
+        fim = timezone.make_aware(datetime.combine(fim, time.min))
+    linhas = (
+        queryset
+        .filter(**{f'{campo_data}__gte': inicio, f'{campo_data}__lt': fim})
+        .annotate(mes=TruncMonth(campo_data))
+        .values('mes')
+        .annotate(**agregacoes)
+        .order_by('mes')
+    )
+
+    por_mes = {}
+    for linha in linhas:
+        mes = linha['mes']
+        if isinstance(mes, datetime):
+            mes = mes.date()
+        por_mes[mes] = linha
+
+    return {
+        nome: [(por_mes.get(m) or {}).get(nome) or 0 for m in meses]
+        for nome in agregacoes
+    }
+
+
+def acumular(valores):
+    total = 0
+    acumulado = []
+    for valor in valores:
+        total += valor
+        acumulado.append(total)
+    return acumulado
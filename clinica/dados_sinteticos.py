@@ -0,0 +1,281 @@
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Max
+from django.utils import timezone
+
+from .invalidacao import invalidar
+from .models import (
+    DURACAO_CHOICES, Agendamento, Caixa, CategoriaDespesa, Cliente, ConsumoProduto, Despesa,
+    FormaPagamento, MovimentacaoEstoque, Produto, Receita, TiposTratamentos, Tratamento,
+)
+
+
+# =============================
+# Dados sintéticos (benchmarks e ambientes de teste)
+# =============================
+# Tudo com bulk_create em lotes: save() e signals não rodam, então os campos
+# calculados (chave_contato, inicio/fim) são preenchidos aqui e, no fim, as
+# versões de cache são trocadas e os Caixas dos meses tocados recalculados.
+
+TRATAMENTOS = 40
+PRODUTOS = 60
+CATEGORIAS = ['Aluguel', 'Energia', 'Água', 'Internet', 'Insumos', 'Marketing', 'Salários', 'Impostos']
+MESES_CAIXA = 36
+DIAS_HISTORICO = 3 * 365
+
+# janela diária da agenda sintética: longe da meia-noite, onde caíam as mudanças de horário de verão
+ABERTURA = time(7, 0)
+FECHAMENTO = time(21, 0)
+
+NOMES = ['Ana', 'Beatriz', 'Camila', 'Daniela', 'Eduarda', 'Fernanda', 'Gabriela', 'Helena', 'Isabela', 'Juliana',
+         'Larissa', 'Mariana', 'Natália', 'Patrícia', 'Rafaela', 'Sofia', 'Tatiane', 'Vanessa', 'Carlos', 'Pedro']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Almeida', 'Ribeiro', 'Haddad']
+
+
+@contextmanager
+def sem_auto_now_add(modelo, campo):
+    """Permite gravar datas passadas em um campo auto_now_add durante a carga."""
+    field = modelo._meta.get_field(campo)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def ultimo_dia_livre(hoje):
+    """Dia a partir do qual (para trás) a agenda está vazia: não colide com agendamentos existentes."""
+    primeiro = Agendamento.objects.order_by('data').values_list('data', flat=True).first()
+    dia = hoje + timedelta(days=30)
+    return min(dia, primeiro - timedelta(days=1)) if primeiro else dia
+
+
+def _lotes(total, tamanho):
+    for inicio in range(0, total, tamanho):
+        yield range(inicio, min(inicio + tamanho, total))
+
+
+class Gerador:
+    """
+    Gera `agendamentos` agendamentos e o resto do schema em proporção: um cliente
+    para cada 4 agendamentos, consumos/saídas de estoque e receita para cada
+    agendamento concluído, despesas e entradas de estoque avulsas.
+
+    A agenda não admite sobreposição, então os agendamentos ficam em sequência
+    (do futuro próximo, ou de antes do agendamento mais antigo, para trás);
+    volumes grandes cobrem muitos anos.
+    """
+
+    def __init__(self, agendamentos, chunk_size=5000, semente=42, log=None):
+        self.total_agendamentos = agendamentos
+        self.chunk_size = chunk_size
+        self.aleatorio = random.Random(semente)
+        self.log = log or (lambda mensagem: None)
+        self.hoje = timezone.localdate()
+        self.contagens = {}
+        self.meses = set()  # (ano, mes) com receitas recebidas ou despesas pagas geradas
+
+    def gerar(self):
+        self.gerar_cadastros()
+        self.gerar_clientes()
+        self.gerar_agendamentos()
+        self.gerar_despesas()
+        self.gerar_entradas_estoque()
+        self.gerar_caixas()
+        invalidar(
+            Tratamento, Produto, CategoriaDespesa, Cliente, Agendamento, ConsumoProduto,
+            MovimentacaoEstoque, Receita, Despesa,
+        )
+        return self.contagens
+
+    def _contar(self, modelo, quantidade):
+        nome = str(modelo._meta.verbose_name_plural)
+        self.contagens[nome] = self.contagens.get(nome, 0) + quantidade
+
+    def _data_aware(self, dia, hora=time(12)):
+        return timezone.make_aware(datetime.combine(dia, hora))
+
+    def _dia_passado(self):
+        return self.hoje - timedelta(days=self.aleatorio.randrange(DIAS_HISTORICO))
+
+    def _valor(self, minimo=50, maximo=2000):
+        return Decimal(self.aleatorio.randint(minimo * 100, maximo * 100)) / 100
+
+    # -----------------------------
+    # Cadastros básicos
+    # -----------------------------
+    def gerar_cadastros(self):
+        tipos = [valor for valor, _ in TiposTratamentos.choices]
+        duracoes = [minutos for minutos, _ in DURACAO_CHOICES if minutos <= 120]
+        self.tratamentos = Tratamento.objects.bulk_create([
+            Tratamento(
+                nome_tratamento=f'Tratamento {i + 1}', tipo_tratamento=self.aleatorio.choice(tipos),
+                duracao=self.aleatorio.choice(duracoes), preco=self._valor(150, 3000),
+                descricao=f'Descrição do tratamento {i + 1}', destaque=i < 7, ordem_destaque=i,
+            )
+            for i in range(TRATAMENTOS)
+        ])
+        self.produtos = Produto.objects.bulk_create([
+            Produto(
+                nome=f'Produto {i + 1}', marca=f'Marca {i % 7 + 1}', preco_custo=self._valor(10, 300),
+                preco_venda=self._valor(300, 900), quantidade_estoque=self.aleatorio.randint(0, 500),
+                estoque_minimo=self.aleatorio.randint(5, 50),
+            )
+            for i in range(PRODUTOS)
+        ])
+        self.categorias = CategoriaDespesa.objects.bulk_create([CategoriaDespesa(nome=nome) for nome in CATEGORIAS])
+        self._contar(Tratamento, len(self.tratamentos))
+        self._contar(Produto, len(self.produtos))
+        self._contar(CategoriaDespesa, len(self.categorias))
+
+    def gerar_clientes(self):
+        total = max(1, self.total_agendamentos // 4)
+        # numeração depois do maior id: rodar de novo num banco já populado não repete
+        # contatos (unique_cliente_contato); os que ainda assim existirem são pulados
+        inicio = Cliente.objects.aggregate(maior=Max('id'))['maior'] or 0
+        self.clientes = []
+        with sem_auto_now_add(Cliente, 'created_at'):
+            for lote in _lotes(total, self.chunk_size):
+                clientes = {}
+                for i in lote:
+                    telefone = f'119{inicio + i:08d}'
+                    email = f'cliente{inicio + i}@exemplo.com'
+                    chave = Cliente.normalizar_chave_contato(telefone, email)
+                    clientes[chave] = Cliente(
+                        nome=f'{self.aleatorio.choice(NOMES)} {self.aleatorio.choice(SOBRENOMES)}',
+                        telefone=telefone, email=email, chave_contato=chave,
+                        dt_nascimento=self.hoje - timedelta(days=self.aleatorio.randint(18 * 365, 70 * 365)),
+                        created_at=self._data_aware(self._dia_passado()),
+                    )
+                for chave in Cliente.objects.filter(chave_contato__in=clientes).values_list('chave_contato', flat=True):
+                    del clientes[chave]
+                self.clientes.extend(c.pk for c in Cliente.objects.bulk_create(clientes.values()))
+        self._contar(Cliente, len(self.clientes))
+        self.log(f"Clientes: {len(self.clientes)}")
+
+    # -----------------------------
+    # Agenda (com consumos, saídas de estoque e receitas)
+    # -----------------------------
+    def _horarios(self):
+        """(data, hora, tratamento) em sequência, sem sobreposição, do futuro para o passado."""
+        dia = ultimo_dia_livre(self.hoje)
+        cursor = datetime.combine(dia, FECHAMENTO)
+        while True:
+            tratamento = self.aleatorio.choice(self.tratamentos)
+            cursor -= tratamento.duracao_agendamento
+            if cursor.time() < ABERTURA or cursor.date() != dia:
+                dia -= timedelta(days=1)
+                cursor = datetime.combine(dia, FECHAMENTO) - tratamento.duracao_agendamento
+            yield cursor.date(), cursor.time(), tratamento
+
+    def _status(self, dia):
+        sorteio = self.aleatorio.random()
+        if dia >= self.hoje:
+            return 'CONFIRMADO' if sorteio < 0.6 else 'PENDENTE' if sorteio < 0.9 else 'CANCELADO'
+        return 'CONCLUIDO' if sorteio < 0.8 else 'CANCELADO' if sorteio < 0.95 else 'CONFIRMADO'
+
+    def gerar_agendamentos(self):
+        horarios = self._horarios()
+        formas = [valor for valor, _ in FormaPagamento.choices]
+        with sem_auto_now_add(MovimentacaoEstoque, 'data'):
+            for lote in _lotes(self.total_agendamentos, self.chunk_size):
+                agendamentos = []
+                for _ in lote:
+                    dia, hora, tratamento = next(horarios)
+                    status = self._status(dia)
+                    agendamento = Agendamento(
+                        cliente_id=self.aleatorio.choice(self.clientes), tratamento=tratamento, data=dia, hora=hora,
+                        tipo_agendamento=self.aleatorio.choice(['AVALIACAO', 'PROCEDIMENTO']),
+                        status=status, estoque_descontado=status == 'CONCLUIDO',
+                    )
+                    agendamento.calcular_intervalo()
+                    agendamentos.append(agendamento)
+                Agendamento.objects.bulk_create(agendamentos)
+
+                consumos, saidas, receitas = [], [], []
+                for agendamento in agendamentos:
+                    if agendamento.status != 'CONCLUIDO':
+                        continue
+                    for produto in self.aleatorio.sample(self.produtos, self.aleatorio.randint(1, 2)):
+                        quantidade = self.aleatorio.randint(1, 3)
+                        consumos.append(ConsumoProduto(agendamento=agendamento, produto=produto, quantidade=quantidade))
+                        saidas.append(MovimentacaoEstoque(
+                            produto=produto, tipo='SAIDA', quantidade=quantidade, data=agendamento.inicio,
+                            motivo=f'Consumo no agendamento #{agendamento.pk}',
+                        ))
+                    receita = Receita(
+                        agendamento=agendamento, valor=agendamento.tratamento.preco,
+                        forma_pagamento=self.aleatorio.choice(formas), recebido=self.aleatorio.random() < 0.9,
+                        data_recebimento=agendamento.data,
+                    )
+                    if receita.recebido:
+                        self.meses.add((receita.data_recebimento.year, receita.data_recebimento.month))
+                    receitas.append(receita)
+                ConsumoProduto.objects.bulk_create(consumos)
+                MovimentacaoEstoque.objects.bulk_create(saidas)
+                Receita.objects.bulk_create(receitas)
+
+                self._contar(Agendamento, len(agendamentos))
+                self._contar(ConsumoProduto, len(consumos))
+                self._contar(MovimentacaoEstoque, len(saidas))
+                self._contar(Receita, len(receitas))
+                self.log(f"Agendamentos: {lote.stop}/{self.total_agendamentos}")
+
+    # -----------------------------
+    # Financeiro e estoque avulsos
+    # -----------------------------
+    def gerar_despesas(self):
+        total = max(1, self.total_agendamentos // 10)
+        for lote in _lotes(total, self.chunk_size):
+            despesas = []
+            for i in lote:
+                vencimento = self._dia_passado()
+                pago = vencimento < self.hoje and self.aleatorio.random() < 0.85
+                despesas.append(Despesa(
+                    nome_despesa=f'Despesa {i + 1}', categoria=self.aleatorio.choice(self.categorias),
+                    valor=self._valor(30, 5000), data_vencimento=vencimento, pago=pago,
+                    data_pagamento=vencimento if pago else None,
+                ))
+                if pago:
+                    self.meses.add((vencimento.year, vencimento.month))
+            Despesa.objects.bulk_create(despesas)
+        self._contar(Despesa, total)
+        self.log(f"Despesas: {total}")
+
+    def gerar_entradas_estoque(self):
+        total = max(1, self.total_agendamentos // 20)
+        with sem_auto_now_add(MovimentacaoEstoque, 'data'):
+            for lote in _lotes(total, self.chunk_size):
+                MovimentacaoEstoque.objects.bulk_create([
+                    MovimentacaoEstoque(
+                        produto=self.aleatorio.choice(self.produtos), tipo='ENTRADA',
+                        quantidade=self.aleatorio.randint(10, 100), motivo='Compra',
+                        data=self._data_aware(self._dia_passado()),
+                    )
+                    for _ in lote
+                ])
+        self._contar(MovimentacaoEstoque, total)
+
+    def gerar_caixas(self):
+        # poucos meses: cada Caixa novo calcula os totais no save()
+        mes = self.hoje.replace(day=1)
+        criados = set()
+        for i in range(MESES_CAIXA):
+            referencia = mes - relativedelta(months=i)
+            caixa, criado = Caixa.objects.get_or_create(ano=referencia.year, mes=referencia.month)
+            if criado:
+                criados.add(caixa.pk)
+        # os que já existiam não viram os bulk_create (sem signals): reconcilia os meses tocados
+        for caixa in Caixa.objects.filter(fechado=False).exclude(pk__in=criados):
+            if (caixa.ano, caixa.mes) in self.meses:
+                caixa.recalcular()
+        self._contar(Caixa, len(criados))
+
+
+def gerar(agendamentos, chunk_size=5000, semente=42, log=None):
+    """Gera o volume pedido e devolve {nome do model: linhas criadas}."""
+    return Gerador(agendamentos, chunk_size=chunk_size, semente=semente, log=log).gerar()
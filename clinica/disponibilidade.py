@@ -0,0 +1,142 @@
+import datetime
+
+from django.utils import timezone
+
+from . import invalidacao
+from .models import Agendamento, Tratamento, DURACAO_MINIMA_AGENDAMENTO
+
+
+# =============================
+# Horário de funcionamento
+# =============================
+# weekday() -> (primeiro início, último início permitido). Domingo fechado.
+HORARIO_FUNCIONAMENTO = {
+    0: (datetime.time(10, 0), datetime.time(18, 0)),  # Segunda
+    1: (datetime.time(10, 0), datetime.time(18, 0)),
+    2: (datetime.time(10, 0), datetime.time(18, 0)),
+    3: (datetime.time(10, 0), datetime.time(18, 0)),
+    4: (datetime.time(10, 0), datetime.time(18, 0)),  # Sexta
+    5: (datetime.time(12, 0), datetime.time(16, 0)),  # Sábado
+}
+
+# granularidade dos horários oferecidos (todas as durações são múltiplas de 30 min)
+INTERVALO_SLOTS = datetime.timedelta(minutes=30)
+
+
+# limite de dias por consulta de disponibilidade
+MAX_DIAS_CONSULTA = 62
+
+# os horários livres ficam em cache até o próximo Agendamento/Tratamento salvo ou excluído
+CACHE_TIMEOUT = 60
+
+
+def versao_cache():
+    return invalidacao.versoes(Agendamento, Tratamento)
+
+
+class HorarioIndisponivel(Exception):
+    """O horário pedido foi ocupado (ex.: por uma reserva concorrente)."""
+
+    def __init__(self, data_hora, tratamento):
+        super().__init__("Horário indisponível.")
+        self.data_hora = data_hora
+        self.tratamento = tratamento
+
+
+def dentro_do_expediente(data_hora):
+    expediente = HORARIO_FUNCIONAMENTO.get(data_hora.weekday())
+    if expediente is None:
+        return False
+    abertura, fechamento = expediente
+    return abertura <= data_hora.time() <= fechamento
+
+
+def hora_local(data_hora):
+    """Agendamentos guardam data/hora locais ingênuas; normaliza datetimes aware para isso."""
+    if timezone.is_aware(data_hora):
+        return timezone.localtime(data_hora).replace(tzinfo=None)
+    return data_hora
+
+
+def duracao_tratamento(tratamento):
+    if tratamento is None:
+        return DURACAO_MINIMA_AGENDAMENTO
+    return tratamento.duracao_agendamento
+
+
+def ocupacoes(inicio, fim, excluir_id=None):
+    """
+    Intervalos ocupados entre as datas `inicio` e `fim` (inclusive) em UMA query
+    sobre o índice (inicio, fim): {data: [(inicio, fim), ...]} com datetimes locais ingênuos.
+    Agendamentos cancelados não ocupam horário.
+    """
+    comeco = timezone.make_aware(datetime.datetime.combine(inicio, datetime.time.min))
+    termino = timezone.make_aware(datetime.datetime.combine(fim + datetime.timedelta(days=1), datetime.time.min))
+    agendamentos = Agendamento.sobrepostos(comeco, termino)
+    if excluir_id:
+        agendamentos = agendamentos.exclude(pk=excluir_id)
+
+    por_dia = {}
+    for ocupado_inicio, ocupado_fim in agendamentos.values_list('inicio', 'fim'):
+        ocupado_inicio, ocupado_fim = hora_local(ocupado_inicio), hora_local(ocupado_fim)
+        por_dia.setdefault(ocupado_inicio.date(), []).append((ocupado_inicio, ocupado_fim))
+    return por_dia
+
+
+def _conflita(comeco, termino, ocupados):
+    return any(comeco < fim_ocupado and inicio_ocupado < termino for inicio_ocupado, fim_ocupado in ocupados)
+
+
+def horario_disponivel(data_hora, tratamento, excluir_id=None):
+    """True se `data_hora` (ingênuo em hora local, ou aware) não sobrepõe nenhum agendamento."""
+    if timezone.is_naive(data_hora):
+        data_hora = timezone.make_aware(data_hora)
+    conflitos = Agendamento.sobrepostos(data_hora, data_hora + duracao_tratamento(tratamento))
+    if excluir_id:
+        conflitos = conflitos.exclude(pk=excluir_id)
+    return not conflitos.exists()
+
+
+def horarios_livres(inicio, fim, tratamento, agora=None):
+    """
+    Horários de início livres para `tratamento` entre as datas `inicio` e `fim` (inclusive):
+    {data: [time, ...]}. Considera o expediente, a duração do tratamento e a duração
+    de cada agendamento existente (sobreposição de intervalos, não só hora exata).
+    """
+    duracao = duracao_tratamento(tratamento)
+    ocupados_por_dia = ocupacoes(inicio, fim)
+
+    livres = {}
+    dia = inicio
+    while dia <= fim:
+        expediente = HORARIO_FUNCIONAMENTO.get(dia.weekday())
+        if expediente is not None:
+            abertura, fechamento = expediente
+            slot = datetime.datetime.combine(dia, abertura)
+            ultimo = datetime.datetime.combine(dia, fechamento)
+            ocupados = ocupados_por_dia.get(dia, [])
+            horarios = []
+            while slot <= ultimo:
+                if (agora is None or slot > agora) and not _conflita(slot, slot + duracao, ocupados):
+                    horarios.append(slot.time())
+                slot += INTERVALO_SLOTS
+            livres[dia] = horarios
+        dia += datetime.timedelta(days=1)
+    return livres
+
+
+
+def proximos_horarios_livres(data_hora, tratamento, quantidade=5, dias=7):
+    """Sugestões de horários livres a partir de `data_hora`, para quando o horário pedido foi ocupado."""
+    data_hora = hora_local(data_hora)
+    agora = hora_local(timezone.now())
+    livres = horarios_livres(data_hora.date(), data_hora.date() + datetime.timedelta(days=dias), tratamento, agora=agora)
+    sugestoes = []
+    for dia in sorted(livres):
+        for hora in livres[dia]:
+            candidato = datetime.datetime.combine(dia, hora)
+            if candidato >= data_hora:
+                sugestoes.append(candidato)
+                if len(sugestoes) >= quantidade:
+                    return sugestoes
+    return sugestoes
@@ -0,0 +1,324 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Agendamento, Despesa, MovimentacaoEstoque, Receita
+
+
+# =============================
+# Exportações (contabilidade)
+# =============================
+# Cada exportação é um values_list com as colunas do relatório (nomes de cliente,
+# tratamento etc. no mesmo JOIN) percorrido com iterator(chunk_size): a memória
+# fica no tamanho de um lote, seja qual for o número de linhas. O período filtra
+# a coluna de data indexada de cada tabela.
+CHUNK_SIZE = 2000
+
+
+class Exportacao:
+    def __init__(self, nome, modelo, campo_data, colunas):
+        self.nome = nome
+        self.modelo = modelo
+        self.campo_data = campo_data
+        self.titulos = [titulo for titulo, _ in colunas]
+        self.caminhos = [caminho for _, caminho in colunas]
+
+    def _campo(self, caminho):
+        modelo = self.modelo
+        *relacoes, nome = caminho.split('__')
+        for relacao in relacoes:
+            modelo = modelo._meta.get_field(relacao).related_model
+        return modelo._meta.get_field(nome)
+
+    def filtrar(self, queryset=None, inicio=None, fim=None):
+        """Período [inicio, fim] (datas, inclusive) na coluna de data, em ordem de data."""
+        queryset = self.modelo.objects.all() if queryset is None else queryset
+        campo = self._campo(self.campo_data)
+        if campo.get_internal_type() == 'DateTimeField':
+            # faixa de datetimes em vez de __date: o índice da coluna continua utilizável
+            inicio = inicio and timezone.make_aware(datetime.combine(inicio, time.min))
+            fim = fim and timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min))
+            if inicio:
+                queryset = queryset.filter(**{f'{self.campo_data}__gte': inicio})
+            if fim:
+                queryset = queryset.filter(**{f'{self.campo_data}__lt': fim})
+        else:
+            if inicio:
+                queryset = queryset.filter(**{f'{self.campo_data}__gte': inicio})
+            if fim:
+                queryset = queryset.filter(**{f'{self.campo_data}__lte': fim})
+        return queryset.order_by(self.campo_data, 'pk')
+
+    def linhas(self, queryset, chunk_size=CHUNK_SIZE):
+        """Tuplas já com os rótulos dos choices, lidas em lotes de `chunk_size`."""
+        rotulos = {}
+        for posicao, caminho in enumerate(self.caminhos):
+            campo = self._campo(caminho)
+            if campo.choices:
+                rotulos[posicao] = dict(campo.flatchoices)
+
+        for linha in queryset.values_list(*self.caminhos).iterator(chunk_size=chunk_size):
+            if rotulos:
+                linha = list(linha)
+                for posicao, choices in rotulos.items():
+                    linha[posicao] = choices.get(linha[posicao], linha[posicao])
+            yield linha
+
+
+EXPORTACOES = {
+    exportacao.nome: exportacao for exportacao in [
+        Exportacao('receitas', Receita, 'data_recebimento', [
+            ('ID', 'id'),
+            ('Data de recebimento', 'data_recebimento'),
+            ('Descrição', 'descricao'),
+            ('Cliente', 'agendamento__cliente__nome'),
+            ('Tratamento', 'agendamento__tratamento__nome_tratamento'),
+            ('Forma de pagamento', 'forma_pagamento'),
+            ('Recebido', 'recebido'),
+            ('Valor', 'valor'),
+        ]),
+        Exportacao('despesas', Despesa, 'data_vencimento', [
+            ('ID', 'id'),
+            ('Vencimento', 'data_vencimento'),
+            ('Pagamento', 'data_pagamento'),
+            ('Despesa', 'nome_despesa'),
+            ('Categoria', 'categoria__nome'),
+            ('Fornecedor', 'fornecedor'),
+            ('Pago', 'pago'),
+            ('Valor', 'valor'),
+        ]),
+        Exportacao('agendamentos', Agendamento, 'data', [
+            ('ID', 'id'),
+            ('Data', 'data'),
+            ('Horário', 'hora'),
+            ('Cliente', 'cliente__nome'),
+            ('Telefone', 'cliente__telefone'),
+            ('Tratamento', 'tratamento__nome_tratamento'),
+            ('Tipo', 'tipo_agendamento'),
+            ('Status', 'status'),
+            ('Preço', 'tratamento__preco'),
+        ]),
+        Exportacao('movimentacoes', MovimentacaoEstoque, 'data', [
+            ('ID', 'id'),
+            ('Data', 'data'),
+            ('Produto', 'produto__nome'),
+            ('Marca', 'produto__marca'),
+            ('Tipo', 'tipo'),
+            ('Quantidade', 'quantidade'),
+            ('Motivo', 'motivo'),
+        ]),
+    ]
+}
+
+
+# =============================
+# CSV (Excel em português: ';', vírgula decimal, dd/mm/aaaa)
+# =============================
+LINHAS_POR_PEDACO = 500
+
+
+class _Eco:
+    """Pseudo-arquivo do csv.writer: devolve a linha em vez de guardá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+# Textos vêm também do formulário público (nome do cliente, observações): começando com
+# = + - @ tab ou CR, a planilha que abre o CSV os trataria como fórmula. O apóstrofo na frente faz o
+# Excel/LibreOffice mostrar o texto como está (recomendação da OWASP para CSV injection).
+_INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _neutralizar(texto):
+    return "'" + texto if texto.startswith(_INICIO_FORMULA) else texto
+
+
+def _celula_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'Sim' if valor else 'Não'
+    if isinstance(valor, Decimal):
+        return f'{valor:.2f}'.replace('.', ',')
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).strftime('%d/%m/%Y %H:%M')
+    if isinstance(valor, date):
+        return valor.strftime('%d/%m/%Y')
+    if isinstance(valor, time):
+        return valor.strftime('%H:%M')
+    if isinstance(valor, str):
+        return _neutralizar(valor)
+    return valor
+
+
+def gerar_csv(titulos, linhas):
+    escritor = csv.writer(_Eco(), delimiter=';')
+    pedaco = ['\ufeff' + escritor.writerow(titulos)]  # BOM: o Excel reconhece o UTF-8
+    for linha in linhas:
+        pedaco.append(escritor.writerow([_celula_csv(valor) for valor in linha]))
+        if len(pedaco) >= LINHAS_POR_PEDACO:
+            yield ''.join(pedaco).encode('utf-8')
+            pedaco = []
+    yield ''.join(pedaco).encode('utf-8')
+
+
+# =============================
+# XLSX (SpreadsheetML gerado em streaming)
+# =============================
+# O .xlsx é um zip de XMLs. O zip é escrito num buffer sem seek (o zipfile usa
+# data descriptors) e esvaziado a cada pedaço, então nada se acumula em memória.
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{nome}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+# estilos de célula (índice = atributo s): 1 data, 2 data e hora, 3 hora, 4 valor com 2 casas
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="3"><numFmt numFmtId="164" formatCode="dd/mm/yyyy"/>'
+    '<numFmt numFmtId="165" formatCode="dd/mm/yyyy hh:mm"/><numFmt numFmtId="166" formatCode="hh:mm"/></numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="5"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="166" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '</styleSheet>'
+)
+_INICIO_PLANILHA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_FIM_PLANILHA = '</sheetData></worksheet>'
+
+_EPOCA_EXCEL = datetime(1899, 12, 30)
+_CARACTERES_INVALIDOS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _Buffer(io.RawIOBase):
+    """Destino do zip sem seek: acumula os bytes até o próximo `retirar()`."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def retirar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+
+def _texto(valor):
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_CARACTERES_INVALIDOS.sub("", str(valor)))}</t></is></c>'
+
+
+def _celula_xlsx(valor):
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, bool):
+        return _texto('Sim' if valor else 'Não')
+    if isinstance(valor, Decimal):
+        return f'<c s="4"><v>{valor}</v></c>'
+    if isinstance(valor, (int, float)):
+        return f'<c><v>{valor}</v></c>'
+    if isinstance(valor, datetime):
+        dias = (timezone.localtime(valor).replace(tzinfo=None) - _EPOCA_EXCEL) / timedelta(days=1)
+        return f'<c s="2"><v>{dias:.6f}</v></c>'
+    if isinstance(valor, date):
+        return f'<c s="1"><v>{(valor - _EPOCA_EXCEL.date()).days}</v></c>'
+    if isinstance(valor, time):
+        fracao = (valor.hour * 3600 + valor.minute * 60 + valor.second) / 86400
+        return f'<c s="3"><v>{fracao:.6f}</v></c>'
+    # inlineStr nunca é avaliado como fórmula: o texto vai como está (sem o apóstrofo do CSV)
+    return _texto(valor)
+
+
+def _linha_xlsx(celulas):
+    return '<row>' + ''.join(celulas) + '</row>'
+
+
+def gerar_xlsx(titulos, linhas, nome_planilha='Exportação'):
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo:
+        arquivo.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        arquivo.writestr('_rels/.rels', _RELS)
+        arquivo.writestr('xl/workbook.xml', _WORKBOOK.format(nome=escape(nome_planilha[:31])))
+        arquivo.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        arquivo.writestr('xl/styles.xml', _STYLES)
+        with arquivo.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as planilha:
+            planilha.write((_INICIO_PLANILHA + _linha_xlsx(_texto(titulo) for titulo in titulos)).encode('utf-8'))
+            pedaco = []
+            for linha in linhas:
+                pedaco.append(_linha_xlsx(_celula_xlsx(valor) for valor in linha))
+                if len(pedaco) >= LINHAS_POR_PEDACO:
+                    planilha.write(''.join(pedaco).encode('utf-8'))
+                    pedaco = []
+                    yield buffer.retirar()
+            planilha.write((''.join(pedaco) + _FIM_PLANILHA).encode('utf-8'))
+    yield buffer.retirar()
+
+
+# =============================
+# Saída
+# =============================
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def gerar(exportacao, queryset, formato, chunk_size=CHUNK_SIZE):
+    """Bytes do arquivo, em pedaços, prontos para um StreamingHttpResponse ou um arquivo."""
+    linhas = exportacao.linhas(queryset, chunk_size)
+    if formato == 'xlsx':
+        return gerar_xlsx(exportacao.titulos, linhas, str(exportacao.modelo._meta.verbose_name_plural))
+    return gerar_csv(exportacao.titulos, linhas)
+
+
+def resposta(exportacao, queryset, formato, nome_arquivo=None):
+    nome_arquivo = nome_arquivo or f'{exportacao.nome}-{timezone.localdate().isoformat()}.{formato}'
+    response = StreamingHttpResponse(gerar(exportacao, queryset, formato), content_type=CONTENT_TYPES[formato])
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return response
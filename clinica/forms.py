@@ -1,7 +1,7 @@
 from django import forms
 from .models import Agendamento, Cliente, Tratamento
+from .disponibilidade import HORARIO_FUNCIONAMENTO, horario_disponivel
 from django.utils import timezone
-import datetime
 
 class ClienteForm(forms.ModelForm):
     class Meta:
@@ -58,14 +58,14 @@ class AgendamentoForm(forms.ModelForm):
         dia_semana = data_hora.weekday()
         hora = data_hora.time()
 
-        if dia_semana >= 0 and dia_semana <= 4:  # Segunda a Sexta
-            if not (hora >= datetime.time(10, 0) and hora <= datetime.time(18, 0)):
-                raise forms.ValidationError("Horário fora do expediente (10:00 às 18:00, segunda a sexta).")
-        elif dia_semana == 5:  # Sábado
-            if not (hora >= datetime.time(12, 0) and hora <= datetime.time(16, 0)):
-                raise forms.ValidationError("Horário fora do expediente (12:00 às 16:00, sábado).")
-        else:
+        if dia_semana not in HORARIO_FUNCIONAMENTO:
             raise forms.ValidationError("Agendamento não permitido neste dia.")
+        abertura, fechamento = HORARIO_FUNCIONAMENTO[dia_semana]
+        if not (hora >= abertura and hora <= fechamento):
+            dias = "segunda a sexta" if dia_semana <= 4 else "sábado"
+            raise forms.ValidationError(
+                f"Horário fora do expediente ({abertura:%H:%M} às {fechamento:%H:%M}, {dias})."
+            )
 
         return data_hora
 
@@ -74,11 +74,7 @@ class AgendamentoForm(forms.ModelForm):
         tratamento = cleaned_data.get('tratamento')
         data_hora = cleaned_data.get('data_hora')
         if tratamento and data_hora:
-            conflito = Agendamento.objects.filter(
-                tratamento=tratamento,
-                data=data_hora.date(),
-                hora=data_hora.time()
-            ).exists()
-            if conflito:
-                raise forms.ValidationError("Já existe um agendamento neste horário para este tratamento.")
+            # considera a duração dos tratamentos, não só o mesmo horário exato
+            if not horario_disponivel(data_hora, tratamento):
+                raise forms.ValidationError("Já existe um agendamento neste horário.", code='horario_indisponivel')
         return cleaned_data
@@ -0,0 +1,366 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Sum, Count, F, Q
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, ExtractYear
+
+from . import invalidacao
+from .agregacoes import ultimos_meses, rotulos_meses, serie_mensal, acumular
+from .models import (
+    Agendamento, Tratamento, Cliente, Receita, Despesa, CategoriaDespesa,
+    Produto, MovimentacaoEstoque
+)
+
+
+# =============================
+# Consultas compartilhadas
+# =============================
+class ContextoGraficos:
+    """
+    Guarda as consultas que mais de um gráfico lê, para que um mesmo request
+    (ex.: o bundle do dashboard) execute cada uma apenas uma vez.
+    """
+
+    def __init__(self, request=None):
+        self.request = request
+        self.meses = ultimos_meses(12)
+        self._memo = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _memoizar(self, chave, calcular):
+        # na variante assíncrona vários gráficos rodam em threads ao mesmo tempo:
+        # o lock por chave garante que a consulta compartilhada rode uma vez só
+        with self._lock:
+            lock = self._locks.setdefault(chave, threading.Lock())
+        with lock:
+            if chave not in self._memo:
+                self._memo[chave] = calcular()
+        return self._memo[chave]
+
+    def agendamentos_por_tratamento(self):
+        return self._memoizar('agendamentos_por_tratamento', lambda: list(
+            Agendamento.objects.values('tratamento__nome_tratamento')
+            .annotate(count=Count('id'))
+            .order_by('-count')
+        ))
+
+    def receitas_por_mes(self):
+        return self._memoizar('receitas_por_mes', lambda: serie_mensal(
+            Receita.objects.all(), 'data_recebimento', self.meses,
+            recebidas=Sum('valor', filter=Q(recebido=True)),
+            a_receber=Sum('valor', filter=Q(recebido=False)),
+        ))
+
+    def despesas_por_mes(self):
+        return self._memoizar('despesas_por_mes', lambda: serie_mensal(
+            Despesa.objects.all(), 'data_vencimento', self.meses,
+            total=Sum('valor'),
+            pagas=Sum('valor', filter=Q(pago=True)),
+        ))
+
+    def produtos_estoque_baixo(self):
+        return self._memoizar('produtos_estoque_baixo', lambda: list(
+            Produto.objects.filter(quantidade_estoque__lte=F('estoque_minimo'))
+            .values('nome', 'quantidade_estoque')
+        ))
+
+
+def _ultimos(serie, quantidade):
+    return serie[-quantidade:]
+
+
+# =============================
+# Agendamentos
+# =============================
+def agendamentos_por_tratamento(ctx):
+    data = ctx.agendamentos_por_tratamento()
+    return {
+        'labels': [item['tratamento__nome_tratamento'] for item in data],
+        'counts': [item['count'] for item in data],
+    }
+
+
+def agendamentos_por_periodo(ctx, periodo='dia'):
+    if periodo == 'dia':
+        trunc = TruncDay('data')
+    elif periodo == 'semana':
+        trunc = TruncWeek('data')
+    else:
+        trunc = TruncMonth('data')
+
+    data = Agendamento.objects.annotate(period=trunc) \
+        .values('period') \
+        .annotate(count=Count('id')) \
+        .order_by('period')
+    return {
+        'labels': [item['period'].strftime('%d/%m/%Y') for item in data],
+        'counts': [item['count'] for item in data],
+    }
+
+
+def clientes_com_mais_agendamentos(ctx):
+    data = Agendamento.objects.values('cliente__nome') \
+        .annotate(count=Count('id')) \
+        .order_by('-count')[:10]
+    return {
+        'labels': [item['cliente__nome'] for item in data],
+        'counts': [item['count'] for item in data],
+    }
+
+
+def top_tratamentos_por_cliente(ctx):
+    data = ctx.agendamentos_por_tratamento()[:10]
+    return {
+        'labels': [a['tratamento__nome_tratamento'] for a in data],
+        'counts': [a['count'] for a in data],
+    }
+
+
+def agendamentos_trend(ctx):
+    serie = serie_mensal(Agendamento.objects.all(), 'data', ctx.meses, count=Count('id'))
+    return {'labels': rotulos_meses(ctx.meses), 'counts': serie['count']}
+
+
+def taxa_cancelamento(ctx):
+    totais = Agendamento.objects.aggregate(
+        total=Count('id'),
+        cancelados=Count('id', filter=Q(status='CANCELADO')),
+    )
+    return {
+        'labels': ['Cancelados', 'Ativos'],
+        'percentuais': [totais['cancelados'], totais['total'] - totais['cancelados']],
+    }
+
+
+# =============================
+# Financeiro
+# =============================
+def receitas_despesas_por_mes(ctx):
+    receitas = ctx.receitas_por_mes()
+    despesas = ctx.despesas_por_mes()
+    return {
+        'labels': _ultimos(rotulos_meses(ctx.meses), 6),
+        'receitas': _ultimos([r + a for r, a in zip(receitas['recebidas'], receitas['a_receber'])], 6),
+        'despesas': _ultimos(despesas['total'], 6),
+    }
+
+
+def receita_acumulada_vs_despesa(ctx):
+    mensal = receitas_despesas_por_mes(ctx)
+    return {
+        'labels': mensal['labels'],
+        'receitas': acumular(mensal['receitas']),
+        'despesas': acumular(mensal['despesas']),
+    }
+
+
+def despesas_por_categoria(ctx):
+    data = Despesa.objects.values('categoria__nome').annotate(total=Sum('valor'))
+    return {
+        'labels': [item['categoria__nome'] for item in data],
+        'totals': [item['total'] for item in data],
+    }
+
+
+def receitas_por_tipo_pagamento(ctx):
+    data = Receita.objects.values('forma_pagamento').annotate(total=Sum('valor'))
+    return {
+        'labels': [item['forma_pagamento'] for item in data],
+        'totals': [item['total'] for item in data],
+    }
+
+
+def receitas_vs_a_receber(ctx):
+    receitas = ctx.receitas_por_mes()
+    return {
+        'labels': rotulos_meses(ctx.meses),
+        'recebidas': receitas['recebidas'],
+        'a_receber': receitas['a_receber'],
+    }
+
+
+def saldo_caixa(ctx):
+    receitas = ctx.receitas_por_mes()
+    despesas = ctx.despesas_por_mes()
+    return {
+        'labels': rotulos_meses(ctx.meses),
+        'saldos': [r - d for r, d in zip(receitas['recebidas'], despesas['pagas'])],
+    }
+
+
+# =============================
+# Estoque & Produtos
+# =============================
+def movimentacao_estoque(ctx):
+    meses = _ultimos(ctx.meses, 6)
+    serie = serie_mensal(
+        MovimentacaoEstoque.objects.all(), 'data', meses,
+        entradas=Sum('quantidade', filter=Q(tipo='ENTRADA')),
+        saidas=Sum('quantidade', filter=Q(tipo='SAIDA')),
+    )
+    return {'labels': rotulos_meses(meses), 'entradas': serie['entradas'], 'saidas': serie['saidas']}
+
+
+def produtos_estoque_baixo(ctx):
+    produtos = ctx.produtos_estoque_baixo()
+    return {
+        'labels': [p['nome'] for p in produtos],
+        'quantidades': [p['quantidade_estoque'] for p in produtos],
+    }
+
+
+def produtos_criticos(ctx):
+    produtos = ctx.produtos_estoque_baixo()[:10]  # top 10
+    return {
+        'labels': [p['nome'] for p in produtos],
+        'counts': [p['quantidade_estoque'] for p in produtos],
+    }
+
+
+# =============================
+# Clientes
+# =============================
+def clientes_por_idade(ctx):
+    hoje = date.today()
+    clientes = Cliente.objects.annotate(
+        idade=hoje.year - ExtractYear('dt_nascimento')
+    ).values('idade').annotate(count=Count('id')).order_by('idade')
+    return {
+        'labels': [c['idade'] for c in clientes],
+        'counts': [c['count'] for c in clientes],
+    }
+
+
+def novos_clientes_mes(ctx):
+    serie = serie_mensal(Cliente.objects.all(), 'created_at', ctx.meses, count=Count('id'))
+    return {'labels': rotulos_meses(ctx.meses), 'counts': serie['count']}
+
+
+# Nome usado no bundle (mesmo slug das URLs dashboard/<nome>-json/) -> função
+GRAFICOS = {
+    'agendamentos-por-tratamento': agendamentos_por_tratamento,
+    'agendamentos-por-periodo': agendamentos_por_periodo,
+    'clientes-mais-agendamentos': clientes_com_mais_agendamentos,
+    'receitas-despesas-por-mes': receitas_despesas_por_mes,
+    'receita-acumulada-vs-despesa': receita_acumulada_vs_despesa,
+    'despesas-por-categoria': despesas_por_categoria,
+    'receitas-por-tipo-pagamento': receitas_por_tipo_pagamento,
+    'movimentacao-estoque': movimentacao_estoque,
+    'produtos-estoque-baixo': produtos_estoque_baixo,
+    'clientes-por-idade': clientes_por_idade,
+    'novos-clientes-mes': novos_clientes_mes,
+    'top-tratamentos-por-cliente': top_tratamentos_por_cliente,
+    'agendamentos-trend': agendamentos_trend,
+    'receitas-vs-a-receber': receitas_vs_a_receber,
+    'saldo-caixa': saldo_caixa,
+    'produtos-criticos': produtos_criticos,
+    'taxa-cancelamento': taxa_cancelamento,
+}
+
+# Models que cada gráfico lê: salvar/excluir qualquer um deles invalida o gráfico
+DEPENDENCIAS = {
+    'agendamentos-por-tratamento': (Agendamento, Tratamento),
+    'agendamentos-por-periodo': (Agendamento,),
+    'clientes-mais-agendamentos': (Agendamento, Cliente),
+    'receitas-despesas-por-mes': (Receita, Despesa),
+    'receita-acumulada-vs-despesa': (Receita, Despesa),
+    'despesas-por-categoria': (Despesa, CategoriaDespesa),
+    'receitas-por-tipo-pagamento': (Receita,),
+    'movimentacao-estoque': (MovimentacaoEstoque,),
+    'produtos-estoque-baixo': (Produto,),
+    'clientes-por-idade': (Cliente,),
+    'novos-clientes-mes': (Cliente,),
+    'top-tratamentos-por-cliente': (Agendamento, Tratamento),
+    'agendamentos-trend': (Agendamento,),
+    'receitas-vs-a-receber': (Receita,),
+    'saldo-caixa': (Receita, Despesa),
+    'produtos-criticos': (Produto,),
+    'taxa-cancelamento': (Agendamento,),
+}
+
+
+# =============================
+# Cache dos gráficos
+# =============================
+# A chave inclui o dia (as séries são relativas a hoje) e a versão dos models
+# de que o gráfico depende, então nunca é servido um dado desatualizado; o
+# timeout só limita o espaço ocupado por versões antigas.
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _chave_cache(nome, parametros, versoes):
+    extras = ''.join(f":{k}={v}" for k, v in sorted(parametros.items()))
+    return f"grafico:{nome}:{date.today().isoformat()}:{versoes}{extras}"
+
+
+def _consultar_cache(nomes, parametros):
+    """({nome: chave}, {chave: dados em cache}) com uma ida ao cache para as versões e outra para os dados."""
+    modelos = list(dict.fromkeys(m for nome in nomes for m in DEPENDENCIAS[nome]))
+    versoes = dict(zip(modelos, invalidacao.versoes(*modelos).split(';')))
+    chaves = {
+        nome: _chave_cache(nome, parametros, ';'.join(versoes[m] for m in DEPENDENCIAS[nome]))
+        for nome in nomes
+    }
+    return chaves, cache.get_many(chaves.values())
+
+
+def obter_varios(nomes, ctx, **parametros):
+    """
+    Dados dos gráficos `nomes` ({nome: dados}), lidos do cache em uma única ida
+    (get_many); só os ausentes são calculados, compartilhando o mesmo `ctx`.
+    """
+    nomes = list(dict.fromkeys(nomes))
+    chaves, em_cache = _consultar_cache(nomes, parametros)
+    calculados = {
+        chaves[nome]: GRAFICOS[nome](ctx, **parametros)
+        for nome in nomes if chaves[nome] not in em_cache
+    }
+    if calculados:
+        cache.set_many(calculados, CACHE_TIMEOUT)
+        em_cache.update(calculados)
+    return {nome: em_cache[chaves[nome]] for nome in nomes}
+
+
+def obter(nome, ctx, **parametros):
+    return obter_varios([nome], ctx, **parametros)[nome]
+
+
+# =============================
+# Variante assíncrona (ASGI)
+# =============================
+# Os gráficos ausentes do cache são calculados ao mesmo tempo, cada um numa
+# thread de um pool limitado (DASHBOARD_THREADS) com a própria conexão ao banco.
+_pool = None
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=settings.DASHBOARD_THREADS, thread_name_prefix='graficos')
+    return _pool
+
+
+def _calcular(nome, ctx, parametros):
+    close_old_connections()  # as threads do pool vivem fora do ciclo request/response
+    return GRAFICOS[nome](ctx, **parametros)
+
+
+async def obter_varios_async(nomes, ctx, **parametros):
+    """Mesmo resultado de obter_varios, com os gráficos ausentes do cache calculados em paralelo."""
+    nomes = list(dict.fromkeys(nomes))
+    chaves, em_cache = await sync_to_async(_consultar_cache)(nomes, parametros)
+    faltando = [nome for nome in nomes if chaves[nome] not in em_cache]
+    if faltando:
+        calcular = sync_to_async(_calcular, thread_sensitive=False, executor=_executor())
+        resultados = await asyncio.gather(*(calcular(nome, ctx, parametros) for nome in faltando))
+        calculados = {chaves[nome]: dados for nome, dados in zip(faltando, resultados)}
+        await cache.aset_many(calculados, CACHE_TIMEOUT)
+        em_cache.update(calculados)
+    return {nome: em_cache[chaves[nome]] for nome in nomes}
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from PIL import Image, ImageOps, features
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+# =============================
+# Derivadas de imagens (WebP/AVIF redimensionadas)
+# =============================
+# Cada imagem gera versões menores em WebP e AVIF, gravadas em
+# derivadas/<hash do conteúdo>/<largura>.<formato>: o mesmo arquivo nunca é
+# processado duas vezes e o nome muda quando o conteúdo muda (cache eterno no
+# navegador). A descrição das variantes ({largura, altura, variantes}) fica em
+# um índice lido pelas tags {% imagem %} e {% fontes %}, que montam o srcset.
+PASTA = 'derivadas'
+LARGURAS = (160, 320, 640, 960, 1280, 1920)
+LARGURAS_AVATAR = (80, 160, 320)
+EXTENSOES = ('.jpg', '.jpeg', '.png')
+# AVIF primeiro: na <picture> o navegador usa a primeira fonte que suporta
+OPCOES_FORMATO = {
+    'avif': {'quality': 55, 'speed': 6},
+    'webp': {'quality': 80, 'method': 5},
+}
+TIPOS = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+def formatos():
+    """Formatos que o Pillow instalado sabe gravar (AVIF depende do build)."""
+    return [formato for formato in OPCOES_FORMATO if features.check(formato)]
+
+
+def _preparar(imagem):
+    imagem = ImageOps.exif_transpose(imagem)  # foto de celular "deitada" pelo EXIF
+    if imagem.mode in ('RGB', 'RGBA'):
+        return imagem
+    transparente = 'A' in imagem.getbands() or 'transparency' in imagem.info
+    return imagem.convert('RGBA' if transparente else 'RGB')
+
+
+def gerar(conteudo, storage, larguras=LARGURAS):
+    """Grava as variantes de `conteudo` (bytes) em `storage` e devolve a descrição."""
+    pasta = f'{PASTA}/{hashlib.sha256(conteudo).hexdigest()[:16]}'
+    indice = f'{pasta}/indice.json'
+    if storage.exists(indice):
+        with storage.open(indice) as arquivo:
+            descricao = json.load(arquivo)
+        if set(descricao['variantes']) >= set(formatos()):
+            return descricao
+
+    with Image.open(BytesIO(conteudo)) as original:
+        imagem = _preparar(original)
+        largura, altura = imagem.size
+        # nunca amplia: acima da largura original vale a própria largura (se couber na lista)
+        tamanhos = [tamanho for tamanho in larguras if tamanho < largura]
+        if largura <= larguras[-1] or not tamanhos:
+            tamanhos.append(largura)
+
+        variantes = {formato: [] for formato in formatos()}
+        for tamanho in sorted(tamanhos, reverse=True):
+            if tamanho != largura:
+                # reducing_gap: reduz em passos inteiros antes do Lanczos (bem mais rápido em fotos grandes)
+                imagem = imagem.resize(
+                    (tamanho, max(1, round(altura * tamanho / largura))), Image.Resampling.LANCZOS, reducing_gap=3.0
+                )
+            for formato, lista in variantes.items():
+                nome = f'{pasta}/{tamanho}.{formato}'
+                if not storage.exists(nome):
+                    saida = BytesIO()
+                    imagem.save(saida, formato.upper(), **OPCOES_FORMATO[formato])
+                    storage.save(nome, ContentFile(saida.getvalue()))
+                lista.insert(0, [tamanho, nome])
+
+    descricao = {'largura': largura, 'altura': altura, 'variantes': variantes}
+    storage.delete(indice)
+    storage.save(indice, ContentFile(json.dumps(descricao).encode()))
+    return descricao
+
+
+# -----------------------------
+# Uploads (media): índice por nome do arquivo enviado
+# -----------------------------
+def _indice_arquivo(nome):
+    return f'{PASTA}/origens/{nome}.json'
+
+
+def gerar_arquivo(arquivo, larguras=LARGURAS):
+    """Gera as derivadas de um FieldFile no mesmo storage e registra o nome de origem."""
+    arquivo.open('rb')
+    try:
+        descricao = gerar(arquivo.read(), arquivo.storage, larguras)
+    finally:
+        arquivo.close()
+    indice = _indice_arquivo(arquivo.name)
+    arquivo.storage.delete(indice)
+    arquivo.storage.save(indice, ContentFile(json.dumps(descricao).encode()))
+    cache.set(f'imagens:{arquivo.name}', descricao, 86400)
+    return descricao
+
+
+def descricao_arquivo(arquivo):
+    """Descrição das derivadas de um FieldFile, ou None se ainda não foram geradas."""
+    chave = f'imagens:{arquivo.name}'
+    descricao = cache.get(chave)
+    if descricao is None:
+        indice = _indice_arquivo(arquivo.name)
+        if not arquivo.storage.exists(indice):
+            return None
+        with arquivo.storage.open(indice) as conteudo:
+            descricao = json.load(conteudo)
+        cache.set(chave, descricao, 86400)
+    return descricao
+
+
+# -----------------------------
+# Arquivos estáticos: geradas no collectstatic, índice único em STATIC_ROOT
+# -----------------------------
+INDICE_ESTATICOS = f'{PASTA}/estaticos.json'
+
+
+def _storage_estaticos():
+    # storage simples sobre STATIC_ROOT: as derivadas já têm o hash no caminho e
+    # não entram no manifest (onde url() recusaria nomes desconhecidos)
+    return FileSystemStorage(location=settings.STATIC_ROOT, base_url=settings.STATIC_URL)
+
+
+def gerar_estaticos(arquivos, storage=None):
+    """Gera as derivadas de [(nome, storage de origem, caminho)] e grava o índice; devolve os nomes tratados."""
+    storage = storage or _storage_estaticos()
+    conteudos = {}
+    for nome, origem, caminho in arquivos:
+        if nome.lower().endswith(EXTENSOES):
+            with origem.open(caminho) as arquivo:
+                conteudos[nome] = arquivo.read()
+    # arquivos iguais com nomes diferentes são processados uma vez só (e sem duas threads no mesmo hash)
+    unicos = {hashlib.sha256(conteudo).digest(): conteudo for conteudo in conteudos.values()}
+
+    # o Pillow libera o GIL ao codificar: threads bastam para usar todos os núcleos
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        descricoes = dict(zip(unicos, executor.map(lambda conteudo: gerar(conteudo, storage), unicos.values())))
+    indice = {nome: descricoes[hashlib.sha256(conteudo).digest()] for nome, conteudo in conteudos.items()}
+    storage.delete(INDICE_ESTATICOS)
+    storage.save(INDICE_ESTATICOS, ContentFile(json.dumps(indice, sort_keys=True).encode()))
+    _indice_estaticos.cache_clear()
+    return list(indice)
+
+
+@lru_cache(maxsize=None)
+def _indice_estaticos():
+    # lido uma vez por processo, como o manifest do staticfiles; sem collectstatic fica vazio
+    caminho = os.path.join(settings.STATIC_ROOT or '', INDICE_ESTATICOS)
+    try:
+        with open(caminho) as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return {}
+
+
+class ImagensStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """Storage do WhiteNoise que também gera as derivadas das imagens no collectstatic."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        arquivos = [(nome, origem, caminho) for nome, (origem, caminho) in paths.items()]
+        for nome in gerar_estaticos(arquivos):
+            yield nome, f'{PASTA}/', True
+
+
+# =============================
+# HTML: <picture> com srcset
+# =============================
+def _resolver(origem):
+    """(url da original, descrição, storage das derivadas) para um caminho estático ou FieldFile."""
+    if isinstance(origem, str):
+        # em DEBUG os estáticos vêm dos finders, não do STATIC_ROOT onde ficam as derivadas
+        descricao = None if settings.DEBUG else _indice_estaticos().get(origem)
+        return static(origem), descricao, _storage_estaticos()
+    return origem.url, descricao_arquivo(origem), origem.storage
+
+
+def _fontes(url, descricao, storage, sizes, media):
+    if descricao is None:
+        return format_html('<source media="{}" srcset="{}">', media, url) if media else ''
+    return format_html_join('', '<source{} type="{}" srcset="{}" sizes="{}">', (
+        (format_html(' media="{}"', media) if media else '', TIPOS[formato],
+         ', '.join(f'{storage.url(nome)} {largura}w' for largura, nome in variantes), sizes)
+        for formato, variantes in descricao['variantes'].items()
+    ))
+
+
+def fontes(origem, sizes='100vw', media=None):
+    """<source> AVIF/WebP da imagem; sem derivadas, só a <source> original quando há `media`."""
+    return _fontes(*_resolver(origem), sizes, media)
+
+
+def imagem(origem, sizes='100vw', **atributos):
+    """<picture> com as derivadas e a original no <img> (navegadores sem AVIF/WebP)."""
+    atributos.setdefault('loading', 'lazy')
+    atributos.setdefault('decoding', 'async')
+    url, descricao, storage = _resolver(origem)
+    return format_html(
+        '<picture>{}<img src="{}"{}></picture>',
+        _fontes(url, descricao, storage, sizes, None),
+        url,
+        format_html_join('', ' {}="{}"', ((nome.replace('_', '-'), valor) for nome, valor in atributos.items())),
+    )
+
+
+def url_avatar(usuario, largura=160):
+    """URL da menor derivada WebP com pelo menos `largura` px da foto do usuário (avatar do Jazzmin)."""
+    foto = usuario.profile_picture
+    if not foto:
+        return static('vendor/adminlte/img/user2-160x160.jpg')
+    descricao = descricao_arquivo(foto)
+    variantes = descricao and descricao['variantes'].get('webp')
+    if not variantes:
+        return foto.url
+    nome = next((nome for tamanho, nome in variantes if tamanho >= largura), variantes[-1][1])
+    return foto.storage.url(nome)
@@ -0,0 +1,450 @@
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .invalidacao import invalidar
+from .models import Agendamento, Cliente, Produto, Tratamento
+
+
+# =============================
+# Importação em lote (CSV do sistema anterior)
+# =============================
+# Cada lote de linhas é validado com as regras dos campos do model, resolve as
+# chaves estrangeiras com um mapa montado em uma consulta por lote e grava com
+# bulk_create/bulk_update pela chave natural (upsert): reimportar o mesmo arquivo
+# atualiza em vez de duplicar. Dentro de um lote, linhas com a mesma chave
+# natural valem pela última.
+
+def _cpf(texto):
+    """CPF validado pelos dígitos verificadores, no formato 000.000.000-00."""
+    digitos = re.sub(r'\D', '', texto)
+    if len(digitos) != 11 or digitos == digitos[0] * 11:
+        raise ValidationError('CPF inválido.')
+    for posicao in (9, 10):
+        soma = sum(int(digito) * peso for digito, peso in zip(digitos, range(posicao + 1, 1, -1)))
+        if (soma * 10 % 11) % 10 != int(digitos[posicao]):
+            raise ValidationError('CPF inválido.')
+    return f'{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}'
+
+
+def _digitos(cpf):
+    return re.sub(r'\D', '', cpf or '')
+
+
+def _formas_cpf(cpfs):
+    """Formatado e só dígitos: o cadastro antigo pode ter qualquer um dos dois."""
+    return set(cpfs) | {_digitos(cpf) for cpf in cpfs}
+
+
+def _normalizar(campo, texto):
+    """Aceita os formatos de planilha (dd/mm/aaaa, 1.234,56, Sim/Não, rótulo do choice)."""
+    tipo = campo.get_internal_type()
+    if tipo == 'DateField' and '/' in texto:
+        try:
+            return datetime.strptime(texto, '%d/%m/%Y').date()
+        except ValueError:
+            raise ValidationError('Data inválida (use dd/mm/aaaa ou aaaa-mm-dd).')
+    if tipo == 'DecimalField' and ',' in texto:
+        try:
+            return Decimal(texto.replace('.', '').replace(',', '.'))
+        except InvalidOperation:
+            raise ValidationError('Valor inválido.')
+    if tipo == 'BooleanField':
+        return texto.lower() in ('1', 'sim', 's', 'true', 'verdadeiro', 'x')
+    if campo.choices:
+        for valor, rotulo in campo.flatchoices:
+            if texto.lower() in (str(valor).lower(), str(rotulo).lower()):
+                return valor
+    return texto
+
+
+def limpar_campo(modelo, nome, texto):
+    """Valor de `texto` para o campo `nome`, validado como no admin (tipo, choices, tamanho, obrigatório); vazio vale o default."""
+    campo = modelo._meta.get_field(nome)
+    texto = (texto or '').strip()
+    if texto:
+        valor = _normalizar(campo, texto)
+    elif campo.has_default():
+        valor = campo.get_default()
+    else:
+        valor = None if campo.null else ''
+    return campo.clean(valor, None)
+
+
+def _mensagem(erro):
+    if hasattr(erro, 'error_dict'):
+        return '; '.join(f"{campo}: {' '.join(mensagens)}" for campo, mensagens in erro.message_dict.items())
+    return ' '.join(erro.messages)
+
+
+class Importador:
+    """Base: `limpar` valida uma linha, `chave` é a chave natural e `gravar` faz o upsert de um lote."""
+    modelo = None
+    colunas = ()
+    obrigatorias = ()
+
+    def __init__(self, cabecalho):
+        faltando = [coluna for coluna in self.obrigatorias if coluna not in cabecalho]
+        if faltando:
+            raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(faltando)}")
+        self.presentes = [coluna for coluna in self.colunas if coluna in cabecalho]
+
+    def _limpar_campos(self, registro, campos):
+        dados, erros = {}, {}
+        for nome in campos:
+            try:
+                dados[nome] = limpar_campo(self.modelo, nome, registro.get(nome))
+            except ValidationError as erro:
+                erros[nome] = erro.messages
+        if erros:
+            raise ValidationError(erros)
+        return dados
+
+    def limpar(self, registro):
+        return self._limpar_campos(registro, self.presentes)
+
+    def chave(self, dados):
+        raise NotImplementedError
+
+    def gravar(self, itens):
+        """Grava [(número da linha, dados)] e devolve (criados, atualizados, {linha: erro})."""
+        raise NotImplementedError
+
+    def processar(self, registros):
+        """Valida e grava um lote [(número da linha, registro do CSV)]; mesmo retorno de `gravar`."""
+        erros, validos = {}, {}
+        for numero, registro in registros:
+            try:
+                dados = self.limpar(registro)
+            except ValidationError as erro:
+                erros[numero] = _mensagem(erro)
+                continue
+            validos[self.chave(dados)] = (numero, dados)
+
+        itens = sorted(validos.values(), key=lambda item: item[0])
+        try:
+            with transaction.atomic():
+                criados, atualizados, erros_gravacao = self.gravar(itens)
+        except IntegrityError:
+            # conflito que só o banco detectou: linha a linha, para apontar as culpadas
+            criados = atualizados = 0
+            erros_gravacao = {}
+            for item in itens:
+                try:
+                    with transaction.atomic():
+                        c, a, e = self.gravar([item])
+                except IntegrityError as erro:
+                    erros_gravacao[item[0]] = f"Conflito no banco: {erro}"
+                else:
+                    criados, atualizados = criados + c, atualizados + a
+                    erros_gravacao.update(e)
+        erros.update(erros_gravacao)
+        invalidar(self.modelo)  # bulk_create/bulk_update não disparam signals
+        return criados, atualizados, erros
+
+
+# -----------------------------
+# Clientes (chave natural: CPF; sem CPF, telefone + e-mail normalizados)
+# -----------------------------
+class ImportadorClientes(Importador):
+    modelo = Cliente
+    colunas = ('nome', 'telefone', 'email', 'cpf', 'dt_nascimento', 'sexo', 'observacoes')
+    obrigatorias = ('nome', 'telefone', 'email')
+
+    def limpar(self, registro):
+        campos = [coluna for coluna in self.presentes if coluna != 'cpf']
+        try:
+            dados = self._limpar_campos(registro, campos)
+            erros = {}
+        except ValidationError as erro:
+            dados, erros = {}, erro.message_dict
+        if 'cpf' in self.presentes:
+            texto = (registro.get('cpf') or '').strip()
+            try:
+                dados['cpf'] = _cpf(texto) if texto else ''
+            except ValidationError as erro:
+                erros['cpf'] = erro.messages
+        if erros:
+            raise ValidationError(erros)
+        dados['chave_contato'] = Cliente.normalizar_chave_contato(dados['telefone'], dados['email'])
+        return dados
+
+    def chave(self, dados):
+        return ('cpf', dados['cpf']) if dados.get('cpf') else ('contato', dados['chave_contato'])
+
+    def gravar(self, itens):
+        cpfs = {dados['cpf'] for _, dados in itens if dados.get('cpf')}
+        chaves = {dados['chave_contato'] for _, dados in itens}
+        existentes = list(
+            Cliente.objects.filter(Q(cpf__in=_formas_cpf(cpfs)) | Q(chave_contato__in=chaves)).order_by('id')
+        )
+        por_cpf = {_digitos(cliente.cpf): cliente for cliente in existentes if cliente.cpf}
+        por_contato = {}
+        for cliente in existentes:
+            por_contato.setdefault(cliente.chave_contato, cliente)
+
+        novos, atualizar, erros = [], {}, {}
+        agora = timezone.now()
+        for numero, dados in itens:
+            chave = dados['chave_contato']
+            cliente = por_cpf.get(_digitos(dados.get('cpf'))) if dados.get('cpf') else None
+            # unique_cliente_contato: o contato pertence a um só cliente (cadastrado ou novo no lote)
+            dono = por_contato.get(chave) if chave else None
+            if cliente is None and dono is not None and not (dono.cpf and dados.get('cpf')):
+                cliente = dono
+            if dono is not None and dono is not cliente:
+                erros[numero] = "contato: telefone e e-mail já pertencem a outro cliente (outro CPF)."
+                continue
+            if cliente is None:
+                cliente = Cliente(**dados)
+                novos.append(cliente)
+            else:
+                for campo, valor in dados.items():
+                    if campo != 'cpf' or valor:  # CPF vazio na planilha não apaga o cadastrado
+                        setattr(cliente, campo, valor)
+                if cliente.pk:
+                    cliente.updated_at = agora
+                    atualizar[cliente.pk] = cliente
+            if chave:
+                por_contato[chave] = cliente
+
+        Cliente.objects.bulk_create(novos)
+        campos = sorted(set(self.presentes) | {'chave_contato', 'updated_at'})
+        Cliente.objects.bulk_update(list(atualizar.values()), campos)
+        return len(novos), len(atualizar), erros
+
+
+# -----------------------------
+# Tratamentos (chave natural: nome)
+# -----------------------------
+class ImportadorTratamentos(Importador):
+    modelo = Tratamento
+    colunas = ('nome_tratamento', 'tipo_tratamento', 'duracao', 'preco', 'descricao')
+    obrigatorias = ('nome_tratamento', 'descricao')
+
+    def chave(self, dados):
+        return dados['nome_tratamento']
+
+    def gravar(self, itens):
+        nomes = {dados['nome_tratamento'] for _, dados in itens}
+        existentes = {}
+        for tratamento in Tratamento.objects.filter(nome_tratamento__in=nomes).order_by('id'):
+            existentes.setdefault(tratamento.nome_tratamento, tratamento)
+
+        novos, atualizar, erros = [], [], {}
+        por_duracao = defaultdict(list)  # {nova duração na agenda: [ids]}
+        agora = timezone.now()
+        for numero, dados in itens:
+            tratamento = existentes.get(dados['nome_tratamento'])
+            if tratamento is None:
+                novos.append(Tratamento(**dados))
+                continue
+            anterior = tratamento.duracao_agendamento
+            for campo, valor in dados.items():
+                setattr(tratamento, campo, valor)
+            duracao = tratamento.duracao_agendamento
+            # mesma regra de Tratamento.validar_duracao, com a duração anterior já em memória
+            if duracao > anterior:
+                conflitos = tratamento.conflitos_de_duracao()
+                if conflitos:
+                    erros[numero] = f"duracao: {tratamento.mensagem_conflitos(conflitos)}"
+                    continue
+            if duracao != anterior:
+                por_duracao[duracao].append(tratamento.pk)
+            tratamento.updated_at = agora
+            atualizar.append(tratamento)
+
+        Tratamento.objects.bulk_create(novos)
+        Tratamento.objects.bulk_update(atualizar, sorted(set(self.presentes) | {'updated_at'}))
+        # bulk_update não dispara atualizar_fim_agendamentos: o mesmo UPDATE, um por duração
+        for duracao, ids in por_duracao.items():
+            Agendamento.objects.filter(tratamento_id__in=ids, inicio__gte=agora).update(
+                fim=F('inicio') + duracao
+            )
+        if por_duracao:
+            invalidar(Agendamento)
+        return len(novos), len(atualizar), erros
+
+
+# -----------------------------
+# Produtos (chave natural: nome + marca)
+# -----------------------------
+class ImportadorProdutos(Importador):
+    modelo = Produto
+    colunas = ('nome', 'marca', 'descricao', 'data_validade', 'preco_custo', 'preco_venda',
+               'quantidade_estoque', 'estoque_minimo')
+    obrigatorias = ('nome', 'preco_custo', 'preco_venda')
+
+    def chave(self, dados):
+        return dados['nome'], dados.get('marca') or ''
+
+    def gravar(self, itens):
+        nomes = {dados['nome'] for _, dados in itens}
+        existentes = {}
+        for produto in Produto.objects.filter(nome__in=nomes).order_by('id'):
+            existentes.setdefault((produto.nome, produto.marca or ''), produto)
+
+        novos, atualizar = [], []
+        agora = timezone.now()
+        for _, dados in itens:
+            produto = existentes.get(self.chave(dados))
+            if produto is None:
+                novos.append(Produto(**dados))
+                continue
+            for campo, valor in dados.items():
+                setattr(produto, campo, valor)
+            produto.updated_at = agora
+            atualizar.append(produto)
+
+        Produto.objects.bulk_create(novos)
+        Produto.objects.bulk_update(atualizar, sorted(set(self.presentes) | {'updated_at'}))
+        return len(novos), len(atualizar), {}
+
+
+# -----------------------------
+# Agendamentos históricos (chave natural: data + hora, como a constraint unique_horario)
+# unique_horario é parcial (ignora cancelados), então não serve de alvo para ON CONFLICT:
+# o upsert é consulta + bulk_create/bulk_update, como nos outros importadores.
+# -----------------------------
+class ImportadorAgendamentos(Importador):
+    modelo = Agendamento
+    colunas = ('data', 'hora', 'tipo_agendamento', 'status')
+    obrigatorias = ('data', 'hora', 'tipo_agendamento', 'tratamento')
+    colunas_cliente = ('cliente_cpf', 'cliente_telefone', 'cliente_email')
+
+    def __init__(self, cabecalho):
+        super().__init__(cabecalho)
+        if not any(coluna in cabecalho for coluna in self.colunas_cliente):
+            raise ValueError(f"Informe o cliente por uma das colunas: {', '.join(self.colunas_cliente)}")
+
+    def limpar(self, registro):
+        try:
+            dados = self._limpar_campos(registro, self.presentes)
+            erros = {}
+        except ValidationError as erro:
+            dados, erros = {}, erro.message_dict
+
+        dados['tratamento'] = (registro.get('tratamento') or '').strip()
+        if not dados['tratamento']:
+            erros['tratamento'] = ['Informe o nome do tratamento.']
+
+        cpf = (registro.get('cliente_cpf') or '').strip()
+        try:
+            dados['cliente_cpf'] = _cpf(cpf) if cpf else ''
+        except ValidationError as erro:
+            erros['cliente_cpf'] = erro.messages
+        dados['cliente_contato'] = Cliente.normalizar_chave_contato(
+            registro.get('cliente_telefone'), registro.get('cliente_email'))
+        if not cpf and not dados['cliente_contato']:
+            erros['cliente'] = ['Informe CPF, telefone ou e-mail do cliente.']
+
+        if erros:
+            raise ValidationError(erros)
+        return dados
+
+    def chave(self, dados):
+        return dados['data'], dados['hora']
+
+    def gravar(self, itens):
+        erros = {}
+        # mapas do lote: uma consulta para os tratamentos, uma para os clientes
+        tratamentos = {}
+        for tratamento in Tratamento.objects.filter(
+            nome_tratamento__in={dados['tratamento'] for _, dados in itens}
+        ).only('id', 'nome_tratamento', 'duracao').order_by('id'):
+            tratamentos.setdefault(tratamento.nome_tratamento, tratamento)
+
+        cpfs = {dados['cliente_cpf'] for _, dados in itens if dados['cliente_cpf']}
+        contatos = {dados['cliente_contato'] for _, dados in itens if dados['cliente_contato']}
+        por_cpf, por_contato = {}, {}
+        for pk, cpf, contato in Cliente.objects.filter(
+            Q(cpf__in=_formas_cpf(cpfs)) | Q(chave_contato__in=contatos)
+        ).order_by('id').values_list('id', 'cpf', 'chave_contato'):
+            if cpf:
+                por_cpf.setdefault(_digitos(cpf), pk)
+            por_contato.setdefault(contato, pk)
+
+        # agenda existente nos dias do lote (e vizinhos, para horários que cruzam a meia-noite)
+        dias = {dados['data'] + timedelta(days=delta) for _, dados in itens for delta in (-1, 0, 1)}
+        ocupados = defaultdict(dict)  # {data: {(data, hora): (inicio, fim)}}
+        ativos, cancelados = {}, {}  # {(data, hora): id}
+        for pk, data, hora, inicio, fim, status in Agendamento.objects.filter(data__in=dias).order_by(
+            'data', 'hora', 'id'
+        ).values_list('id', 'data', 'hora', 'inicio', 'fim', 'status'):
+            if status == 'CANCELADO':
+                cancelados.setdefault((data, hora), pk)
+                continue
+            ativos[(data, hora)] = pk
+            if inicio and fim:
+                ocupados[data][(data, hora)] = (inicio, fim)
+
+        agendamentos = []
+        for numero, dados in itens:
+            tratamento = tratamentos.get(dados['tratamento'])
+            cliente_id = por_cpf.get(_digitos(dados['cliente_cpf'])) or por_contato.get(dados['cliente_contato'])
+            if tratamento is None:
+                erros[numero] = f"tratamento: \"{dados['tratamento']}\" não cadastrado."
+                continue
+            if cliente_id is None:
+                erros[numero] = "cliente: não encontrado (importe os clientes antes)."
+                continue
+            agendamento = Agendamento(
+                cliente_id=cliente_id, tratamento=tratamento, data=dados['data'], hora=dados['hora'],
+                tipo_agendamento=dados['tipo_agendamento'], status=dados.get('status') or 'PENDENTE',
+            )
+            # histórico: o estoque dos concluídos já foi baixado no sistema anterior
+            agendamento.estoque_descontado = agendamento.status == 'CONCLUIDO'
+            agendamento.calcular_intervalo()
+            agendamentos.append((numero, agendamento))
+
+        # sobreposição (a regra da agenda) contra a agenda existente e entre as linhas do lote;
+        # o horário que a própria linha substitui (mesma data e hora) não conta
+        gravar = []
+        for numero, agendamento in sorted(agendamentos, key=lambda item: item[1].inicio):
+            horario = (agendamento.data, agendamento.hora)
+            if agendamento.status != 'CANCELADO':
+                vizinhos = (agendamento.data + timedelta(days=delta) for delta in (-1, 0, 1))
+                conflito = next((
+                    outro for dia in vizinhos for outro, (inicio, fim) in ocupados[dia].items()
+                    if outro != horario and inicio < agendamento.fim and fim > agendamento.inicio
+                ), None)
+                if conflito:
+                    erros[numero] = f"horário sobreposto ao agendamento de {conflito[0]:%d/%m/%Y} às {conflito[1]:%H:%M}."
+                    continue
+                ocupados[agendamento.data][horario] = (agendamento.inicio, agendamento.fim)
+            else:
+                ocupados[agendamento.data].pop(horario, None)
+            gravar.append(agendamento)
+
+        novos, atualizar = [], []
+        agora = timezone.now()
+        for agendamento in gravar:
+            horario = (agendamento.data, agendamento.hora)
+            # linha ativa num horário que só tem cancelado é outro agendamento: o cancelado fica no histórico
+            agendamento.pk = ativos.get(horario) or (
+                cancelados.get(horario) if agendamento.status == 'CANCELADO' else None
+            )
+            if agendamento.pk is None:
+                novos.append(agendamento)
+            else:
+                agendamento.updated_at = agora
+                atualizar.append(agendamento)
+        Agendamento.objects.bulk_create(novos)
+        Agendamento.objects.bulk_update(atualizar, [
+            'cliente', 'tratamento', 'tipo_agendamento', 'status', 'estoque_descontado', 'inicio', 'fim', 'updated_at',
+        ])
+        return len(novos), len(atualizar), erros
+
+
+IMPORTADORES = {
+    'clientes': ImportadorClientes,
+    'tratamentos': ImportadorTratamentos,
+    'produtos': ImportadorProdutos,
+    'agendamentos': ImportadorAgendamentos,
+}
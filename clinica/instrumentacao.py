@@ -0,0 +1,123 @@
+import logging
+import random
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger('clinica.lento')
+
+
+# =============================
+# Amostras por request (buffer circular em memória)
+# =============================
+# Cada processo guarda as últimas N amostras (view, ms, queries, ms no banco);
+# o deque com maxlen descarta as mais antigas sozinho.
+class Amostras:
+    def __init__(self, tamanho):
+        self._amostras = deque(maxlen=tamanho)
+        self._lock = threading.Lock()
+
+    def registrar(self, view, ms, consultas, ms_banco):
+        with self._lock:
+            self._amostras.append((view, ms, consultas, ms_banco))
+
+    def limpar(self):
+        with self._lock:
+            self._amostras.clear()
+
+    def resumo(self):
+        """Por view: total de amostras, p50/p95/p99 do tempo e médias de queries/tempo no banco."""
+        with self._lock:
+            amostras = list(self._amostras)
+        por_view = {}
+        for view, ms, consultas, ms_banco in amostras:
+            por_view.setdefault(view, []).append((ms, consultas, ms_banco))
+
+        linhas = []
+        for view, medidas in por_view.items():
+            tempos = sorted(ms for ms, _, _ in medidas)
+            linhas.append({
+                'view': view,
+                'amostras': len(medidas),
+                'p50': percentil(tempos, 50),
+                'p95': percentil(tempos, 95),
+                'p99': percentil(tempos, 99),
+                'maximo': tempos[-1],
+                'consultas': sum(c for _, c, _ in medidas) / len(medidas),
+                'ms_banco': sum(b for _, _, b in medidas) / len(medidas),
+            })
+        return sorted(linhas, key=lambda linha: linha['p95'], reverse=True)
+
+
+def percentil(ordenados, p):
+    """Percentil por posição mais próxima (nearest-rank) de uma lista já ordenada."""
+    if not ordenados:
+        return 0
+    posicao = max(0, -(-p * len(ordenados) // 100) - 1)
+    return ordenados[posicao]
+
+
+amostras = Amostras(getattr(settings, 'INSTRUMENTACAO_BUFFER', 5000))
+
+
+class _ColetorConsultas:
+    """execute_wrapper: conta as queries e o tempo no banco, guardando o SQL (sem parâmetros)."""
+
+    def __init__(self):
+        self.sql = []
+        self.ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.ms += (time.perf_counter() - inicio) * 1000
+            self.sql.append(sql)
+
+
+# =============================
+# Middleware
+# =============================
+class InstrumentacaoMiddleware:
+    """
+    Mede tempo total, número de queries e tempo no banco de uma fração dos requests
+    (INSTRUMENTACAO_AMOSTRAGEM, 0 a 1) e registra por view resolvida. Requests acima
+    de INSTRUMENTACAO_LIMITE_LENTO_MS vão para o log com o SQL mais repetido (N+1).
+    Fora da amostra o custo é um random().
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.amostragem = getattr(settings, 'INSTRUMENTACAO_AMOSTRAGEM', 1.0)
+        self.limite_lento_ms = getattr(settings, 'INSTRUMENTACAO_LIMITE_LENTO_MS', 500)
+
+    def __call__(self, request):
+        if self.amostragem <= 0 or random.random() >= self.amostragem:
+            return self.get_response(request)
+
+        coletor = _ColetorConsultas()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(coletor):
+            response = self.get_response(request)
+        ms = (time.perf_counter() - inicio) * 1000
+
+        match = request.resolver_match
+        view = match.view_name if match else '<sem rota>'
+        amostras.registrar(view, ms, len(coletor.sql), coletor.ms)
+        if ms >= self.limite_lento_ms:
+            self._registrar_lento(request, view, ms, coletor)
+        return response
+
+    def _registrar_lento(self, request, view, ms, coletor):
+        repetidas = [(sql, vezes) for sql, vezes in Counter(coletor.sql).most_common(3) if vezes > 1]
+        detalhes = ''.join(f"\n  {vezes}x {sql}" for sql, vezes in repetidas)
+        logger.warning(
+            "Request lento: %s %s (%s) %.0f ms, %d queries, %.0f ms no banco%s",
+            request.method, request.path, view, ms, len(coletor.sql), coletor.ms,
+            f"\nSQL repetido:{detalhes}" if detalhes else '',
+        )
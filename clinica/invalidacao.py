@@ -0,0 +1,49 @@
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+# =============================
+# Versões de cache por model
+# =============================
+# Cada model tem uma versão no cache; chaves de cache que dependem de um model
+# incluem a versão dele, então trocar a versão invalida todas de uma vez (sem
+# precisar saber quais chaves existem). save/delete trocam via signals
+# (clinica/signals.py); escritas em lote (update/bulk_create) chamam invalidar().
+#
+# A versão é um valor novo que nunca se repete, não um contador: o cache pode
+# descartar a versão (FileBasedCache acima de MAX_ENTRIES, LRU do LocMem/Redis)
+# e recomeçar de 1 voltaria a casar com dados gravados antes; e o incr do
+# FileBasedCache é ler-e-gravar, sem atomicidade entre os workers.
+
+def _chave(modelo):
+    return f"versao:{modelo._meta.label_lower}"
+
+
+def _nova_versao():
+    return f"{time.time_ns():x}{uuid.uuid4().hex[:8]}"
+
+
+def versoes(*modelos):
+    """Versão atual de cada model, em uma única ida ao cache: 'label=v;label=v'."""
+    chaves = [_chave(m) for m in modelos]
+    atuais = cache.get_many(chaves)
+    faltando = {chave: _nova_versao() for chave in chaves if chave not in atuais}
+    if faltando:
+        cache.set_many(faltando, None)
+        atuais.update(faltando)
+    return ';'.join(f"{chave[7:]}={atuais[chave]}" for chave in chaves)
+
+
+def _trocar(modelos):
+    cache.set_many({_chave(modelo): _nova_versao() for modelo in modelos}, None)
+
+
+def invalidar(*modelos):
+    # troca já e de novo no commit: quem recalcular com os dados antigos
+    # enquanto a transação não terminou grava numa versão que o commit descarta
+    _trocar(modelos)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _trocar(modelos))
@@ -0,0 +1,162 @@
+import json
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from clinica import dados_sinteticos
+from clinica.admin import custom_admin_site
+from clinica.models import Tratamento
+
+
+# cache isolado: nada do benchmark (nem as versões de invalidação) vaza para o cache real
+CACHES_BENCHMARK = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'},
+}
+# o que se mede é banco + template; o manifest do collectstatic não precisa existir
+STORAGES_BENCHMARK = {
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def endpoints():
+    """{nome: url} de todas as páginas públicas, endpoints JSON do dashboard e changelists do admin."""
+    hoje = timezone.localdate()
+    tratamento = Tratamento.objects.order_by('pk').values_list('pk', flat=True).first()
+    site = custom_admin_site.name
+    urls = {
+        'publico:index': reverse('index'),
+        'publico:tratamentos': reverse('tratamentos'),
+        'publico:agendamento': reverse('agendamento'),
+        'publico:horarios_disponiveis': (
+            f"{reverse('horarios_disponiveis')}?tratamento={tratamento}&inicio={hoje}&fim={hoje + timedelta(days=30)}"
+        ),
+        'dashboard:index': reverse(f'{site}:index'),
+        'dashboard:calendario': (
+            f"{reverse('admin_agendamentos_json')}?start={hoje.replace(day=1)}&end={hoje.replace(day=1) + timedelta(days=42)}"
+        ),
+    }
+    for padrao in custom_admin_site.get_urls():
+        nome = getattr(padrao, 'name', None) or ''
+        if nome.endswith('_json') or nome == 'dashboard_bundle':
+            urls[f'dashboard:{nome}'] = reverse(f'{site}:{nome}')
+    for modelo in custom_admin_site._registry:
+        opts = modelo._meta
+        urls[f'admin:{opts.model_name}'] = reverse(f'{site}:{opts.app_label}_{opts.model_name}_changelist')
+    return urls
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera dados sintéticos em cada volume pedido e mede tempo e número de queries de todas as "
+        "páginas públicas, endpoints do dashboard e changelists do admin. Os dados são desfeitos no final; "
+        "o relatório em JSON serve para comparar commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--volumes', default='10000,100000,1000000',
+                            help='Volumes de agendamentos, separados por vírgula.')
+        parser.add_argument('--repeticoes', type=int, default=3, help='Execuções de cada request (cache frio).')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Linhas por bulk_create.')
+        parser.add_argument('--saida', default='benchmark.json', help='Arquivo do relatório JSON.')
+
+    def handle(self, *args, **options):
+        self.repeticoes = options['repeticoes']
+        volumes = [int(volume) for volume in options['volumes'].split(',') if volume.strip()]
+        relatorio = {
+            'commit': _commit_atual(),
+            'banco': connection.vendor,
+            'gerado_em': timezone.now().isoformat(timespec='seconds'),
+            'volumes': {},
+        }
+
+        with override_settings(CACHES=CACHES_BENCHMARK, STORAGES=STORAGES_BENCHMARK):
+            for volume in volumes:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"Volume: {volume} agendamentos"))
+                relatorio['volumes'][str(volume)] = self.medir_volume(volume, options['chunk_size'])
+
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f"Relatório gravado em {options['saida']}."))
+
+    def medir_volume(self, volume, chunk_size):
+        resultado = {}
+        # cada volume parte de um banco limpo: os dados gerados são desfeitos no final
+        try:
+            with transaction.atomic():
+                inicio = time.perf_counter()
+                resultado['contagens'] = dados_sinteticos.gerar(volume, chunk_size=chunk_size)
+                resultado['geracao_s'] = round(time.perf_counter() - inicio, 2)
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+                usuario = get_user_model().objects.create_superuser('benchmark', 'benchmark@exemplo.com', None)
+                # erro em um endpoint vira status 500 no relatório, sem abortar o volume
+                client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+                client.force_login(usuario)
+                resultado['endpoints'] = {
+                    nome: self.medir_request(client, nome, url) for nome, url in endpoints().items()
+                }
+                raise Rollback
+        except Rollback:
+            pass
+        cache.clear()
+        return resultado
+
+    def _get(self, client, url):
+        response = client.get(url, secure=True)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def medir_request(self, client, nome, url):
+        tempos = []
+        for _ in range(self.repeticoes):
+            cache.clear()
+            inicio = time.perf_counter()
+            with CaptureQueriesContext(connection) as consultas:
+                response = self._get(client, url)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+
+        # segunda visita, com o cache já populado
+        inicio = time.perf_counter()
+        with CaptureQueriesContext(connection) as consultas_cache:
+            self._get(client, url)
+        ms_cache = (time.perf_counter() - inicio) * 1000
+
+        medida = {
+            'url': url,
+            'status': response.status_code,
+            'ms': round(statistics.median(tempos), 2),
+            'consultas': len(consultas),
+            'ms_cache': round(ms_cache, 2),
+            'consultas_cache': len(consultas_cache),
+        }
+        self.stdout.write(
+            f"  {nome}: {medida['status']} {medida['ms']} ms, {medida['consultas']} queries "
+            f"(com cache: {medida['ms_cache']} ms, {medida['consultas_cache']} queries)"
+        )
+        return medida
@@ -0,0 +1,202 @@
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from clinica import graficos
+from clinica.admin import custom_admin_site
+from clinica.instrumentacao import percentil
+from clinica.management.commands.benchmark import _commit_atual
+
+
+# os dois modos de servir o mesmo projeto: workers síncronos (WSGI) e workers uvicorn (ASGI)
+SERVIDORES = {
+    'gunicorn_sync': {
+        'comando': ['webclinica.wsgi:application'],
+        'bundle': 'dashboard_bundle',
+        'env': {},
+    },
+    'uvicorn': {
+        'comando': ['webclinica.asgi:application', '-k', 'uvicorn.workers.UvicornWorker'],
+        'bundle': 'dashboard_bundle_async',
+        'env': {'DASHBOARD_ASYNC': '1'},
+    },
+}
+
+USUARIO = 'benchmark-dashboard'
+
+
+class _SemRedirect(urllib.request.HTTPRedirectHandler):
+    """Redirect (sessão recusada -> login) conta como erro, não como a página de login com 200."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_abrir = urllib.request.build_opener(_SemRedirect).open
+
+
+def _porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _aguardar_porta(porta, processo, limite_s=30):
+    fim = time.monotonic() + limite_s
+    while time.monotonic() < fim:
+        if processo.poll() is not None:
+            raise CommandError(f"O servidor terminou ao iniciar (código {processo.returncode}).")
+        try:
+            with socket.create_connection(('127.0.0.1', porta), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"O servidor não respondeu na porta {porta} em {limite_s} s.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o carregamento do dashboard servido por workers síncronos do gunicorn e por workers "
+        "uvicorn (views assíncronas): N sessões de staff simultâneas pedem o bundle de gráficos e o "
+        "relatório traz p50/p95/p99 e vazão de cada servidor. Usa o banco configurado (rode antes o "
+        "gerar_dados); o usuário e as sessões do teste são apagados no final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servidores', default=','.join(SERVIDORES),
+                            help=f"Servidores a medir, separados por vírgula ({', '.join(SERVIDORES)}).")
+        parser.add_argument('--workers', type=int, default=2, help='Workers do gunicorn em cada servidor.')
+        parser.add_argument('--sessoes', type=int, default=20, help='Sessões de staff simultâneas.')
+        parser.add_argument('--requests', type=int, default=10, help='Carregamentos do dashboard por sessão.')
+        parser.add_argument('--com-cache', action='store_true',
+                            help='Mantém o cache ligado (por padrão cada gráfico é calculado a frio).')
+        parser.add_argument('--saida', default='benchmark_dashboard.json', help='Arquivo do relatório JSON.')
+
+    def handle(self, *args, **options):
+        nomes = [nome.strip() for nome in options['servidores'].split(',') if nome.strip()]
+        desconhecidos = [nome for nome in nomes if nome not in SERVIDORES]
+        if desconhecidos:
+            raise CommandError(f"Servidores desconhecidos: {', '.join(desconhecidos)}")
+
+        relatorio = {
+            'commit': _commit_atual(),
+            'banco': connection.vendor,
+            'gerado_em': timezone.now().isoformat(timespec='seconds'),
+            'workers': options['workers'],
+            'sessoes': options['sessoes'],
+            'requests_por_sessao': options['requests'],
+            'cache': options['com_cache'],
+            'graficos': len(graficos.GRAFICOS),
+            'servidores': {},
+        }
+
+        usuario = get_user_model().objects.create_user(USUARIO, is_staff=True, is_superuser=True)
+        self._chaves = []
+        try:
+            cookies = [self._sessao(usuario) for _ in range(options['sessoes'])]
+            for nome in nomes:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"{nome} ({options['workers']} workers)"))
+                relatorio['servidores'][nome] = self.medir_servidor(nome, cookies, options)
+        finally:
+            Session.objects.filter(session_key__in=self._chaves).delete()
+            usuario.delete()
+
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f"Relatório gravado em {options['saida']}."))
+
+    # -----------------------------
+    # Sessões de staff (sem passar pelo formulário de login)
+    # -----------------------------
+    def _sessao(self, usuario):
+        sessao = SessionStore()
+        sessao[SESSION_KEY] = str(usuario.pk)
+        sessao[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sessao[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sessao.create()
+        self._chaves.append(sessao.session_key)
+        return f"{settings.SESSION_COOKIE_NAME}={sessao.session_key}"
+
+    # -----------------------------
+    # Servidor + carga
+    # -----------------------------
+    def medir_servidor(self, nome, cookies, options):
+        servidor = SERVIDORES[nome]
+        porta = _porta_livre()
+        env = dict(os.environ, **servidor['env'])
+        if not options['com_cache']:
+            env['DJANGO_CACHE'] = 'dummy'
+        comando = [
+            sys.executable, '-m', 'gunicorn', *servidor['comando'],
+            '--workers', str(options['workers']), '--bind', f'127.0.0.1:{porta}', '--log-level', 'warning',
+        ]
+        caminho = reverse(f"{custom_admin_site.name}:{servidor['bundle']}")
+        url = f'http://127.0.0.1:{porta}{caminho}'
+
+        processo = subprocess.Popen(comando, cwd=settings.BASE_DIR, env=env)
+        try:
+            _aguardar_porta(porta, processo)
+            self._get(url, cookies[0])  # aquecimento: imports e conexões dos workers
+
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=len(cookies)) as executor:
+                por_sessao = list(executor.map(lambda cookie: self._carregar(url, cookie, options['requests']), cookies))
+            duracao = time.perf_counter() - inicio
+        finally:
+            processo.terminate()
+            processo.wait(timeout=30)
+
+        medidas = [medida for medidas in por_sessao for medida in medidas]
+        tempos = sorted(ms for ms, status in medidas if status == 200)
+        # sem nenhuma resposta 200 não há latência a medir: None, e não 0 ms
+        resultado = {
+            'url': url,
+            'requests': len(medidas),
+            'erros': sum(1 for _, status in medidas if status != 200),
+            'duracao_s': round(duracao, 2),
+            'vazao_rps': round(len(medidas) / duracao, 2) if duracao else None,
+            'media_ms': round(statistics.mean(tempos), 2) if tempos else None,
+            'p50_ms': round(percentil(tempos, 50), 2) if tempos else None,
+            'p95_ms': round(percentil(tempos, 95), 2) if tempos else None,
+            'p99_ms': round(percentil(tempos, 99), 2) if tempos else None,
+        }
+        self.stdout.write(
+            f"  p50 {resultado['p50_ms']} ms, p95 {resultado['p95_ms']} ms, p99 {resultado['p99_ms']} ms, "
+            f"{resultado['vazao_rps']} req/s, {resultado['erros']} erro(s)"
+        )
+        return resultado
+
+    def _get(self, url, cookie):
+        # Host/X-Forwarded-Proto: passa pelo ALLOWED_HOSTS e pelo redirect de HTTPS da produção
+        requisicao = urllib.request.Request(url, headers={
+            'Cookie': cookie, 'Host': 'localhost', 'X-Forwarded-Proto': 'https',
+        })
+        inicio = time.perf_counter()
+        try:
+            with _abrir(requisicao, timeout=120) as resposta:
+                resposta.read()
+                status = resposta.status
+        except urllib.error.HTTPError as erro:
+            status = erro.code
+        except OSError:
+            status = None
+        return (time.perf_counter() - inicio) * 1000, status
+
+    def _carregar(self, url, cookie, repeticoes):
+        return [self._get(url, cookie) for _ in range(repeticoes)]
@@ -0,0 +1,200 @@
+import json
+import random
+import statistics
+import time
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from clinica.dados_sinteticos import sem_auto_now_add, ultimo_dia_livre
+from clinica.models import (
+    Agendamento, CategoriaDespesa, Cliente, Despesa, MovimentacaoEstoque, Produto, Receita, Tratamento,
+)
+
+
+# índices da migration 0012 (removidos na rodada "sem_indices"); o de Agendamento
+# (status, data) saiu na 0018: a taxa de cancelamento não filtra por data
+INDICES = {
+    Receita: ['receita_recebida_idx', 'receita_recebimento_idx'],
+    Despesa: ['despesa_paga_idx', 'despesa_vencimento_idx'],
+    MovimentacaoEstoque: ['movimentacao_data_tipo_idx'],
+}
+
+DIAS_HISTORICO = 3 * 365
+
+
+class Rollback(Exception):
+    pass
+
+
+def _indices(modelo):
+    return [indice for indice in modelo._meta.indexes if indice.name in INDICES[modelo]]
+
+
+def consultas(hoje):
+    """As formas das consultas quentes (Caixa, gráficos do dashboard), como querysets para EXPLAIN."""
+    mes = hoje.replace(day=1)
+    fim_mes = mes + relativedelta(months=1) - timedelta(days=1)
+    ano = mes - relativedelta(months=11)
+    semestre = timezone.make_aware(datetime.combine(mes - relativedelta(months=5), dt_time.min))
+    return {
+        # Caixa.calcular_totais (mesma forma do aggregate)
+        'caixa_receitas': Receita.objects.filter(data_recebimento__range=(mes, fim_mes), recebido=True)
+        .order_by().values('recebido').annotate(total=Sum('valor')),
+        'caixa_despesas': Despesa.objects.filter(data_pagamento__range=(mes, fim_mes), pago=True)
+        .order_by().values('pago').annotate(total=Sum('valor')),
+        # ContextoGraficos.receitas_por_mes / despesas_por_mes
+        'receitas_por_mes': Receita.objects.filter(data_recebimento__gte=ano)
+        .annotate(mes=TruncMonth('data_recebimento')).values('mes')
+        .annotate(recebidas=Sum('valor', filter=Q(recebido=True)), a_receber=Sum('valor', filter=Q(recebido=False)))
+        .order_by('mes'),
+        'despesas_por_mes': Despesa.objects.filter(data_vencimento__gte=ano)
+        .annotate(mes=TruncMonth('data_vencimento')).values('mes')
+        .annotate(total=Sum('valor'), pagas=Sum('valor', filter=Q(pago=True)))
+        .order_by('mes'),
+        # graficos.taxa_cancelamento: o aggregate sobre a tabela toda (o Value constante
+        # só dá a forma de queryset para o EXPLAIN, sem GROUP BY)
+        'taxa_cancelamento': Agendamento.objects.order_by().annotate(grupo=Value(1)).values('grupo')
+        .annotate(total=Count('id'), cancelados=Count('id', filter=Q(status='CANCELADO'))),
+        # graficos.movimentacao_estoque
+        'movimentacao_estoque': MovimentacaoEstoque.objects.filter(data__gte=semestre)
+        .annotate(mes=TruncMonth('data')).values('mes')
+        .annotate(entradas=Sum('quantidade', filter=Q(tipo='ENTRADA')), saidas=Sum('quantidade', filter=Q(tipo='SAIDA')))
+        .order_by('mes'),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula o banco com N linhas sintéticas por tabela, mede as consultas do Caixa e do "
+        "dashboard sem e com os índices compostos (EXPLAIN + tempos) e desfaz tudo no final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=1_000_000, help='Linhas por tabela (Agendamento, Receita, Despesa, Movimentação).')
+        parser.add_argument('--chunk-size', type=int, default=10_000, help='Linhas por bulk_create.')
+        parser.add_argument('--repeticoes', type=int, default=5, help='Execuções de cada consulta.')
+        parser.add_argument('--saida', help='Grava o relatório em JSON neste arquivo.')
+
+    def handle(self, *args, **options):
+        self.chunk_size = options['chunk_size']
+        self.repeticoes = options['repeticoes']
+        self.hoje = timezone.localdate()
+        relatorio = {'banco': connection.vendor, 'linhas': options['linhas'], 'consultas': {}}
+
+        # tudo numa transação desfeita no final (DDL inclusive: SQLite e PostgreSQL são transacionais)
+        try:
+            with transaction.atomic():
+                self.popular(options['linhas'])
+                self._executar('ANALYZE')
+
+                self._alterar_indices(remover=True)
+                self._executar('ANALYZE')
+                self.medir(relatorio, 'sem_indices')
+
+                self._alterar_indices(remover=False)
+                self._executar('ANALYZE')
+                self.medir(relatorio, 'com_indices')
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.imprimir(relatorio)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Relatório gravado em {options['saida']}.")
+
+    # -----------------------------
+    # Dados sintéticos
+    # -----------------------------
+    def _em_lotes(self, modelo, total, gerar):
+        for inicio in range(0, total, self.chunk_size):
+            modelo.objects.bulk_create([gerar(i) for i in range(inicio, min(inicio + self.chunk_size, total))])
+        self.stdout.write(f"{modelo._meta.verbose_name_plural}: {total} linha(s).")
+
+    def popular(self, total):
+        aleatorio = random.Random(42)
+        cliente = Cliente.objects.create(nome='Benchmark', telefone='0', email='benchmark@example.com')
+        tratamento = Tratamento.objects.create(nome_tratamento='Benchmark', descricao='-', duracao=30)
+        categoria = CategoriaDespesa.objects.create(nome='Benchmark')
+        produto = Produto.objects.create(nome='Benchmark', preco_custo=0, preco_venda=0)
+        status = [codigo for codigo, _ in Agendamento.STATUS_CHOICES]
+
+        def dia(i):
+            return self.hoje - timedelta(days=i % DIAS_HISTORICO)
+
+        def valor():
+            return Decimal(aleatorio.randint(1000, 100000)) / 100
+
+        # (data, hora) é único: 48 horários de 30 min por dia, recuando um dia a cada 48 linhas
+        ultimo_dia = ultimo_dia_livre(self.hoje)
+        self._em_lotes(Agendamento, total, lambda i: Agendamento(
+            cliente=cliente, tratamento=tratamento, data=ultimo_dia - timedelta(days=i // 48),
+            hora=dt_time(i % 48 // 2, 30 * (i % 2)), tipo_agendamento='AVALIACAO', status=aleatorio.choice(status),
+        ))
+
+        def receita(i):
+            recebido = aleatorio.random() < 0.7
+            return Receita(valor=valor(), forma_pagamento='PIX', recebido=recebido, data_recebimento=dia(i))
+        self._em_lotes(Receita, total, receita)
+
+        def despesa(i):
+            pago = aleatorio.random() < 0.6
+            return Despesa(
+                nome_despesa='Benchmark', categoria=categoria, valor=valor(),
+                data_vencimento=dia(i), pago=pago, data_pagamento=dia(i) if pago else None,
+            )
+        self._em_lotes(Despesa, total, despesa)
+
+        with sem_auto_now_add(MovimentacaoEstoque, 'data'):
+            self._em_lotes(MovimentacaoEstoque, total, lambda i: MovimentacaoEstoque(
+                produto=produto, tipo=aleatorio.choice(['ENTRADA', 'SAIDA']), quantidade=aleatorio.randint(1, 20),
+                data=timezone.make_aware(datetime.combine(dia(i), dt_time(12))),
+            ))
+
+    # -----------------------------
+    # Medição
+    # -----------------------------
+    def _executar(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+
+    def _alterar_indices(self, remover):
+        # SQL gerado pelo próprio schema editor, executado direto: no SQLite o editor não
+        # pode ser aberto dentro de uma transação com as FKs ligadas
+        editor = connection.schema_editor()
+        for modelo in INDICES:
+            for indice in _indices(modelo):
+                sql = indice.remove_sql(modelo, editor) if remover else indice.create_sql(modelo, editor)
+                self._executar(str(sql))
+
+    def medir(self, relatorio, rodada):
+        opcoes_explain = {'analyze': True, 'buffers': True} if connection.vendor == 'postgresql' else {}
+        for nome, queryset in consultas(self.hoje).items():
+            tempos = []
+            for _ in range(self.repeticoes):
+                inicio = time.perf_counter()
+                list(queryset.all())
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            relatorio['consultas'].setdefault(nome, {})[rodada] = {
+                'mediana_ms': round(statistics.median(tempos), 2),
+                'min_ms': round(min(tempos), 2),
+                'plano': queryset.explain(**opcoes_explain),
+            }
+
+    def imprimir(self, relatorio):
+        self.stdout.write(f"\n{relatorio['banco']} — {relatorio['linhas']} linha(s) por tabela\n")
+        for nome, rodadas in relatorio['consultas'].items():
+            antes, depois = rodadas['sem_indices'], rodadas['com_indices']
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{nome}: {antes['mediana_ms']} ms -> {depois['mediana_ms']} ms (mediana)"
+            ))
+            self.stdout.write("  sem índices:\n    " + antes['plano'].replace('\n', '\n    '))
+            self.stdout.write("  com índices:\n    " + depois['plano'].replace('\n', '\n    '))
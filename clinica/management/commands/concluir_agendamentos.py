@@ -0,0 +1,39 @@
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from clinica.models import Agendamento
+
+
+class Command(BaseCommand):
+    help = "Conclui agendamentos em lote (fechamento do dia), descontando o estoque dos consumos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='IDs dos agendamentos a concluir.')
+        parser.add_argument(
+            '--data',
+            help='Conclui todos os agendamentos pendentes/confirmados desta data (AAAA-MM-DD).'
+        )
+
+    def handle(self, *args, **options):
+        ids = list(options['ids'])
+        if options['data']:
+            try:
+                data = datetime.date.fromisoformat(options['data'])
+            except ValueError:
+                raise CommandError("Data inválida, use o formato AAAA-MM-DD.")
+            ids += Agendamento.objects.filter(
+                data=data, estoque_descontado=False, status__in=['PENDENTE', 'CONFIRMADO']
+            ).values_list('id', flat=True)
+        if not ids:
+            raise CommandError("Informe IDs de agendamentos ou --data.")
+
+        try:
+            concluidos, falhas = Agendamento.concluir_em_lote(list(dict.fromkeys(ids)))
+        except ValidationError as erro:
+            raise CommandError(' '.join(erro.messages))
+
+        for agendamento_id, erro in falhas.items():
+            self.stderr.write(f"Agendamento {agendamento_id}: {erro}")
+        self.stdout.write(self.style.SUCCESS(f"{len(concluidos)} agendamento(s) concluído(s), {len(falhas)} falha(s)."))
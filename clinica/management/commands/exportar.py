@@ -0,0 +1,58 @@
+from datetime import date, datetime
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+
+from clinica import exportacao
+
+
+def _data(texto):
+    try:
+        return datetime.strptime(texto, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Data inválida: {texto} (use AAAA-MM-DD).")
+
+
+def _mes(texto):
+    try:
+        inicio = datetime.strptime(texto, '%Y-%m').date()
+    except ValueError:
+        raise CommandError(f"Mês inválido: {texto} (use AAAA-MM).")
+    return inicio, inicio + relativedelta(months=1, days=-1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta receitas, despesas, agendamentos ou movimentações de estoque de um período "
+        "para CSV ou Excel, gravando em lotes (memória constante, qualquer volume)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=list(exportacao.EXPORTACOES))
+        parser.add_argument('--formato', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--mes', help='Mês de referência (AAAA-MM); atalho para --inicio/--fim.')
+        parser.add_argument('--inicio', help='Primeiro dia do período (AAAA-MM-DD).')
+        parser.add_argument('--fim', help='Último dia do período (AAAA-MM-DD, inclusive).')
+        parser.add_argument('--chunk-size', type=int, default=exportacao.CHUNK_SIZE, help='Linhas lidas por ida ao banco.')
+        parser.add_argument('--saida', help='Arquivo de saída (padrão: <tipo>-<período>.<formato>).')
+
+    def handle(self, *args, **options):
+        if options['mes']:
+            if options['inicio'] or options['fim']:
+                raise CommandError("Use --mes ou --inicio/--fim, não os dois.")
+            inicio, fim = _mes(options['mes'])
+        else:
+            inicio = options['inicio'] and _data(options['inicio'])
+            fim = options['fim'] and _data(options['fim'])
+
+        definicao = exportacao.EXPORTACOES[options['tipo']]
+        queryset = definicao.filtrar(inicio=inicio, fim=fim)
+        periodo = '_'.join(d.isoformat() for d in (inicio, fim) if isinstance(d, date)) or 'completo'
+        saida = options['saida'] or f"{definicao.nome}-{periodo}.{options['formato']}"
+
+        tamanho = 0
+        with open(saida, 'wb') as arquivo:
+            for pedaco in exportacao.gerar(definicao, queryset, options['formato'], options['chunk_size']):
+                arquivo.write(pedaco)
+                tamanho += len(pedaco)
+        self.stdout.write(self.style.SUCCESS(f"{saida} gravado ({tamanho / 1024:.0f} KB)."))
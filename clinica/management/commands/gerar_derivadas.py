@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from clinica import imagens
+from clinica.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera as derivadas WebP/AVIF das fotos de perfil já enviadas (as novas são geradas no upload; "
+        "as imagens estáticas, no collectstatic)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help='Refaz o índice também das fotos que já têm derivadas.')
+
+    def handle(self, *args, **options):
+        geradas = falhas = 0
+        for usuario in CustomUser.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True).iterator():
+            foto = usuario.profile_picture
+            if not options['todas'] and imagens.descricao_arquivo(foto) is not None:
+                continue
+            try:
+                imagens.gerar_arquivo(foto, imagens.LARGURAS_AVATAR)
+            except Exception as erro:
+                falhas += 1
+                self.stderr.write(f"{foto.name}: {erro}")
+            else:
+                geradas += 1
+        self.stdout.write(self.style.SUCCESS(f"{geradas} fotos processadas, {falhas} com erro."))
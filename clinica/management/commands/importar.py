@@ -0,0 +1,131 @@
+import csv
+import hashlib
+import json
+import os
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clinica.importacao import IMPORTADORES
+
+CHUNK_SIZE = 2000
+
+
+def _abrir(caminho):
+    # utf-8-sig: planilhas salvas pelo Excel começam com BOM
+    return open(caminho, encoding='utf-8-sig', newline='')
+
+
+def _delimitador(caminho):
+    with _abrir(caminho) as arquivo:
+        amostra = arquivo.read(64 * 1024)
+    try:
+        return csv.Sniffer().sniff(amostra, delimiters=';,\t').delimiter
+    except csv.Error:
+        return ';'
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa clientes, tratamentos, produtos ou agendamentos históricos de um CSV, "
+        "em lotes: valida cada linha, grava por chave natural (reimportar atualiza), "
+        "registra as linhas recusadas em um relatório e retoma de onde parou."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=list(IMPORTADORES))
+        parser.add_argument('arquivo', help='CSV com cabeçalho (colunas com os nomes dos campos).')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Linhas por lote/transação.')
+        parser.add_argument('--delimitador', help='Separador de colunas (padrão: detectado entre ; , e tab).')
+        parser.add_argument('--erros', help='Relatório das linhas recusadas (padrão: <arquivo>.erros.csv).')
+        parser.add_argument('--checkpoint', help='Arquivo de progresso (padrão: <arquivo>.checkpoint.json).')
+        parser.add_argument('--recomecar', action='store_true', help='Ignora o checkpoint e importa desde o início.')
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo']
+        if not os.path.isfile(caminho):
+            raise CommandError(f"Arquivo não encontrado: {caminho}")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size deve ser positivo.")
+        caminho_erros = options['erros'] or f'{caminho}.erros.csv'
+        caminho_checkpoint = options['checkpoint'] or f'{caminho}.checkpoint.json'
+        delimitador = options['delimitador'] or _delimitador(caminho)
+
+        with _abrir(caminho) as arquivo:
+            leitor = csv.DictReader(arquivo, delimiter=delimitador)
+            cabecalho = [coluna.strip() for coluna in leitor.fieldnames or []]
+            leitor.fieldnames = cabecalho
+            try:
+                importador = IMPORTADORES[options['tipo']](cabecalho)
+            except ValueError as erro:
+                raise CommandError(str(erro))
+
+            # o checkpoint só vale para o mesmo tipo, arquivo e cabeçalho
+            assinatura = {
+                'tipo': options['tipo'],
+                'arquivo': os.path.abspath(caminho),
+                'cabecalho': hashlib.sha1(delimitador.join(cabecalho).encode()).hexdigest(),
+            }
+            progresso = {'registros': 0, 'criados': 0, 'atualizados': 0, 'erros': 0, 'concluido': False}
+            if os.path.exists(caminho_checkpoint) and not options['recomecar']:
+                with open(caminho_checkpoint) as arquivo_checkpoint:
+                    salvo = json.load(arquivo_checkpoint)
+                if any(salvo.get(campo) != valor for campo, valor in assinatura.items()):
+                    raise CommandError(
+                        f"{caminho_checkpoint} é de outra importação; use --recomecar ou --checkpoint."
+                    )
+                if salvo.get('concluido'):
+                    self.stdout.write(f"{caminho} já foi importado (use --recomecar para importar de novo).")
+                    return
+                progresso.update({campo: salvo[campo] for campo in progresso if campo in salvo})
+                self.stdout.write(f"Retomando após {progresso['registros']} linhas.")
+
+            retomando = progresso['registros'] > 0
+            with open(caminho_erros, 'a' if retomando else 'w', encoding='utf-8-sig', newline='') as arquivo_erros:
+                relatorio = csv.writer(arquivo_erros, delimiter=delimitador)
+                if not retomando:
+                    relatorio.writerow(['linha', 'erro', *cabecalho])
+
+                # a linha 1 é o cabeçalho; números de linha contam registros (campos com quebra de linha não desalinham)
+                numerados = enumerate(leitor, start=2)
+                for _ in islice(numerados, progresso['registros']):
+                    pass
+                while True:
+                    lote = list(islice(numerados, options['chunk_size']))
+                    if not lote:
+                        break
+                    criados, atualizados, erros = importador.processar(lote)
+
+                    registros = dict(lote)
+                    for numero in sorted(erros):
+                        registro = registros[numero]
+                        relatorio.writerow([numero, erros[numero], *(registro.get(coluna) for coluna in cabecalho)])
+                    arquivo_erros.flush()
+
+                    progresso['registros'] += len(lote)
+                    progresso['criados'] += criados
+                    progresso['atualizados'] += atualizados
+                    progresso['erros'] += len(erros)
+                    self._salvar(caminho_checkpoint, assinatura, progresso)
+                    self.stdout.write(
+                        f"{progresso['registros']} linhas: {progresso['criados']} criados, "
+                        f"{progresso['atualizados']} atualizados, {progresso['erros']} com erro."
+                    )
+
+        progresso['concluido'] = True
+        self._salvar(caminho_checkpoint, assinatura, progresso)
+        resumo = (
+            f"{options['tipo']}: {progresso['criados']} criados, {progresso['atualizados']} atualizados, "
+            f"{progresso['erros']} linhas com erro"
+        )
+        if progresso['erros']:
+            self.stdout.write(self.style.WARNING(f"{resumo} (ver {caminho_erros})."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{resumo}."))
+
+    def _salvar(self, caminho, assinatura, progresso):
+        # grava em arquivo temporário e renomeia: uma interrupção no meio não corrompe o checkpoint
+        temporario = f'{caminho}.tmp'
+        with open(temporario, 'w') as arquivo:
+            json.dump({**assinatura, **progresso}, arquivo)
+        os.replace(temporario, caminho)
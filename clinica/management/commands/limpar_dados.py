@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from clinica.models import Agendamento, Cliente
+
+
+def _duplicados(queryset, campos):
+    """IDs que não são o primeiro (menor id) do seu grupo `campos` — ROW_NUMBER() OVER (PARTITION BY ...)."""
+    return (
+        queryset
+        .annotate(posicao=Window(
+            expression=RowNumber(),
+            partition_by=[F(campo) for campo in campos],
+            order_by=F('id').asc(),
+        ))
+        .filter(posicao__gt=1)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Limpa CPFs duplicados (mantém o cliente mais antigo) e agendamentos duplicados "
+        "(mesmo cliente, data e horário), em lotes com uma transação por lote."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta o que seria alterado.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Registros por transação.')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.chunk_size = options['chunk_size']
+        self.limpar_cpfs()
+        self.limpar_agendamentos()
+        self.stdout.write(self.style.SUCCESS("Limpeza concluída!" if not self.dry_run else "Simulação concluída!"))
+
+    def _em_lotes(self, titulo, duplicados, aplicar):
+        if self.dry_run:
+            total = duplicados.count()
+            self.stdout.write(f"{titulo}: {total} registro(s) seriam alterados.")
+            return
+
+        total = 0
+        while True:
+            ids = list(duplicados[:self.chunk_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                aplicar(ids)
+            total += len(ids)
+            self.stdout.write(f"{titulo}: {total} registro(s) processados...")
+        self.stdout.write(f"{titulo}: {total} registro(s) alterados.")
+
+    def limpar_cpfs(self):
+        # CPF é opcional: os duplicados voltam a ficar em branco ('' — o campo não aceita NULL)
+        self._em_lotes(
+            "CPFs duplicados",
+            _duplicados(Cliente.objects.exclude(cpf=''), ['cpf']),
+            lambda ids: Cliente.objects.filter(pk__in=ids).update(cpf=''),
+        )
+
+    def limpar_agendamentos(self):
+        # cancelados não ocupam o horário (unique_cliente_horario é condicional): um
+        # cancelamento seguido de nova reserva no mesmo horário não é duplicado
+        self._em_lotes(
+            "Agendamentos duplicados",
+            _duplicados(Agendamento.objects.exclude(status='CANCELADO'), ['cliente_id', 'data', 'hora']),
+            lambda ids: Agendamento.objects.filter(pk__in=ids).delete(),
+        )
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from clinica.invalidacao import invalidar
+from clinica.mesclagem import grupos_duplicados, mesclar_lote
+from clinica.models import Agendamento, Cliente
+
+
+class Command(BaseCommand):
+    help = (
+        "Mescla clientes duplicados (mesmo telefone/e-mail normalizados): os agendamentos "
+        "passam para o cliente mais antigo e os duplicados são removidos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Apenas mostra o que seria feito.')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Grupos de duplicados por transação.')
+
+    def handle(self, *args, **options):
+        grupos = grupos_duplicados(Cliente)
+        if not grupos:
+            self.stdout.write("Nenhum cliente duplicado encontrado.")
+            return
+
+        chunk_size = options['chunk_size']
+        mesclados = 0
+        for inicio in range(0, len(grupos), chunk_size):
+            lote = dict(grupos[inicio:inicio + chunk_size])
+            with transaction.atomic():
+                mesclados += mesclar_lote(Cliente, Agendamento, lote, options['dry_run'])
+                if not options['dry_run']:
+                    invalidar(Agendamento, Cliente)
+            self.stdout.write(f"{min(inicio + chunk_size, len(grupos))}/{len(grupos)} grupos processados")
+
+        acao = "seriam mesclados" if options['dry_run'] else "mesclados"
+        self.stdout.write(self.style.SUCCESS(f"{mesclados} cliente(s) duplicado(s) {acao} em {len(grupos)} grupo(s)."))
@@ -0,0 +1,66 @@
+from django.db.models import Case, Count, Min, When
+
+
+# =============================
+# Mescla de clientes duplicados (mesmo telefone/e-mail normalizados)
+# =============================
+# Usada pelo comando mesclar_clientes e pela migração 0017 (que precisa mesclar
+# antes de criar a unique_cliente_contato): recebe os models como argumento para
+# funcionar também com os models históricos da migração.
+
+def grupos_duplicados(Cliente):
+    """[(chave_contato, id do cliente mais antigo)] dos contatos com mais de um cliente."""
+    return list(
+        Cliente.objects.exclude(chave_contato='')
+        .values('chave_contato')
+        .annotate(total=Count('id'), canonico=Min('id'))
+        .filter(total__gt=1)
+        .order_by('canonico')
+        .values_list('chave_contato', 'canonico')
+    )
+
+
+def mesclar_lote(Cliente, Agendamento, canonico_por_chave, dry_run=False):
+    """
+    Passa os agendamentos dos duplicados de {chave: id canônico} para o canônico,
+    completa o CPF/nascimento que só o duplicado tinha e remove os duplicados.
+    Chamar dentro de uma transação. Retorna quantos duplicados foram (ou seriam) removidos.
+    """
+    duplicados = list(
+        Cliente.objects.filter(chave_contato__in=canonico_por_chave)
+        .exclude(pk__in=canonico_por_chave.values())
+        .values_list('id', 'chave_contato', 'cpf', 'dt_nascimento')
+    )
+    destino = {dup_id: canonico_por_chave[chave] for dup_id, chave, _, _ in duplicados}
+    if dry_run or not destino:
+        return len(destino)
+
+    # um único UPDATE reaponta os agendamentos de todos os duplicados do lote
+    Agendamento.objects.filter(cliente_id__in=destino).update(
+        cliente_id=Case(*[When(cliente_id=dup_id, then=canonico) for dup_id, canonico in destino.items()])
+    )
+
+    # dados que só o duplicado tinha (CPF, nascimento) passam para o canônico
+    complementos = {}
+    for dup_id, _, cpf, dt_nascimento in duplicados:
+        dados = complementos.setdefault(destino[dup_id], {})
+        if cpf and 'cpf' not in dados:
+            dados['cpf'] = cpf
+        if dt_nascimento and 'dt_nascimento' not in dados:
+            dados['dt_nascimento'] = dt_nascimento
+
+    Cliente.objects.filter(pk__in=destino).delete()
+
+    canonicos = Cliente.objects.filter(pk__in=complementos).only('id', 'cpf', 'dt_nascimento')
+    atualizar = []
+    for cliente in canonicos:
+        dados = complementos[cliente.pk]
+        alterado = False
+        if not cliente.cpf and dados.get('cpf'):
+            cliente.cpf, alterado = dados['cpf'], True
+        if not cliente.dt_nascimento and dados.get('dt_nascimento'):
+            cliente.dt_nascimento, alterado = dados['dt_nascimento'], True
+        if alterado:
+            atualizar.append(cliente)
+    Cliente.objects.bulk_update(atualizar, ['cpf', 'dt_nascimento'])
+    return len(destino)
@@ -0,0 +1,232 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+# =============================
+# Registro de métricas (formato de texto do Prometheus)
+# =============================
+# Contadores e histogramas ficam em memória no processo; atualizar é um lock e
+# uma soma. Com METRICAS_DIR configurado, cada worker grava o próprio snapshot
+# nesse diretório (no máximo uma vez a cada INTERVALO_GRAVACAO segundos, numa
+# thread) e /metrics soma os snapshots de todos os workers. O diretório deve ser
+# esvaziado a cada deploy, como no modo multiprocess do prometheus_client.
+
+INTERVALO_GRAVACAO = 5
+
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _chave_rotulos(nomes, rotulos):
+    if set(rotulos) != set(nomes):
+        raise ValueError(f"Rótulos esperados: {', '.join(nomes) or '(nenhum)'}")
+    return tuple(str(rotulos[nome]) for nome in nomes)
+
+
+def _escapar(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores)) + ([extra] if extra else [])
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + '}'
+
+
+def _formatar_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, registro, nome, ajuda, rotulos=()):
+        self.registro = registro
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.valores = {}
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, valor=1, **rotulos):
+        chave = _chave_rotulos(self.rotulos, rotulos)
+        with self.registro.lock:
+            self.valores[chave] = self.valores.get(chave, 0) + valor
+        self.registro.alterado()
+
+    def snapshot(self):
+        return {json.dumps(chave): valor for chave, valor in self.valores.items()}
+
+    @staticmethod
+    def somar(total, snapshot):
+        for chave, valor in snapshot.items():
+            total[chave] = total.get(chave, 0) + valor
+
+    def exposicao(self, valores):
+        for chave, valor in sorted(valores.items()):
+            yield f"{self.nome}{_formatar_rotulos(self.rotulos, json.loads(chave))} {_formatar_numero(valor)}"
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, registro, nome, ajuda, rotulos=(), buckets=BUCKETS_PADRAO):
+        super().__init__(registro, nome, ajuda, rotulos)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor, **rotulos):
+        chave = _chave_rotulos(self.rotulos, rotulos)
+        posicao = bisect.bisect_left(self.buckets, valor)
+        with self.registro.lock:
+            contagens, soma = self.valores.get(chave) or ([0] * (len(self.buckets) + 1), 0.0)
+            contagens[posicao] += 1
+            self.valores[chave] = (contagens, soma + valor)
+        self.registro.alterado()
+
+    @contextmanager
+    def cronometrar(self, **rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def snapshot(self):
+        return {json.dumps(chave): [list(contagens), soma] for chave, (contagens, soma) in self.valores.items()}
+
+    @staticmethod
+    def somar(total, snapshot):
+        for chave, (contagens, soma) in snapshot.items():
+            atual = total.setdefault(chave, [[0] * len(contagens), 0.0])
+            atual[0] = [a + b for a, b in zip(atual[0], contagens)]
+            atual[1] += soma
+
+    def exposicao(self, valores):
+        limites = self.buckets + (float('inf'),)
+        for chave, (contagens, soma) in sorted(valores.items()):
+            rotulos = json.loads(chave)
+            acumulado = 0
+            for limite, contagem in zip(limites, contagens):
+                acumulado += contagem
+                yield f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, rotulos, ('le', _formatar_numero(limite)))} {acumulado}"
+            yield f"{self.nome}_sum{_formatar_rotulos(self.rotulos, rotulos)} {_formatar_numero(soma)}"
+            yield f"{self.nome}_count{_formatar_rotulos(self.rotulos, rotulos)} {acumulado}"
+
+
+class Registro:
+    def __init__(self, diretorio=None):
+        self.diretorio = diretorio
+        self.lock = threading.Lock()
+        self.metricas = {}
+        self._timer = None
+        self._pid = None
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar(Contador(self, nome, ajuda, rotulos))
+
+    def histograma(self, nome, ajuda, rotulos=(), buckets=BUCKETS_PADRAO):
+        return self._registrar(Histograma(self, nome, ajuda, rotulos, buckets))
+
+    def _registrar(self, metrica):
+        self.metricas[metrica.nome] = metrica
+        return metrica
+
+    # -----------------------------
+    # Multiprocesso (um arquivo por worker)
+    # -----------------------------
+    def _arquivo(self):
+        if self._pid != os.getpid():
+            # processo novo (fork do gunicorn): arquivo próprio, sem herdar o timer do pai
+            self._pid = os.getpid()
+            self._inicio = int(time.time())
+            self._timer = None
+        return os.path.join(self.diretorio, f'metricas-{self._pid}-{self._inicio}.json')
+
+    def alterado(self):
+        if not self.diretorio:
+            return
+        arquivo = self._arquivo()
+        with self.lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(INTERVALO_GRAVACAO, self.gravar, args=(arquivo,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _snapshot(self):
+        with self.lock:
+            return {nome: metrica.snapshot() for nome, metrica in self.metricas.items()}
+
+    def gravar(self, arquivo=None):
+        if not self.diretorio:
+            return
+        arquivo = arquivo or self._arquivo()
+        with self.lock:
+            self._timer = None
+        temporario = f'{arquivo}.{threading.get_ident()}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as saida:
+            json.dump(self._snapshot(), saida)
+        os.replace(temporario, arquivo)  # atômico: quem lê nunca vê o arquivo pela metade
+
+    def _valores_agregados(self):
+        if not self.diretorio:
+            return self._snapshot()
+        self.gravar()
+        total = {nome: {} for nome in self.metricas}
+        for nome_arquivo in os.listdir(self.diretorio):
+            if not (nome_arquivo.startswith('metricas-') and nome_arquivo.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.diretorio, nome_arquivo), encoding='utf-8') as entrada:
+                    snapshot = json.load(entrada)
+            except (OSError, ValueError):
+                continue
+            for nome, valores in snapshot.items():
+                if nome in self.metricas:
+                    self.metricas[nome].somar(total[nome], valores)
+        return total
+
+    def exposicao(self):
+        """Todas as métricas no formato de texto do Prometheus (somadas entre os workers)."""
+        valores = self._valores_agregados()
+        linhas = []
+        for nome, metrica in self.metricas.items():
+            linhas.append(f"# HELP {nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {nome} {metrica.tipo}")
+            linhas.extend(metrica.exposicao(valores.get(nome, {})))
+        return '\n'.join(linhas) + '\n'
+
+
+registro = Registro(getattr(settings, 'METRICAS_DIR', None))
+if registro.diretorio:
+    os.makedirs(registro.diretorio, exist_ok=True)
+    atexit.register(registro.gravar)
+
+
+# =============================
+# Métricas da aplicação
+# =============================
+agendamentos_criados = registro.contador(
+    'clinica_agendamentos_criados_total', 'Agendamentos criados pelo site.', ['tipo'])
+agendamentos_conflitos = registro.contador(
+    'clinica_agendamentos_conflitos_total', 'Reservas recusadas por horário já ocupado.', ['origem'])
+agendamentos_erros = registro.contador(
+    'clinica_agendamentos_erros_total', 'Erros inesperados ao salvar um agendamento.')
+agendamentos_concluidos = registro.contador(
+    'clinica_agendamentos_concluidos_total', 'Agendamentos concluídos (estoque descontado).')
+estoque_insuficiente = registro.contador(
+    'clinica_estoque_insuficiente_total', 'Saídas de estoque recusadas por saldo insuficiente.', ['operacao'])
+duracao_views = registro.histograma(
+    'clinica_view_duracao_segundos', 'Tempo de resposta das views instrumentadas.', ['view'])
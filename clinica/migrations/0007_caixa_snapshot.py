@@ -0,0 +1,56 @@
+# Generated by Django 4.2.5 on 2025-09-20 10:12
+
+import calendar
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def preencher_snapshots(apps, schema_editor):
+    Caixa = apps.get_model('clinica', 'Caixa')
+    Receita = apps.get_model('clinica', 'Receita')
+    Despesa = apps.get_model('clinica', 'Despesa')
+    for caixa in Caixa.objects.all():
+        inicio = datetime.date(caixa.ano, caixa.mes, 1)
+        fim = datetime.date(caixa.ano, caixa.mes, calendar.monthrange(caixa.ano, caixa.mes)[1])
+        caixa.receitas_total = Receita.objects.filter(
+            data_recebimento__range=(inicio, fim), recebido=True
+        ).aggregate(total=Sum('valor'))['total'] or 0
+        caixa.despesas_total = Despesa.objects.filter(
+            data_pagamento__range=(inicio, fim), pago=True
+        ).aggregate(total=Sum('valor'))['total'] or 0
+        caixa.calculado_em = timezone.now()
+        caixa.save(update_fields=['receitas_total', 'despesas_total', 'calculado_em'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0006_agendamento_unique_horario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='caixa',
+            name='calculado_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Calculado em'),
+        ),
+        migrations.AddField(
+            model_name='caixa',
+            name='despesas_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Total de Despesas'),
+        ),
+        migrations.AddField(
+            model_name='caixa',
+            name='fechado',
+            field=models.BooleanField(default=False, help_text='Meses fechados ficam congelados e não são mais atualizados.', verbose_name='Mês fechado?'),
+        ),
+        migrations.AddField(
+            model_name='caixa',
+            name='receitas_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Total de Receitas'),
+        ),
+        migrations.RunPython(preencher_snapshots, migrations.RunPython.noop),
+    ]
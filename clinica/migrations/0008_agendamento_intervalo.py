@@ -0,0 +1,50 @@
+# Generated by Django 4.2.5 on 2025-09-21 09:30
+
+import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+DURACAO_MINIMA = datetime.timedelta(minutes=30)
+
+def preencher_intervalos(apps, schema_editor):
+    Agendamento = apps.get_model('clinica', 'Agendamento')
+    lote = []
+    for pk, data, hora, duracao in Agendamento.objects.values_list(
+        'pk', 'data', 'hora', 'tratamento__duracao'
+    ).iterator(chunk_size=2000):
+        inicio = timezone.make_aware(datetime.datetime.combine(data, hora))
+        fim = inicio + max(datetime.timedelta(minutes=duracao or 0), DURACAO_MINIMA)
+        lote.append(Agendamento(pk=pk, inicio=inicio, fim=fim))
+        if len(lote) >= 2000:
+            Agendamento.objects.bulk_update(lote, ['inicio', 'fim'])
+            lote = []
+    if lote:
+        Agendamento.objects.bulk_update(lote, ['inicio', 'fim'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0007_caixa_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agendamento',
+            name='fim',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Término'),
+        ),
+        migrations.AddField(
+            model_name='agendamento',
+            name='inicio',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Início'),
+        ),
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['inicio', 'fim'], name='agendamento_intervalo_idx'),
+        ),
+        migrations.RunPython(preencher_intervalos, migrations.RunPython.noop),
+        # a exclusion constraint fica na 0015: só entra depois que os conflitos forem resolvidos
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.5 on 2025-09-22 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0008_agendamento_intervalo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cliente',
+            name='cpf',
+            field=models.CharField(blank=True, default='', max_length=14, verbose_name='CPF'),
+        ),
+        migrations.AddConstraint(
+            model_name='cliente',
+            constraint=models.UniqueConstraint(condition=models.Q(('cpf', ''), _negated=True), fields=('cpf',), name='unique_cliente_cpf'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.5 on 2025-09-23 11:20
+
+import re
+
+from django.db import migrations, models
+
+
+def preencher_chave_contato(apps, schema_editor):
+    Cliente = apps.get_model('clinica', 'Cliente')
+    lote = []
+    for pk, telefone, email in Cliente.objects.values_list('pk', 'telefone', 'email').iterator(chunk_size=2000):
+        digitos = re.sub(r'\D', '', telefone or '')
+        email = (email or '').strip().lower()
+        chave = f"{digitos}|{email}" if digitos or email else ''
+        lote.append(Cliente(pk=pk, chave_contato=chave))
+        if len(lote) >= 2000:
+            Cliente.objects.bulk_update(lote, ['chave_contato'])
+            lote = []
+    if lote:
+        Cliente.objects.bulk_update(lote, ['chave_contato'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0009_cliente_cpf_opcional'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='chave_contato',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=220, verbose_name='Chave de contato'),
+        ),
+        migrations.RunPython(preencher_chave_contato, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.5 on 2025-09-24 09:15
+
+from django.db import migrations, models
+
+
+# lista que ficava fixa em views.index
+DESTAQUES_INICIAIS = [
+    'Harmonização Facial',
+    'Botox',
+    'Rinomodelação',
+    'Peeling',
+    'Microagulhamento',
+    'Fios de PDO',
+    'Bioestimulador de Colágeno',
+]
+
+
+def marcar_destaques(apps, schema_editor):
+    Tratamento = apps.get_model('clinica', 'Tratamento')
+    for ordem, nome in enumerate(DESTAQUES_INICIAIS):
+        Tratamento.objects.filter(nome_tratamento=nome).update(destaque=True, ordem_destaque=ordem)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0010_cliente_chave_contato'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tratamento',
+            name='destaque',
+            field=models.BooleanField(default=False, verbose_name='Destaque na home'),
+        ),
+        migrations.AddField(
+            model_name='tratamento',
+            name='ordem_destaque',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Ordem no destaque'),
+        ),
+        migrations.AddIndex(
+            model_name='tratamento',
+            index=models.Index(condition=models.Q(('destaque', True)), fields=['ordem_destaque', 'nome_tratamento'], name='tratamento_destaque_idx'),
+        ),
+        migrations.RunPython(marcar_destaques, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.5 on 2025-09-25 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0011_tratamento_destaque'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['status', 'data'], name='agendamento_status_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='despesa',
+            index=models.Index(condition=models.Q(('pago', True)), fields=['data_pagamento', 'valor'], name='despesa_paga_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='despesa',
+            index=models.Index(fields=['data_vencimento', 'pago', 'valor'], name='despesa_vencimento_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['data', 'tipo', 'quantidade'], name='movimentacao_data_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receita',
+            index=models.Index(condition=models.Q(('recebido', True)), fields=['data_recebimento', 'valor'], name='receita_recebida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receita',
+            index=models.Index(fields=['data_recebimento', 'recebido', 'valor'], name='receita_recebimento_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.5 on 2025-09-27 10:15
+
+from django.db import DatabaseError, migrations, models, transaction
+
+
+# A busca do admin é icontains: UPPER(coluna::text) LIKE UPPER('%termo%').
+# No PostgreSQL um índice GIN de trigramas sobre a mesma expressão atende esse LIKE.
+TRIGRAMAS = [
+    ('cliente_nome_trgm_idx', 'clinica_cliente', 'nome'),
+    ('tratamento_nome_trgm_idx', 'clinica_tratamento', 'nome_tratamento'),
+]
+
+
+def criar_indices_trigrama(apps, schema_editor):
+    """Só no PostgreSQL: pg_trgm + índices da busca do autocomplete."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError:
+        print(
+            "\n  AVISO: não foi possível habilitar a extensão pg_trgm (requer permissão); "
+            "os índices de busca do autocomplete não foram criados."
+        )
+        return
+    for nome, tabela, coluna in TRIGRAMAS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela} USING gin (UPPER({coluna}::text) gin_trgm_ops)"
+        )
+
+
+def remover_indices_trigrama(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nome, _, _ in TRIGRAMAS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {nome}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0012_indices_compostos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['nome'], name='cliente_nome_idx'),
+        ),
+        migrations.RunPython(criar_indices_trigrama, remover_indices_trigrama),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.5 on 2025-09-28 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0013_indices_autocomplete'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['data', 'id'], name='agendamento_data_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['data', 'id'], name='movimentacao_data_id_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.5 on 2025-10-02 10:20
+
+from django.db import migrations
+from django.utils.timezone import localtime
+
+
+CONSTRAINT_SQL = """
+ALTER TABLE clinica_agendamento
+    ADD CONSTRAINT agendamento_sem_sobreposicao
+    EXCLUDE USING gist (tstzrange(inicio, fim, '[)') WITH &&)
+    WHERE (status <> 'CANCELADO' AND inicio IS NOT NULL AND fim IS NOT NULL)
+"""
+
+SOBREPOSICOES_SQL = """
+SELECT a.id, a.inicio, a.fim, b.id, b.inicio, b.fim
+FROM clinica_agendamento a
+JOIN clinica_agendamento b
+    ON a.id < b.id AND a.inicio < b.fim AND b.inicio < a.fim
+WHERE a.status <> 'CANCELADO' AND b.status <> 'CANCELADO'
+ORDER BY a.inicio, a.id, b.id
+"""
+
+LIMITE_LISTADOS = 50
+
+
+def criar_exclusion_constraint(apps, schema_editor):
+    """
+    Só no PostgreSQL: rejeita no INSERT/UPDATE agendamentos com intervalos
+    sobrepostos. Com sobreposições já gravadas a migração falha listando os
+    pares; cancele ou remarque um de cada par e rode o migrate de novo.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_constraint WHERE conname = 'agendamento_sem_sobreposicao'"
+        )
+        if cursor.fetchone():
+            return
+        cursor.execute(SOBREPOSICOES_SQL)
+        conflitos = cursor.fetchall()
+    if conflitos:
+        linhas = [
+            f"  #{id_a} {localtime(inicio_a):%d/%m/%Y %H:%M}-{localtime(fim_a):%H:%M}"
+            f"  x  #{id_b} {localtime(inicio_b):%d/%m/%Y %H:%M}-{localtime(fim_b):%H:%M}"
+            for id_a, inicio_a, fim_a, id_b, inicio_b, fim_b in conflitos[:LIMITE_LISTADOS]
+        ]
+        if len(conflitos) > LIMITE_LISTADOS:
+            linhas.append(f"  ... e mais {len(conflitos) - LIMITE_LISTADOS} par(es)")
+        raise RuntimeError(
+            f"{len(conflitos)} par(es) de agendamentos sobrepostos impedem a constraint "
+            "agendamento_sem_sobreposicao. Cancele ou remarque um agendamento de cada par "
+            "e rode o migrate de novo:\n" + "\n".join(linhas)
+        )
+    schema_editor.execute(CONSTRAINT_SQL)
+
+
+def remover_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "ALTER TABLE clinica_agendamento DROP CONSTRAINT IF EXISTS agendamento_sem_sobreposicao"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0014_indices_keyset'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_exclusion_constraint, remover_exclusion_constraint),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.5 on 2025-10-02 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0015_agendamento_sem_sobreposicao'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='agendamento',
+            name='unique_cliente_horario',
+        ),
+        migrations.RemoveConstraint(
+            model_name='agendamento',
+            name='unique_horario',
+        ),
+        migrations.AddConstraint(
+            model_name='agendamento',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'CANCELADO'), _negated=True), fields=('cliente', 'data', 'hora'), name='unique_cliente_horario'),
+        ),
+        migrations.AddConstraint(
+            model_name='agendamento',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'CANCELADO'), _negated=True), fields=('data', 'hora'), name='unique_horario'),
+        ),
+    ]
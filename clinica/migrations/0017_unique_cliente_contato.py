@@ -0,0 +1,40 @@
+# Generated by Django 4.2.5 on 2025-10-02 11:10
+
+from django.db import migrations, models
+
+from clinica.mesclagem import grupos_duplicados, mesclar_lote
+
+
+LOTE_GRUPOS = 500
+
+
+def mesclar_duplicados(apps, schema_editor):
+    """
+    Clientes já duplicados pelo contato impediriam a constraint: mescla-os antes,
+    como o `manage.py mesclar_clientes` (agendamentos, CPF e nascimento vão para o
+    cliente mais antigo).
+    """
+    Cliente = apps.get_model('clinica', 'Cliente')
+    Agendamento = apps.get_model('clinica', 'Agendamento')
+    grupos = grupos_duplicados(Cliente)
+    for inicio in range(0, len(grupos), LOTE_GRUPOS):
+        mesclar_lote(Cliente, Agendamento, dict(grupos[inicio:inicio + LOTE_GRUPOS]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0016_unique_horario_sem_cancelados'),
+    ]
+
+    operations = [
+        migrations.RunPython(mesclar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cliente',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('chave_contato', ''), _negated=True),
+                fields=('chave_contato',),
+                name='unique_cliente_contato',
+            ),
+        ),
+    ]
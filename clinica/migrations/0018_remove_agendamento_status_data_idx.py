@@ -0,0 +1,17 @@
+# Generated by Django 4.2.5 on 2025-10-02 11:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0017_unique_cliente_contato'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='agendamento',
+            name='agendamento_status_data_idx',
+        ),
+    ]
@@ -1,10 +1,14 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
-from django.db import models, transaction
+from django.db import IntegrityError, models, transaction
 from django.utils import timezone
-from django.db.models import Sum
+from django.db.models import Sum, F, Case, When, Value
 from datetime import timedelta
 import calendar
+import re
+
+from . import metricas
+from .invalidacao import invalidar
 
 # =============================
 # Usuário
@@ -44,6 +48,10 @@ DURACAO_CHOICES = [
 ]
 
 
+# um agendamento sem duração cadastrada ainda ocupa ao menos um horário da agenda
+DURACAO_MINIMA_AGENDAMENTO = timedelta(minutes=30)
+
+
 class TiposTratamentos(models.TextChoices):
     FACIAL = 'Facial', 'Facial'
     LABIAL = 'Labial', 'Labial'
@@ -65,16 +73,106 @@ class Tratamento(models.Model):
     )
     preco = models.DecimalField('Preço', max_digits=10, decimal_places=2, blank=True, null=True)
     descricao = models.CharField('Descrição', max_length=250)
+    destaque = models.BooleanField('Destaque na home', default=False)
+    ordem_destaque = models.PositiveSmallIntegerField('Ordem no destaque', default=0)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
 
+    class Meta:
+        indexes = [
+            # índice parcial: só os poucos tratamentos em destaque, já na ordem da home
+            models.Index(
+                fields=['ordem_destaque', 'nome_tratamento'],
+                condition=models.Q(destaque=True),
+                name='tratamento_destaque_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.nome_tratamento
 
+    @classmethod
+    def em_destaque(cls):
+        """Tratamentos da home, na ordem definida no admin (só as colunas exibidas)."""
+        return cls.objects.filter(destaque=True).order_by('ordem_destaque', 'nome_tratamento').values(
+            'nome_tratamento', 'descricao'
+        )
+
     @property
     def duracao_timedelta(self):
         return timedelta(minutes=self.duracao or 0)
 
+    @property
+    def duracao_agendamento(self):
+        """Tempo que um agendamento deste tratamento ocupa na agenda."""
+        return max(self.duracao_timedelta, DURACAO_MINIMA_AGENDAMENTO)
+
+    def conflitos_de_duracao(self):
+        """
+        [(agendamento, outro)] de agendamentos futuros deste tratamento que passariam
+        a sobrepor outro com a duração atual de self (o término é recalculado no save).
+        """
+        if not self.pk:
+            return []
+        duracao = self.duracao_agendamento
+        afetados = list(
+            Agendamento.objects.filter(tratamento_id=self.pk, inicio__gte=timezone.now())
+            .exclude(status='CANCELADO').values_list('id', 'inicio')
+        )
+        if not afetados:
+            return []
+        ids = {pk for pk, _ in afetados}
+        inicio = min(inicio for _, inicio in afetados)
+        fim = max(inicio for _, inicio in afetados) + duracao
+        intervalos = [(inicio, inicio + duracao, pk) for pk, inicio in afetados] + list(
+            Agendamento.sobrepostos(inicio, fim).exclude(pk__in=ids).values_list('inicio', 'fim', 'id')
+        )
+        intervalos.sort()
+
+        # varredura por início: cada intervalo contra o que termina mais tarde entre os anteriores
+        conflitos, anterior = [], None
+        for atual in intervalos:
+            if anterior and atual[0] < anterior[1] and (atual[2] in ids or anterior[2] in ids):
+                conflitos.append((anterior, atual))
+            if anterior is None or atual[1] > anterior[1]:
+                anterior = atual
+        return conflitos
+
+    @staticmethod
+    def mensagem_conflitos(conflitos):
+        horarios = ', '.join(
+            f"#{a[2]} ({timezone.localtime(a[0]):%d/%m %H:%M}) x #{b[2]} ({timezone.localtime(b[0]):%d/%m %H:%M})"
+            for a, b in conflitos[:10]
+        )
+        return (
+            f"Com esta duração, {len(conflitos)} agendamento(s) futuro(s) passariam a se sobrepor: "
+            f"{horarios}. Remarque-os antes de aumentar a duração."
+        )
+
+    def validar_duracao(self):
+        """
+        Aumentar a duração recalcula o término dos agendamentos futuros (signal
+        atualizar_fim_agendamentos); recusa antes de gravar se isso criaria sobreposições.
+        """
+        if not self.pk:
+            return
+        anterior = Tratamento.objects.filter(pk=self.pk).values_list('duracao', flat=True).first()
+        anterior = max(timedelta(minutes=anterior or 0), DURACAO_MINIMA_AGENDAMENTO)
+        if self.duracao_agendamento > anterior:
+            conflitos = self.conflitos_de_duracao()
+            if conflitos:
+                raise ValidationError({'duracao': self.mensagem_conflitos(conflitos)})
+
+    def clean(self):
+        super().clean()
+        self.validar_duracao()
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'duracao' in update_fields:
+            self.validar_duracao()
+        super().save(*args, **kwargs)
+
 
 # =============================
 # Clientes
@@ -89,17 +187,76 @@ class TipoGenero(models.TextChoices):
 class Cliente(models.Model):
     nome = models.CharField('Nome', max_length=200)
     dt_nascimento = models.DateField('Data de Nascimento', null=True, blank=True)
-    cpf = models.CharField('CPF', max_length=14, unique=True, blank=True, null=False, default="")
+    cpf = models.CharField('CPF', max_length=14, blank=True, null=False, default="")
     telefone = models.CharField('Telefone', max_length=14)
     email = models.EmailField('E-mail', max_length=200)
     sexo = models.CharField('Gênero', max_length=25, choices=TipoGenero.choices, null=True, blank=True)
     observacoes = models.CharField('Observações', max_length=255, null=True, blank=True)
+    # telefone só com dígitos + e-mail minúsculo: identifica o mesmo paciente entre agendamentos
+    chave_contato = models.CharField('Chave de contato', max_length=220, blank=True, default='', editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
 
+    class Meta:
+        constraints = [
+            # CPF é opcional (o agendamento online não pede): só os preenchidos precisam ser únicos
+            models.UniqueConstraint(
+                fields=['cpf'],
+                condition=~models.Q(cpf=''),
+                name='unique_cliente_cpf'
+            ),
+            # o mesmo telefone/e-mail é o mesmo paciente (ver mesclar_clientes);
+            # impede duplicados de reservas concorrentes no agendamento online
+            models.UniqueConstraint(
+                fields=['chave_contato'],
+                condition=~models.Q(chave_contato=''),
+                name='unique_cliente_contato'
+            ),
+        ]
+        indexes = [
+            # ordem do autocomplete do admin (primeira página sem termo de busca)
+            models.Index(fields=['nome'], name='cliente_nome_idx'),
+        ]
+
     def __str__(self):
         return self.nome
 
+    @staticmethod
+    def normalizar_chave_contato(telefone, email):
+        digitos = re.sub(r'\D', '', telefone or '')
+        email = (email or '').strip().lower()
+        if not digitos and not email:
+            return ''
+        return f"{digitos}|{email}"
+
+    def save(self, *args, **kwargs):
+        self.chave_contato = self.normalizar_chave_contato(self.telefone, self.email)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'telefone', 'email'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'chave_contato'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def obter_ou_criar_por_contato(cls, nome, telefone, email, **extras):
+        """
+        Agendamento online: reaproveita o cliente com o mesmo telefone/e-mail
+        normalizados em vez de criar um duplicado (o cadastro existente não é
+        alterado). Retorna (cliente, criado).
+        """
+        chave = cls.normalizar_chave_contato(telefone, email)
+        # get_or_create invertido: o INSERT vem primeiro porque no SQLite começar por
+        # SELECT e depois escrever gera "database is locked" em reservas concorrentes.
+        # Contato já cadastrado (ou criado por outra reserva no mesmo instante) cai
+        # em unique_cliente_contato e é buscado.
+        try:
+            with transaction.atomic():
+                return cls.objects.create(nome=nome, telefone=telefone, email=email, **extras), True
+        except IntegrityError:
+            cliente = cls.objects.filter(chave_contato=chave).first() if chave else None
+            if cliente is None:
+                raise  # outra constraint (ex.: CPF repetido)
+            return cliente, False
+
 
 # =============================
 # Agendamentos
@@ -127,6 +284,11 @@ class Agendamento(models.Model):
     # novo campo persistido para marcar que já descontou estoque
     estoque_descontado = models.BooleanField('Estoque descontado?', default=False, db_index=True)
 
+    # intervalo ocupado na agenda [inicio, fim), calculado a partir de data/hora e da
+    # duração do tratamento; no PostgreSQL uma exclusion constraint impede sobreposição
+    inicio = models.DateTimeField('Início', null=True, editable=False)
+    fim = models.DateTimeField('Término', null=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
 
@@ -136,14 +298,23 @@ class Agendamento(models.Model):
             # Impede dois agendamentos para o mesmo cliente no mesmo horário
             models.UniqueConstraint(
                 fields=['cliente', 'data', 'hora'],
+                condition=~models.Q(status='CANCELADO'),
                 name='unique_cliente_horario'
             ),
-            # Impede que clientes diferentes marquem no mesmo horário
+            # Impede que clientes diferentes marquem no mesmo horário; cancelados não
+            # ocupam o horário (como na exclusion constraint e em disponibilidade.py)
             models.UniqueConstraint(
                 fields=['data', 'hora'],
+                condition=~models.Q(status='CANCELADO'),
                 name='unique_horario'
             ),
         ]
+        indexes = [
+            # atende a consulta de sobreposição: inicio < fim_novo AND fim > inicio_novo
+            models.Index(fields=['inicio', 'fim'], name='agendamento_intervalo_idx'),
+            # paginação por chave do admin: (data, id) em ordem decrescente
+            models.Index(fields=['data', 'id'], name='agendamento_data_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.cliente.nome} - {self.tratamento.nome_tratamento} - {self.data} - {self.hora}"
@@ -151,59 +322,149 @@ class Agendamento(models.Model):
     # REMOVA o override complexo de save() que fazia desconto. 
     # (Se você tiver um save() como no código original, delete essa função.)
 
+    def calcular_intervalo(self):
+        self.inicio = timezone.make_aware(timezone.datetime.combine(self.data, self.hora))
+        self.fim = self.inicio + self.tratamento.duracao_agendamento
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'data', 'hora', 'tratamento'} & set(update_fields):
+            self.calcular_intervalo()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'inicio', 'fim'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def sobrepostos(cls, inicio, fim):
+        """Agendamentos ativos cujo intervalo sobrepõe [inicio, fim) — uma única query de intervalo."""
+        return cls.objects.filter(inicio__lt=fim, fim__gt=inicio).exclude(status='CANCELADO')
+
     def descontar_estoque_e_concluir(self):
         """
-        Valida estoque, cria MovimentacaoEstoque para cada consumo e marca agendamento como CONCLUIDO.
-        Lança ValidationError se estoque insuficiente. Usa transaction + select_for_update para segurança.
+        Valida estoque, lança as saídas de estoque dos consumos e marca agendamento como CONCLUIDO.
+        Lança ValidationError se estoque insuficiente. Tudo em uma transação, com número
+        constante de queries independente da quantidade de produtos consumidos.
         """
         if self.estoque_descontado:
             # já foi feito antes — nada a fazer
             return
 
-        # carrega consumos e produtos relacionados
-        consumos = list(self.consumos.select_related('produto').all())
-        if not consumos:
-            # não há consumo: apenas marca o agendamento como concluído
-            self.status = 'CONCLUIDO'
-            self.estoque_descontado = True
-            self.save(update_fields=['status', 'estoque_descontado'])
-            return
-
-        # somar quantidades por produto (caso haja múltiplos consumos do mesmo produto)
-        necessidade_por_produto = {}
-        product_ids = set()
-        for c in consumos:
-            pid = c.produto.id
-            necessidade_por_produto[pid] = necessidade_por_produto.get(pid, 0) + c.quantidade
-            product_ids.add(pid)
-
-        # bloqueia os produtos e valida + cria movimentações atomically
         with transaction.atomic():
-            produtos_bloqueados = Produto.objects.select_for_update().filter(id__in=product_ids)
-            produtos_map = {p.id: p for p in produtos_bloqueados}
-
-            # valida estoque agregado
-            for pid, qtd_necessaria in necessidade_por_produto.items():
-                produto = produtos_map.get(pid)
-                if produto is None:
-                    raise ValidationError(f"Produto id={pid} não encontrado.")
-                if produto.quantidade_estoque < qtd_necessaria:
-                    raise ValidationError(f"Estoque insuficiente para {produto.nome}: disponível {produto.quantidade_estoque}, necessário {qtd_necessaria}.")
-
-            # se passou, cria MovimentacaoEstoque para cada consumo — MovimentacaoEstoque.save()
-            # já aplica o atualizar_estoque porque MovimentacaoEstoque.save() chama produto.atualizar_estoque
-            for consumo in consumos:
-                MovimentacaoEstoque.objects.create(
-                    produto=produtos_map[consumo.produto.id],
-                    tipo='SAIDA',
-                    quantidade=consumo.quantidade,
-                    motivo=f'Uso no agendamento {self.id} - {self.cliente.nome}'
+            # o UPDATE condicional serializa conclusões concorrentes do mesmo agendamento
+            concluido = Agendamento.objects.filter(pk=self.pk, estoque_descontado=False).update(
+                status='CONCLUIDO', estoque_descontado=True, updated_at=timezone.now()
+            )
+            invalidar(Agendamento)
+
+            # consumos lidos já com o agendamento travado pelo UPDATE, na mesma transação da baixa;
+            # somar quantidades por produto (caso haja múltiplos consumos do mesmo produto)
+            necessidade_por_produto = {}
+            if concluido:
+                for produto_id, quantidade in self.consumos.values_list('produto_id', 'quantidade'):
+                    necessidade_por_produto[produto_id] = necessidade_por_produto.get(produto_id, 0) + quantidade
+            if necessidade_por_produto:
+                cliente_nome = Cliente.objects.filter(pk=self.cliente_id).values_list('nome', flat=True).first()
+                MovimentacaoEstoque.lancar_saidas(
+                    necessidade_por_produto,
+                    motivo=f'Uso no agendamento {self.id} - {cliente_nome}'
                 )
 
-            # marca concluído e sinaliza estoque descontado
-            self.status = 'CONCLUIDO'
-            self.estoque_descontado = True
-            self.save(update_fields=['status', 'estoque_descontado'])
+        if concluido:
+            metricas.agendamentos_concluidos.inc()
+        self.status = 'CONCLUIDO'
+        self.estoque_descontado = True
+
+    @classmethod
+    def concluir_em_lote(cls, agendamento_ids):
+        """
+        Conclui vários agendamentos de uma vez (fechamento do dia).
+        Trava os agendamentos do lote e os produtos envolvidos uma única vez, carrega todos os
+        consumos em uma query, valida o estoque somado do lote e lança todas as movimentações juntas.
+        Agendamentos sem estoque suficiente ficam de fora sem abortar os demais.
+        Retorna (ids_concluidos, {id: mensagem_de_falha}).
+        """
+        with transaction.atomic():
+            # trava os agendamentos do lote (depois os produtos, na mesma ordem de
+            # descontar_estoque_e_concluir): outra conclusão espera e relê o estado já concluído
+            agendamentos = list(
+                cls.objects.select_for_update(of=('self',)).filter(pk__in=agendamento_ids)
+                .order_by('data', 'hora', 'id')
+                .values_list('id', 'cliente__nome', 'status', 'estoque_descontado')
+            )
+            falhas = {}
+            encontrados = {ag_id for ag_id, *_ in agendamentos}
+            for ag_id in agendamento_ids:
+                if ag_id not in encontrados:
+                    falhas[ag_id] = "Agendamento não encontrado."
+
+            pendentes = []
+            for ag_id, cliente_nome, status, estoque_descontado in agendamentos:
+                if estoque_descontado:
+                    falhas[ag_id] = "Agendamento já concluído."
+                elif status == 'CANCELADO':
+                    falhas[ag_id] = "Agendamento cancelado não pode ser concluído."
+                else:
+                    pendentes.append((ag_id, cliente_nome))
+            if not pendentes:
+                return [], falhas
+
+            # necessidade por agendamento: {agendamento_id: {produto_id: quantidade}}
+            consumos = {}
+            for ag_id, produto_id, quantidade in ConsumoProduto.objects.filter(
+                agendamento_id__in=[ag_id for ag_id, _ in pendentes]
+            ).values_list('agendamento_id', 'produto_id', 'quantidade'):
+                por_produto = consumos.setdefault(ag_id, {})
+                por_produto[produto_id] = por_produto.get(produto_id, 0) + quantidade
+
+            produto_ids = {pid for por_produto in consumos.values() for pid in por_produto}
+            produtos = {
+                pid: [nome, quantidade]
+                for pid, nome, quantidade in Produto.objects.select_for_update()
+                .filter(pk__in=produto_ids).order_by('pk')
+                .values_list('id', 'nome', 'quantidade_estoque')
+            }
+
+            concluidos = []
+            total_por_produto = {}
+            movimentacoes = []
+            for ag_id, cliente_nome in pendentes:
+                necessidade = consumos.get(ag_id, {})
+                erros = []
+                for pid, qtd in necessidade.items():
+                    if pid not in produtos:
+                        erros.append(f"Produto id={pid} não encontrado.")
+                    elif produtos[pid][1] < qtd:
+                        metricas.estoque_insuficiente.inc(operacao='concluir_em_lote')
+                        erros.append(f"Estoque insuficiente para {produtos[pid][0]}: disponível {produtos[pid][1]}, necessário {qtd}.")
+                if erros:
+                    falhas[ag_id] = ' '.join(erros)
+                    continue
+
+                for pid, qtd in necessidade.items():
+                    produtos[pid][1] -= qtd
+                    total_por_produto[pid] = total_por_produto.get(pid, 0) + qtd
+                    movimentacoes.append(MovimentacaoEstoque(
+                        produto_id=pid, tipo='SAIDA', quantidade=qtd,
+                        motivo=f'Uso no agendamento {ag_id} - {cliente_nome}'
+                    ))
+                concluidos.append(ag_id)
+
+            if concluidos:
+                # UPDATE condicional antes de mexer no estoque, como em descontar_estoque_e_concluir:
+                # se algum já foi concluído por fora (banco sem trava de linha), desfaz o lote inteiro
+                alterados = cls.objects.filter(pk__in=concluidos, estoque_descontado=False).exclude(
+                    status='CANCELADO'
+                ).update(status='CONCLUIDO', estoque_descontado=True, updated_at=timezone.now())
+                if alterados != len(concluidos):
+                    raise ValidationError(
+                        "Agendamentos do lote foram alterados por outra operação; nada foi descontado. Tente de novo."
+                    )
+                Produto.baixar_estoque(total_por_produto)
+                MovimentacaoEstoque.objects.bulk_create(movimentacoes)
+                invalidar(cls, MovimentacaoEstoque)
+
+        metricas.agendamentos_concluidos.inc(len(concluidos))
+        return concluidos, falhas
 
 
 # =============================
@@ -228,6 +489,14 @@ class Despesa(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Caixa.total_despesas: só as pagas, por data de pagamento (cobre o SUM)
+            models.Index(fields=['data_pagamento', 'valor'], condition=models.Q(pago=True), name='despesa_paga_idx'),
+            # série mensal do dashboard: faixa de vencimento, total e pagas
+            models.Index(fields=['data_vencimento', 'pago', 'valor'], name='despesa_vencimento_idx'),
+        ]
+
     @property
     def esta_atrasada(self):
         return not self.pago and self.data_vencimento < timezone.now().date()
@@ -268,6 +537,12 @@ class Receita(models.Model):
         ordering = ['-data_recebimento', '-id']
         verbose_name = 'Receita'
         verbose_name_plural = 'Receitas'
+        indexes = [
+            # Caixa.total_receitas: só as recebidas, por data de recebimento (cobre o SUM)
+            models.Index(fields=['data_recebimento', 'valor'], condition=models.Q(recebido=True), name='receita_recebida_idx'),
+            # série mensal do dashboard: recebidas e a receber no mesmo GROUP BY
+            models.Index(fields=['data_recebimento', 'recebido', 'valor'], name='receita_recebimento_idx'),
+        ]
 
     def __str__(self):
         if self.agendamento:
@@ -282,6 +557,14 @@ class Caixa(models.Model):
     ano = models.PositiveIntegerField()
     mes = models.PositiveIntegerField()
 
+    # snapshot materializado do mês: atualizado incrementalmente pelos signals
+    # de Receita/Despesa (clinica/signals.py) e recalculado sob demanda
+    receitas_total = models.DecimalField('Total de Receitas', max_digits=12, decimal_places=2, default=0, editable=False)
+    despesas_total = models.DecimalField('Total de Despesas', max_digits=12, decimal_places=2, default=0, editable=False)
+    calculado_em = models.DateTimeField('Calculado em', null=True, blank=True, editable=False)
+    fechado = models.BooleanField('Mês fechado?', default=False,
+                                  help_text='Meses fechados ficam congelados e não são mais atualizados.')
+
     @property
     def data_inicial(self):
         return timezone.datetime(self.ano, self.mes, 1).date()
@@ -293,21 +576,64 @@ class Caixa(models.Model):
 
     @property
     def total_receitas(self):
-        return Receita.objects.filter(
-            data_recebimento__range=(self.data_inicial, self.data_final),
-            recebido=True
-        ).aggregate(total=Sum('valor'))['total'] or 0
+        return self.receitas_total
 
     @property
     def total_despesas(self):
-        return Despesa.objects.filter(
+        return self.despesas_total
+
+    @property
+    def saldo(self):
+        return self.receitas_total - self.despesas_total
+
+    def calcular_totais(self):
+        """Recalcula os totais do mês direto das Receitas/Despesas (sem salvar)."""
+        self.receitas_total = Receita.objects.filter(
+            data_recebimento__range=(self.data_inicial, self.data_final),
+            recebido=True
+        ).aggregate(total=Sum('valor'))['total'] or 0
+        self.despesas_total = Despesa.objects.filter(
             data_pagamento__range=(self.data_inicial, self.data_final),
             pago=True
         ).aggregate(total=Sum('valor'))['total'] or 0
+        self.calculado_em = timezone.now()
+
+    def recalcular(self):
+        """Reconciliação explícita do snapshot. Meses fechados não são alterados."""
+        if self.fechado:
+            return False
+        self.calcular_totais()
+        self.save(update_fields=['receitas_total', 'despesas_total', 'calculado_em'])
+        return True
+
+    @classmethod
+    def aplicar_delta(cls, data, receitas=0, despesas=0):
+        """Soma os deltas ao snapshot (aberto) do mês de `data` com um UPDATE atômico."""
+        if data is None or (not receitas and not despesas):
+            return
+        cls.objects.filter(ano=data.year, mes=data.month, fechado=False).update(
+            receitas_total=F('receitas_total') + receitas,
+            despesas_total=F('despesas_total') + despesas,
+            calculado_em=timezone.now(),
+        )
+
+    def periodo_alterado(self):
+        """True se `ano`/`mes` diferem dos gravados no banco."""
+        if self._state.adding:
+            return False
+        return not Caixa.objects.filter(pk=self.pk, ano=self.ano, mes=self.mes).exists()
 
-    @property
-    def saldo(self):
-        return self.total_receitas - self.total_despesas
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # o snapshot é do mês: trocar o período recalcula (mesmo fechado, os
+        # totais congelados eram de outro mês)
+        if (self._state.adding and not self.fechado) or (
+            (update_fields is None or {'ano', 'mes'} & set(update_fields)) and self.periodo_alterado()
+        ):
+            self.calcular_totais()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'receitas_total', 'despesas_total', 'calculado_em'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Caixa {self.mes}/{self.ano} - Saldo: R$ {self.saldo:.2f}"
@@ -339,11 +665,49 @@ class Produto(models.Model):
             self.quantidade_estoque += quantidade
         elif tipo == 'SAIDA':
             if quantidade > self.quantidade_estoque:
+                metricas.estoque_insuficiente.inc(operacao='atualizar_estoque')
                 raise ValidationError(f"Estoque insuficiente: {self.quantidade_estoque} disponível")
             self.quantidade_estoque -= quantidade
         else:
             raise ValidationError("Tipo de movimentação inválido")
-        self.save()
+        self.save(update_fields=['quantidade_estoque', 'updated_at'])
+
+    @classmethod
+    def baixar_estoque(cls, necessidade_por_produto):
+        """
+        Desconta {produto_id: quantidade} com um único UPDATE condicional (F() + CASE),
+        que só afeta produtos com saldo suficiente. Se algum produto ficaria negativo,
+        lança ValidationError — quem chama deve estar em transaction.atomic() para desfazer.
+        """
+        if not necessidade_por_produto:
+            return
+        ids = sorted(necessidade_por_produto)
+        necessidade = Case(
+            *[When(pk=pid, then=Value(necessidade_por_produto[pid])) for pid in ids],
+            output_field=models.PositiveIntegerField(),
+        )
+        atualizados = cls.objects.filter(pk__in=ids, quantidade_estoque__gte=necessidade).update(
+            quantidade_estoque=F('quantidade_estoque') - necessidade,
+            updated_at=timezone.now(),
+        )
+        if atualizados != len(ids):
+            metricas.estoque_insuficiente.inc(operacao='baixar_estoque')
+            raise ValidationError(cls._mensagens_estoque_insuficiente(necessidade_por_produto))
+        invalidar(cls)
+
+    @classmethod
+    def _mensagens_estoque_insuficiente(cls, necessidade_por_produto):
+        produtos = cls.objects.filter(pk__in=necessidade_por_produto).values_list('id', 'nome', 'quantidade_estoque')
+        encontrados = {pid: (nome, qtd) for pid, nome, qtd in produtos}
+        mensagens = []
+        for pid, qtd_necessaria in necessidade_por_produto.items():
+            if pid not in encontrados:
+                mensagens.append(f"Produto id={pid} não encontrado.")
+                continue
+            nome, disponivel = encontrados[pid]
+            if disponivel < qtd_necessaria:
+                mensagens.append(f"Estoque insuficiente para {nome}: disponível {disponivel}, necessário {qtd_necessaria}.")
+        return mensagens
 
     def __str__(self):
         return self.nome
@@ -361,6 +725,25 @@ class MovimentacaoEstoque(models.Model):
     motivo = models.CharField('Motivo', max_length=255, blank=True, null=True)
     data = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # entradas/saídas por mês: faixa de datas, tipo e quantidade lidos do próprio índice
+            models.Index(fields=['data', 'tipo', 'quantidade'], name='movimentacao_data_tipo_idx'),
+            # paginação por chave do admin: (data, id) em ordem decrescente
+            models.Index(fields=['data', 'id'], name='movimentacao_data_id_idx'),
+        ]
+
+    @classmethod
+    def lancar_saidas(cls, necessidade_por_produto, motivo):
+        """Baixa o estoque e registra uma SAIDA por produto com bulk_create (sem o save() por linha)."""
+        Produto.baixar_estoque(necessidade_por_produto)
+        movimentacoes = cls.objects.bulk_create([
+            cls(produto_id=pid, tipo='SAIDA', quantidade=quantidade, motivo=motivo)
+            for pid, quantidade in necessidade_por_produto.items()
+        ])
+        invalidar(cls)
+        return movimentacoes
+
     def save(self, *args, **kwargs):
         """Atualiza estoque automaticamente ao salvar movimentação"""
         if not self.pk:  # só na criação
@@ -0,0 +1,145 @@
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+# =============================
+# Contagem estimada
+# =============================
+# O COUNT(*) exato da paginação é o que pesa em tabelas grandes. Sem filtros, no
+# PostgreSQL, vale a estimativa do planner (pg_class.reltuples, atualizada pelo
+# ANALYZE/autovacuum); nos outros casos conta-se no máximo LIMITE_CONTAGEM linhas.
+LIMITE_CONTAGEM = 10000
+
+
+def contagem_estimada(queryset, limite=LIMITE_CONTAGEM):
+    """(total, exato): exato=False quando o total é a estimativa do PostgreSQL ou o limite foi atingido."""
+    conexao = connections[queryset.db]
+    if conexao.vendor == 'postgresql' and not queryset.query.where:
+        with conexao.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [conexao.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            linha = cursor.fetchone()
+        # reltuples é -1 (nunca analisada) ou impreciso em tabelas pequenas: aí o COUNT é barato
+        if linha and linha[0] > limite:
+            return linha[0], False
+
+    contagem = queryset.order_by()[:limite + 1].count()
+    return min(contagem, limite), contagem <= limite
+
+
+class PaginadorEstimado(Paginator):
+    """Paginator do admin com contagem estimada (ver contagem_estimada)."""
+
+    @cached_property
+    def count(self):
+        total, self.exata = contagem_estimada(self.object_list)
+        return total
+
+
+# =============================
+# Paginação por chave (keyset)
+# =============================
+# Na ordem padrão (campo_keyset desc, id desc) as páginas seguem o último item
+# visto (?apos=<valor>,<id>) ou o primeiro (?antes=<valor>,<id>) em vez de um
+# OFFSET: o custo de qualquer página é o de uma faixa do índice (campo, id).
+APOS_VAR = 'apos'
+ANTES_VAR = 'antes'
+
+
+class ChangeListTabelaGrande(ChangeList):
+    def get_filters_params(self, params=None):
+        parametros = super().get_filters_params(params)
+        parametros.pop(APOS_VAR, None)
+        parametros.pop(ANTES_VAR, None)
+        return parametros
+
+    def _ler_cursor(self, nome):
+        texto = self.params.get(nome)
+        if not texto:
+            return None
+        try:
+            valor, pk = texto.rsplit(',', 1)
+            return self.opts.get_field(self.model_admin.campo_keyset).to_python(valor), int(pk)
+        except (ValueError, ValidationError):
+            raise IncorrectLookupParameters
+
+    def _cursor(self, obj):
+        return f"{getattr(obj, self.model_admin.campo_keyset).isoformat()},{obj.pk}"
+
+    def get_results(self, request):
+        # com outra ordenação escolhida na tabela, paginação comum (ainda com contagem estimada)
+        self.keyset = ORDER_VAR not in self.params
+        if not self.keyset:
+            super().get_results(request)
+            self.contagem_limitada = not self.paginator.exata
+            return
+
+        campo = self.model_admin.campo_keyset
+        apos, antes = self._ler_cursor(APOS_VAR), self._ler_cursor(ANTES_VAR)
+        queryset = self.queryset
+        if antes:
+            valor, pk = antes
+            # o limite simples (campo >= valor) é o que deixa o banco começar a varredura no ponto certo
+            queryset = queryset.filter(**{f'{campo}__gte': valor}).filter(
+                Q(**{f'{campo}__gt': valor}) | Q(**{campo: valor, 'pk__gt': pk})
+            ).order_by(campo, 'pk')
+        else:
+            if apos:
+                valor, pk = apos
+                queryset = queryset.filter(**{f'{campo}__lte': valor}).filter(
+                    Q(**{f'{campo}__lt': valor}) | Q(**{campo: valor, 'pk__lt': pk})
+                )
+            queryset = queryset.order_by(f'-{campo}', '-pk')
+
+        linhas = list(queryset[:self.list_per_page + 1])
+        mais = len(linhas) > self.list_per_page
+        linhas = linhas[:self.list_per_page]
+        if antes:
+            linhas.reverse()
+            tem_anterior, tem_proxima = mais, True
+        else:
+            tem_anterior, tem_proxima = bool(apos), mais
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.contagem_limitada = not self.paginator.exata
+        self.result_list = linhas
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = tem_anterior or tem_proxima
+
+        remover = [APOS_VAR, ANTES_VAR, PAGE_VAR]
+        self.url_inicio = self.get_query_string(remove=remover) if tem_anterior else None
+        self.url_anterior = (
+            self.get_query_string({ANTES_VAR: self._cursor(linhas[0])}, remover) if tem_anterior and linhas else None
+        )
+        self.url_proxima = (
+            self.get_query_string({APOS_VAR: self._cursor(linhas[-1])}, remover) if tem_proxima and linhas else None
+        )
+
+
+class TabelaGrandeMixin:
+    """
+    Modo de changelist para tabelas grandes: contagem estimada, paginação por
+    chave em (campo_keyset, id) e date_hierarchy no mesmo campo (que precisa de
+    índice). Sem list_editable: a página é uma lista, não um queryset.
+    """
+    campo_keyset = 'data'
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    change_list_template = 'admin/clinica/change_list_tabela_grande.html'
+
+    def get_changelist(self, request, **kwargs):
+        return ChangeListTabelaGrande
+
+    def get_ordering(self, request):
+        return (f'-{self.campo_keyset}', '-pk')
@@ -0,0 +1,127 @@
+import logging
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import imagens, invalidacao
+from .models import (
+    CustomUser, Caixa, Receita, Despesa, Agendamento, Tratamento, Cliente, CategoriaDespesa,
+    Produto, MovimentacaoEstoque,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+# =============================
+# Snapshot mensal do Caixa
+# =============================
+def _contribuicao_receita(receita):
+    """(data que define o mês, valor) com que a receita entra no Caixa."""
+    if receita.recebido and receita.data_recebimento:
+        return receita.data_recebimento, receita.valor
+    return None, 0
+
+
+def _contribuicao_despesa(despesa):
+    if despesa.pago and despesa.data_pagamento:
+        return despesa.data_pagamento, despesa.valor
+    return None, 0
+
+
+def _mes(data):
+    return (data.year, data.month) if data else None
+
+
+def _guardar_anterior(instance, contribuicao):
+    """Antes de salvar, guarda a contribuição do registro como está no banco."""
+    instance._caixa_anterior = (None, 0)
+    if instance.pk:
+        anterior = type(instance).objects.filter(pk=instance.pk).first()
+        if anterior is not None:
+            instance._caixa_anterior = contribuicao(anterior)
+
+
+def _aplicar(anterior, atual, campo):
+    data_anterior, valor_anterior = anterior
+    data_atual, valor_atual = atual
+    if _mes(data_anterior) == _mes(data_atual):
+        Caixa.aplicar_delta(data_atual, **{campo: valor_atual - valor_anterior})
+    else:
+        Caixa.aplicar_delta(data_anterior, **{campo: -valor_anterior})
+        Caixa.aplicar_delta(data_atual, **{campo: valor_atual})
+
+
+@receiver(pre_save, sender=Receita)
+def receita_pre_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _guardar_anterior(instance, _contribuicao_receita)
+
+
+@receiver(post_save, sender=Receita)
+def receita_post_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _aplicar(getattr(instance, '_caixa_anterior', (None, 0)), _contribuicao_receita(instance), 'receitas')
+
+
+@receiver(post_delete, sender=Receita)
+def receita_post_delete(sender, instance, **kwargs):
+    _aplicar(_contribuicao_receita(instance), (None, 0), 'receitas')
+
+
+@receiver(pre_save, sender=Despesa)
+def despesa_pre_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _guardar_anterior(instance, _contribuicao_despesa)
+
+
+@receiver(post_save, sender=Despesa)
+def despesa_post_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _aplicar(getattr(instance, '_caixa_anterior', (None, 0)), _contribuicao_despesa(instance), 'despesas')
+
+
+@receiver(post_delete, sender=Despesa)
+def despesa_post_delete(sender, instance, **kwargs):
+    _aplicar(_contribuicao_despesa(instance), (None, 0), 'despesas')
+
+
+# =============================
+# Invalidação de cache (gráficos do dashboard, horários disponíveis)
+# =============================
+def invalidar_versao(sender, **kwargs):
+    invalidacao.invalidar(sender)
+
+
+for _modelo in (Agendamento, Tratamento, Cliente, Receita, Despesa, CategoriaDespesa, Produto, MovimentacaoEstoque):
+    post_save.connect(invalidar_versao, sender=_modelo, dispatch_uid=f'invalidar_versao_{_modelo.__name__}')
+    post_delete.connect(invalidar_versao, sender=_modelo, dispatch_uid=f'invalidar_versao_{_modelo.__name__}')
+
+
+@receiver(post_save, sender=Tratamento)
+def atualizar_fim_agendamentos(sender, instance, created=False, raw=False, **kwargs):
+    """Mudou a duração do tratamento: recalcula o término dos agendamentos futuros em um UPDATE."""
+    if created or raw:
+        return
+    Agendamento.objects.filter(tratamento=instance, inicio__gte=timezone.now()).update(
+        fim=F('inicio') + instance.duracao_agendamento
+    )
+
+
+# =============================
+# Foto de perfil: derivadas WebP/AVIF no upload
+# =============================
+@receiver(post_save, sender=CustomUser)
+def gerar_derivadas_foto(sender, instance, raw=False, update_fields=None, **kwargs):
+    foto = instance.profile_picture
+    if raw or not foto or (update_fields is not None and 'profile_picture' not in update_fields):
+        return
+    if imagens.descricao_arquivo(foto) is not None:
+        return
+    try:
+        imagens.gerar_arquivo(foto, imagens.LARGURAS_AVATAR)
+    except Exception:
+        # sem derivadas a página usa a original; não vale impedir o cadastro do usuário
+        logger.exception("Falha ao gerar as derivadas de %s", foto.name)
@@ -0,0 +1,22 @@
+from django import template
+
+from clinica import imagens as derivadas
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagem(origem, sizes='100vw', **atributos):
+    """
+    <picture> com srcset AVIF/WebP. `origem` é um caminho estático ('images/x.jpg')
+    ou um campo de imagem; os demais argumentos viram atributos do <img>.
+
+        {% imagem 'images/woman_01.jpg' sizes='(max-width: 991px) 100vw, 50vw' class='img-fluid' alt='...' %}
+    """
+    return derivadas.imagem(origem, sizes, **atributos)
+
+
+@register.simple_tag
+def fontes(origem, sizes='100vw', media=None):
+    """Só as <source> de `origem`, para <picture> com uma imagem por tamanho de tela."""
+    return derivadas.fontes(origem, sizes, media)
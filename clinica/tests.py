@@ -1,3 +1,931 @@
-from django.test import TestCase
+import csv
+import datetime
+import json
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import graficos, invalidacao, paginacao
+from .admin import AgendamentoAdmin
+from .importacao import ImportadorClientes
+from .models import (
+    Agendamento, Caixa, CategoriaDespesa, Cliente, ConsumoProduto, Despesa, MovimentacaoEstoque,
+    Produto, Receita, Tratamento,
+)
+
+STORAGES_TESTE = {
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+}
+
+
+class AgendamentoConcorrenteTests(TransactionTestCase):
+    """Várias reservas simultâneas para o mesmo horário: exatamente uma vence, sem clientes órfãos."""
+
+    RESERVAS_SIMULTANEAS = 8
+
+    def setUp(self):
+        self.tratamento = Tratamento.objects.create(nome_tratamento='Botox', descricao='Botox', duracao=60)
+        dia = datetime.date.today() + datetime.timedelta(days=14)
+        while dia.weekday() != 0:  # segunda-feira
+            dia += datetime.timedelta(days=1)
+        self.data_hora = f"{dia:%d/%m/%Y} 10:00"
+
+    def _reservar(self, indice, barreira, respostas):
+        try:
+            barreira.wait()
+            resposta = Client().post('/agendamento/', {
+                'nome': f'Paciente {indice}',
+                'email': f'paciente{indice}@exemplo.com',
+                'telefone': f'1199999{indice:04d}',
+                'tratamento': self.tratamento.pk,
+                'tipo_agendamento': 'AVALIACAO',
+                'data_hora': self.data_hora,
+            }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            respostas[indice] = resposta
+        finally:
+            connection.close()
+
+    def test_uma_reserva_vence_sem_orfaos(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # o SQLite em memória compartilhada devolve "table is locked" na hora, sem esperar o lock
+            self.skipTest("Requer PostgreSQL ou SQLite em arquivo (DATABASES['default']['TEST']['NAME']).")
+        barreira = threading.Barrier(self.RESERVAS_SIMULTANEAS)
+        respostas = {}
+        threads = [
+            threading.Thread(target=self._reservar, args=(i, barreira, respostas))
+            for i in range(self.RESERVAS_SIMULTANEAS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        status = sorted(r.status_code for r in respostas.values())
+        self.assertEqual(status, [200] + [409] * (self.RESERVAS_SIMULTANEAS - 1))
+        self.assertEqual(Agendamento.objects.count(), 1)
+        self.assertEqual(Cliente.objects.count(), 1)
+        self.assertEqual(Agendamento.objects.get().cliente, Cliente.objects.get())
+
+    def test_horario_ocupado_responde_409_com_alternativas(self):
+        for indice in range(2):
+            self._reservar(indice, threading.Barrier(1), respostas := {})
+        conflito = respostas[1]
+        self.assertEqual(conflito.status_code, 409)
+        self.assertEqual(conflito.json()['status'], 'conflict')
+        self.assertTrue(conflito.json()['alternativas'])
+        self.assertEqual(Cliente.objects.count(), 1)
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class AdminChangelistConsultasTests(TestCase):
+    """O número de queries de cada changelist não pode crescer com o número de linhas."""
+
+    ORCAMENTO_CONSULTAS = 12
+    CHANGELISTS = [
+        'cliente', 'tratamento', 'agendamento', 'receita', 'despesa',
+        'categoriadespesa', 'caixa', 'produto', 'movimentacaoestoque', 'customuser',
+    ]
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(self.usuario)
+        self.tratamentos = Tratamento.objects.bulk_create([
+            Tratamento(nome_tratamento=f'Tratamento {i}', descricao='-', duracao=60) for i in range(5)
+        ])
+        self.categorias = CategoriaDespesa.objects.bulk_create([
+            CategoriaDespesa(nome=f'Categoria {i}') for i in range(5)
+        ])
+        self.total = 0
+
+    def _semear(self, total):
+        """Completa cada tabela até `total` linhas."""
+        novos = range(self.total, total)
+        inicio = datetime.date(2020, 1, 1)
+        clientes = Cliente.objects.bulk_create([
+            Cliente(nome=f'Cliente {i}', telefone=f'{i}', email=f'c{i}@exemplo.com', cpf=f'{i}') for i in novos
+        ])
+        agendamentos = Agendamento.objects.bulk_create([
+            Agendamento(
+                cliente=cliente, tratamento=self.tratamentos[i % 5],
+                data=inicio + datetime.timedelta(days=i), hora=datetime.time(10),
+                tipo_agendamento='AVALIACAO',
+            )
+            for i, cliente in zip(novos, clientes)
+        ])
+        Receita.objects.bulk_create([
+            Receita(agendamento=agendamento, valor=Decimal('100'), forma_pagamento='PIX', recebido=True,
+                    data_recebimento=agendamento.data)
+            for agendamento in agendamentos
+        ])
+        Despesa.objects.bulk_create([
+            Despesa(nome_despesa=f'Despesa {i}', categoria=self.categorias[i % 5], valor=Decimal('10'),
+                    data_vencimento=inicio + datetime.timedelta(days=i))
+            for i in novos
+        ])
+        produtos = Produto.objects.bulk_create([
+            Produto(nome=f'Produto {i}', preco_custo=Decimal('1'), preco_venda=Decimal('2'), quantidade_estoque=10)
+            for i in novos
+        ])
+        MovimentacaoEstoque.objects.bulk_create([
+            MovimentacaoEstoque(produto=produto, tipo='ENTRADA', quantidade=10) for produto in produtos
+        ])
+        Caixa.objects.bulk_create([Caixa(ano=2000 + i // 12, mes=i % 12 + 1) for i in novos])
+        get_user_model().objects.bulk_create([
+            get_user_model()(username=f'usuario{i}') for i in novos
+        ])
+        self.total = total
+
+    def _consultas_por_changelist(self):
+        consultas = {}
+        for modelo in self.CHANGELISTS:
+            with CaptureQueriesContext(connection) as contexto:
+                resposta = self.client.get(f'/admin/clinica/{modelo}/')
+            self.assertEqual(resposta.status_code, 200, modelo)
+            consultas[modelo] = len(contexto)
+        return consultas
+
+    def test_changelists_com_orcamento_fixo_de_consultas(self):
+        self._semear(100)
+        com_100 = self._consultas_por_changelist()
+        self._semear(1000)
+        com_1000 = self._consultas_por_changelist()
+
+        for modelo in self.CHANGELISTS:
+            with self.subTest(modelo=modelo):
+                self.assertEqual(com_100[modelo], com_1000[modelo])
+                self.assertLessEqual(com_1000[modelo], self.ORCAMENTO_CONSULTAS)
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class LimparDadosTests(TestCase):
+    """limpar_dados: só agendamentos ativos no mesmo horário contam como duplicados."""
+
+    def test_cancelado_e_nova_reserva_no_mesmo_horario_sao_mantidos(self):
+        cliente = Cliente.objects.create(nome='Ana', telefone='11911110000', email='ana@exemplo.com')
+        tratamento = Tratamento.objects.create(nome_tratamento='Botox', descricao='Botox', duracao=60)
+        horario = {'data': datetime.date(2030, 3, 4), 'hora': datetime.time(10)}
+        cancelado = Agendamento.objects.create(
+            cliente=cliente, tratamento=tratamento, tipo_agendamento='AVALIACAO', status='CANCELADO', **horario
+        )
+        remarcado = Agendamento.objects.create(
+            cliente=cliente, tratamento=tratamento, tipo_agendamento='AVALIACAO', **horario
+        )
+
+        call_command('limpar_dados', stdout=StringIO())
+
+        self.assertEqual(list(Agendamento.objects.order_by('id').values_list('id', flat=True)),
+                         [cancelado.pk, remarcado.pk])
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class CaixaSnapshotTests(TestCase):
+    """Totais do Caixa mantidos pelos signals de Receita/Despesa e pelas ações do admin."""
+
+    def setUp(self):
+        self.janeiro = Caixa.objects.create(ano=2030, mes=1)
+        self.fevereiro = Caixa.objects.create(ano=2030, mes=2)
+        self.categoria = CategoriaDespesa.objects.create(nome='Aluguel')
+
+    def _totais(self, caixa):
+        caixa.refresh_from_db()
+        return caixa.receitas_total, caixa.despesas_total
+
+    def _receita(self, valor, data, **campos):
+        return Receita.objects.create(
+            valor=Decimal(valor), forma_pagamento='PIX', recebido=True, data_recebimento=data, **campos
+        )
+
+    def test_receita_criada_alterada_movida_e_removida(self):
+        receita = self._receita('100', datetime.date(2030, 1, 10))
+        self.assertEqual(self._totais(self.janeiro), (Decimal('100'), 0))
+
+        receita.valor = Decimal('150')
+        receita.save()
+        self.assertEqual(self._totais(self.janeiro), (Decimal('150'), 0))
+
+        receita.data_recebimento = datetime.date(2030, 2, 1)
+        receita.save()
+        self.assertEqual(self._totais(self.janeiro), (0, 0))
+        self.assertEqual(self._totais(self.fevereiro), (Decimal('150'), 0))
+
+        receita.recebido = False
+        receita.save()
+        self.assertEqual(self._totais(self.fevereiro), (0, 0))
+
+        receita.recebido = True
+        receita.save()
+        receita.delete()
+        self.assertEqual(self._totais(self.fevereiro), (0, 0))
+
+    def test_despesa_entra_so_quando_paga(self):
+        despesa = Despesa.objects.create(
+            nome_despesa='Aluguel', categoria=self.categoria, valor=Decimal('80'),
+            data_vencimento=datetime.date(2030, 1, 5),
+        )
+        self.assertEqual(self._totais(self.janeiro), (0, 0))
+
+        despesa.pago, despesa.data_pagamento = True, datetime.date(2030, 1, 6)
+        despesa.save()
+        self.assertEqual(self._totais(self.janeiro), (0, Decimal('80')))
+
+        despesa.delete()
+        self.assertEqual(self._totais(self.janeiro), (0, 0))
+
+    def test_criar_e_trocar_o_mes_recalculam_do_zero(self):
+        self._receita('100', datetime.date(2030, 3, 10))
+        self._receita('40', datetime.date(2030, 4, 10))
+        marco = Caixa.objects.create(ano=2030, mes=3)
+        self.assertEqual(self._totais(marco), (Decimal('100'), 0))
+
+        marco.mes = 4
+        marco.save(update_fields=['mes'])
+        self.assertEqual(self._totais(marco), (Decimal('40'), 0))
+
+    def test_mes_fechado_nao_muda(self):
+        self._receita('100', datetime.date(2030, 1, 10))
+        Caixa.objects.filter(pk=self.janeiro.pk).update(fechado=True)
+        self.janeiro.refresh_from_db()
+
+        self._receita('50', datetime.date(2030, 1, 11))
+        self.assertFalse(self.janeiro.recalcular())
+        self.assertEqual(self._totais(self.janeiro), (Decimal('100'), 0))
+
+    def test_fechar_mes_nao_reconta_os_ja_fechados(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+        Caixa.objects.filter(pk=self.janeiro.pk).update(fechado=True)
+
+        resposta = self.client.post('/admin/clinica/caixa/', {
+            'action': 'fechar_mes', '_selected_action': [self.janeiro.pk, self.fevereiro.pk],
+        }, follow=True)
+
+        mensagens = [str(mensagem) for mensagem in resposta.context['messages']]
+        self.assertIn("1 caixa(s) fechado(s).", mensagens)
+        self.assertIn("1 caixa(s) já estavam fechados.", mensagens)
+        self.assertEqual(Caixa.objects.filter(fechado=True).count(), 2)
+
+
+class AgendaComConsumosMixin:
+    """Agendamentos futuros com consumos de produtos, para os testes de baixa de estoque."""
+
+    def setUp(self):
+        self.tratamento = Tratamento.objects.create(nome_tratamento='Botox', descricao='Botox', duracao=60)
+        self.cliente = Cliente.objects.create(nome='Ana', telefone='11911110000', email='ana@exemplo.com')
+        self.toxina = Produto.objects.create(
+            nome='Toxina', preco_custo=Decimal('1'), preco_venda=Decimal('2'), quantidade_estoque=10
+        )
+        self.luva = Produto.objects.create(
+            nome='Luva', preco_custo=Decimal('1'), preco_venda=Decimal('2'), quantidade_estoque=10
+        )
+
+    def _agendamento(self, hora, consumos):
+        agendamento = Agendamento.objects.create(
+            cliente=self.cliente, tratamento=self.tratamento, data=datetime.date(2030, 3, 4),
+            hora=datetime.time(hora), tipo_agendamento='PROCEDIMENTO',
+        )
+        ConsumoProduto.objects.bulk_create([
+            ConsumoProduto(agendamento=agendamento, produto=produto, quantidade=quantidade)
+            for produto, quantidade in consumos
+        ])
+        return agendamento
+
+    def _estoque(self, produto):
+        produto.refresh_from_db()
+        return produto.quantidade_estoque
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class BaixaEstoqueTests(AgendaComConsumosMixin, TestCase):
+    """Conclusão de um agendamento: uma baixa por agendamento, nunca estoque negativo."""
+
+    def test_concluir_duas_vezes_baixa_uma_vez(self):
+        agendamento = self._agendamento(10, [(self.toxina, 2), (self.toxina, 1), (self.luva, 4)])
+
+        agendamento.descontar_estoque_e_concluir()
+        # outra instância (outra requisição) ainda vê o agendamento como pendente
+        Agendamento.objects.get(pk=agendamento.pk).descontar_estoque_e_concluir()
+
+        self.assertEqual((self._estoque(self.toxina), self._estoque(self.luva)), (7, 6))
+        self.assertEqual(
+            sorted(MovimentacaoEstoque.objects.filter(tipo='SAIDA').values_list('produto__nome', 'quantidade')),
+            [('Luva', 4), ('Toxina', 3)],
+        )
+        agendamento.refresh_from_db()
+        self.assertEqual((agendamento.status, agendamento.estoque_descontado), ('CONCLUIDO', True))
+
+    def test_estoque_insuficiente_desfaz_tudo(self):
+        agendamento = self._agendamento(10, [(self.toxina, 2), (self.luva, 11)])
+
+        with self.assertRaisesMessage(ValidationError, 'Estoque insuficiente para Luva'):
+            agendamento.descontar_estoque_e_concluir()
+
+        self.assertEqual((self._estoque(self.toxina), self._estoque(self.luva)), (10, 10))
+        self.assertFalse(MovimentacaoEstoque.objects.exists())
+        agendamento.refresh_from_db()
+        self.assertEqual((agendamento.status, agendamento.estoque_descontado), ('PENDENTE', False))
+
+    def test_baixar_estoque_recusa_saldo_negativo(self):
+        # quem chama baixar_estoque abre a transação que o erro desfaz
+        with self.assertRaises(ValidationError), transaction.atomic():
+            Produto.baixar_estoque({self.toxina.pk: 3, self.luva.pk: 11})
+        self.assertEqual((self._estoque(self.toxina), self._estoque(self.luva)), (10, 10))
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class ConcluirEmLoteTests(AgendaComConsumosMixin, TestCase):
+    """Fechamento do dia: cada agendamento conclui inteiro ou fica de fora, e só uma vez."""
+
+    def _concluidos(self):
+        return set(Agendamento.objects.filter(status='CONCLUIDO', estoque_descontado=True).values_list('id', flat=True))
+
+    def test_produto_em_falta_deixa_o_agendamento_inteiro_de_fora(self):
+        completo = self._agendamento(10, [(self.toxina, 2)])
+        em_falta = self._agendamento(11, [(self.toxina, 3), (self.luva, 11)])
+
+        concluidos, falhas = Agendamento.concluir_em_lote([completo.pk, em_falta.pk])
+
+        self.assertEqual(concluidos, [completo.pk])
+        self.assertIn('Estoque insuficiente para Luva', falhas[em_falta.pk])
+        # nada do agendamento em falta foi baixado, nem a toxina que havia
+        self.assertEqual((self._estoque(self.toxina), self._estoque(self.luva)), (8, 10))
+        self.assertEqual(self._concluidos(), {completo.pk})
+        self.assertEqual(MovimentacaoEstoque.objects.count(), 1)
+
+    def test_estoque_validado_pela_soma_do_lote(self):
+        primeiro = self._agendamento(10, [(self.toxina, 6)])
+        segundo = self._agendamento(11, [(self.toxina, 6)])
+
+        concluidos, falhas = Agendamento.concluir_em_lote([primeiro.pk, segundo.pk])
+
+        self.assertEqual(concluidos, [primeiro.pk])
+        self.assertIn('disponível 4, necessário 6', falhas[segundo.pk])
+        self.assertEqual(self._estoque(self.toxina), 4)
+
+    def test_falha_na_baixa_desfaz_o_lote_inteiro(self):
+        agendamentos = [self._agendamento(10, [(self.toxina, 2)]), self._agendamento(11, [(self.luva, 1)])]
+
+        with mock.patch.object(Produto, 'baixar_estoque', side_effect=ValidationError('Estoque insuficiente')):
+            with self.assertRaises(ValidationError):
+                Agendamento.concluir_em_lote([agendamento.pk for agendamento in agendamentos])
+
+        self.assertEqual(self._concluidos(), set())
+        self.assertFalse(MovimentacaoEstoque.objects.exists())
+
+    def test_agendamento_ja_concluido_nao_baixa_de_novo(self):
+        avulso = self._agendamento(10, [(self.toxina, 2)])
+        lote = self._agendamento(11, [(self.toxina, 3)])
+        avulso.descontar_estoque_e_concluir()
+
+        Agendamento.concluir_em_lote([avulso.pk, lote.pk])
+        concluidos, falhas = Agendamento.concluir_em_lote([avulso.pk, lote.pk])
+
+        self.assertEqual(concluidos, [])
+        self.assertEqual(falhas, {avulso.pk: 'Agendamento já concluído.', lote.pk: 'Agendamento já concluído.'})
+        self.assertEqual(self._estoque(self.toxina), 5)
+        self.assertEqual(MovimentacaoEstoque.objects.count(), 2)
+
+    def test_acao_do_admin_informa_concluidos_e_falhas(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+        completo = self._agendamento(10, [(self.toxina, 2)])
+        em_falta = self._agendamento(11, [(self.luva, 11)])
+
+        resposta = self.client.post('/admin/clinica/agendamento/', {
+            'action': 'concluir_agendamentos', '_selected_action': [completo.pk, em_falta.pk],
+        }, follow=True)
+
+        mensagens = [str(mensagem) for mensagem in resposta.context['messages']]
+        self.assertIn("1 agendamento(s) concluído(s) e estoque atualizado!", mensagens)
+        self.assertTrue(any(m.startswith(f"Agendamento {em_falta.pk}: Estoque insuficiente") for m in mensagens))
+        self.assertEqual(self._concluidos(), {completo.pk})
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class GerarDadosTests(TestCase):
+    """gerar_dados pode rodar de novo num banco já populado."""
+
+    def test_segunda_carga_nao_repete_contatos_e_reconcilia_o_caixa(self):
+        call_command('gerar_dados', agendamentos=400, stdout=StringIO())
+
+        call_command('gerar_dados', agendamentos=400, semente=7, stdout=StringIO())
+
+        self.assertEqual(Cliente.objects.count(), 200)
+        for caixa in Caixa.objects.all():
+            esperado = Receita.objects.filter(
+                recebido=True, data_recebimento__year=caixa.ano, data_recebimento__month=caixa.mes
+            ).aggregate(total=Sum('valor'))['total'] or 0
+            self.assertEqual(caixa.receitas_total, esperado, (caixa.ano, caixa.mes))
+
+
+@override_settings(
+    STORAGES=STORAGES_TESTE,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes'}},
+)
+class InvalidacaoCacheTests(TestCase):
+    """Gravar um model troca a versão dele, e os gráficos que dependem dele são recalculados."""
+
+    def setUp(self):
+        cache.clear()
+
+    def _produto(self, nome, quantidade):
+        return Produto.objects.create(
+            nome=nome, preco_custo=Decimal('1'), preco_venda=Decimal('2'), quantidade_estoque=quantidade,
+            estoque_minimo=5,
+        )
+
+    def test_save_e_delete_trocam_a_versao(self):
+        inicial = invalidacao.versoes(Produto, Cliente)
+        self.assertEqual(invalidacao.versoes(Produto, Cliente), inicial)
+
+        produto = self._produto('Toxina', 1)
+        depois_do_save = invalidacao.versoes(Produto, Cliente)
+        self.assertNotEqual(depois_do_save.split(';')[0], inicial.split(';')[0])
+        self.assertEqual(depois_do_save.split(';')[1], inicial.split(';')[1])
+
+        produto.delete()
+        self.assertNotEqual(invalidacao.versoes(Produto, Cliente), depois_do_save)
+
+    def test_versao_descartada_pelo_cache_nao_volta_a_anterior(self):
+        anterior = invalidacao.versoes(Produto)
+        cache.clear()
+        self.assertNotEqual(invalidacao.versoes(Produto), anterior)
+
+    def test_grafico_recalculado_depois_de_gravar(self):
+        self._produto('Toxina', 1)
+        self.assertEqual(graficos.obter('produtos-estoque-baixo', graficos.ContextoGraficos())['labels'], ['Toxina'])
+
+        with self.assertNumQueries(0):
+            graficos.obter('produtos-estoque-baixo', graficos.ContextoGraficos())
+
+        self._produto('Luva', 0)
+        dados = graficos.obter('produtos-estoque-baixo', graficos.ContextoGraficos())
+        self.assertEqual(sorted(dados['labels']), ['Luva', 'Toxina'])
+
+
+@override_settings(
+    STORAGES=STORAGES_TESTE,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes'}},
+)
+class CalendarioAdminTests(TestCase):
+    """JSON do calendário do admin: 304 só enquanto nada do que ele mostra mudou."""
+
+    URL = '/admin/dashboard/agendamentos-json/?start=2030-03-01&end=2030-04-01'
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+        self.cliente = Cliente.objects.create(nome='Ana', telefone='11911110000', email='ana@exemplo.com')
+        self.tratamento = Tratamento.objects.create(nome_tratamento='Botox', descricao='Botox', duracao=60)
+        Agendamento.objects.create(
+            cliente=self.cliente, tratamento=self.tratamento, data=datetime.date(2030, 3, 4),
+            hora=datetime.time(10), tipo_agendamento='AVALIACAO',
+        )
+
+    def _eventos(self, etag=None):
+        cabecalhos = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        resposta = self.client.get(self.URL, **cabecalhos)
+        corpo = b''.join(resposta.streaming_content) if resposta.status_code == 200 else b''
+        return resposta, corpo
+
+    def test_304_ate_renomear_cliente_ou_mudar_duracao(self):
+        resposta, corpo = self._eventos()
+        evento = json.loads(corpo)[0]
+        self.assertEqual(
+            (evento['title'], evento['start'], evento['end']),
+            ('Ana - Botox', '2030-03-04T10:00:00', '2030-03-04T11:00:00'),
+        )
+        etag = resposta['ETag']
+        self.assertEqual(self._eventos(etag)[0].status_code, 304)
+
+        self.cliente.nome = 'Ana Souza'
+        self.cliente.save()
+        resposta, corpo = self._eventos(etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(json.loads(corpo)[0]['title'], 'Ana Souza - Botox')
+
+        self.tratamento.duracao = 90
+        self.tratamento.save()
+        resposta, corpo = self._eventos(resposta['ETag'])
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(json.loads(corpo)[0]['end'], '2030-03-04T11:30:00')
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class ClientePorContatoTests(TestCase):
+    """Um cliente por telefone + e-mail normalizados (unique_cliente_contato)."""
+
+    def test_reaproveita_o_cliente_sem_alterar_o_cadastro(self):
+        cliente, criado = Cliente.obter_ou_criar_por_contato('Ana', '(11) 91111-0000', 'Ana@Exemplo.com')
+        self.assertTrue(criado)
+
+        mesmo, criado = Cliente.obter_ou_criar_por_contato('Ana Maria', '11911110000', ' ana@exemplo.com')
+
+        self.assertFalse(criado)
+        self.assertEqual(mesmo.pk, cliente.pk)
+        self.assertEqual(mesmo.nome, 'Ana')
+        self.assertEqual(Cliente.objects.count(), 1)
+
+    def test_outra_constraint_nao_e_engolida(self):
+        Cliente.objects.create(nome='Ana', telefone='11911110000', email='ana@exemplo.com', cpf='529.982.247-25')
+        with self.assertRaises(IntegrityError):
+            Cliente.obter_ou_criar_por_contato('Bia', '11922220000', 'bia@exemplo.com', cpf='529.982.247-25')
+
+    def test_admin_recusa_contato_de_outro_cliente(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+        ana = Cliente.objects.create(nome='Ana', telefone='11911110000', email='ana@exemplo.com')
+        dados = {'nome': 'Outra Ana', 'telefone': '(11)91111-0000', 'email': 'ANA@exemplo.com', 'cpf': ''}
+
+        resposta = self.client.post('/admin/clinica/cliente/add/', dados)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, 'Já existe um cliente com este telefone e e-mail.')
+        self.assertEqual(Cliente.objects.count(), 1)
+
+        # o próprio cliente pode ser salvo com o contato que já é dele
+        resposta = self.client.post(f'/admin/clinica/cliente/{ana.pk}/change/', {**dados, 'nome': 'Ana Maria'})
+        self.assertEqual(resposta.status_code, 302)
+        ana.refresh_from_db()
+        self.assertEqual(ana.nome, 'Ana Maria')
+
+
+class MesclagemClientesTests(TransactionTestCase):
+    """Duplicados gravados antes da 0017: mesclar_clientes e a própria migração os juntam."""
+
+    ANTES = ('clinica', '0016_unique_horario_sem_cancelados')
+
+    def _migrar(self, alvo):
+        executor = MigrationExecutor(connection)
+        executor.migrate([alvo])
+        return executor.loader.project_state([alvo]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes('clinica'))
+
+    def _duplicados(self, apps):
+        """Dois cadastros do mesmo contato; o mais novo tem os agendamentos, o CPF e o nascimento."""
+        Cliente = apps.get_model('clinica', 'Cliente')
+        Tratamento = apps.get_model('clinica', 'Tratamento')
+        Agendamento = apps.get_model('clinica', 'Agendamento')
+        chave = '11911110000|ana@exemplo.com'
+        antigo = Cliente.objects.create(nome='Ana', telefone='11911110000', email='ana@exemplo.com', chave_contato=chave)
+        novo = Cliente.objects.create(
+            nome='Ana M.', telefone='(11)91111-0000', email='ANA@exemplo.com', chave_contato=chave,
+            cpf='529.982.247-25', dt_nascimento=datetime.date(1990, 5, 1),
+        )
+        tratamento = Tratamento.objects.create(nome_tratamento='Botox', descricao='Botox', duracao=60)
+        for hora in (10, 11):
+            Agendamento.objects.create(
+                cliente=novo, tratamento=tratamento, data=datetime.date(2030, 3, 4), hora=datetime.time(hora),
+                tipo_agendamento='AVALIACAO',
+            )
+        return antigo.pk
+
+    def _verificar_mesclado(self, antigo_id):
+        cliente = Cliente.objects.get()
+        self.assertEqual(cliente.pk, antigo_id)
+        self.assertEqual((cliente.cpf, cliente.dt_nascimento), ('529.982.247-25', datetime.date(1990, 5, 1)))
+        self.assertEqual(Agendamento.objects.filter(cliente_id=antigo_id).count(), 2)
+
+    def test_comando_mesclar_clientes(self):
+        antigo_id = self._duplicados(self._migrar(self.ANTES))
+
+        call_command('mesclar_clientes', stdout=StringIO())
+
+        self._verificar_mesclado(antigo_id)
+
+    def test_migracao_mescla_antes_da_constraint(self):
+        antigo_id = self._duplicados(self._migrar(self.ANTES))
+
+        self._migrar(('clinica', '0017_unique_cliente_contato'))
+
+        self._verificar_mesclado(antigo_id)
+        with self.assertRaises(IntegrityError):
+            Cliente.objects.create(nome='Outra', telefone='11911110000', email='ana@exemplo.com')
+
+
+@override_settings(
+    STORAGES=STORAGES_TESTE,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes'}},
+)
+class AgendamentoHorarioOcupadoTests(TestCase):
+    """Reserva pelo site: o segundo pedido para o mesmo horário recebe 409 com horários livres próximos."""
+
+    def setUp(self):
+        cache.clear()
+        self.tratamento = Tratamento.objects.create(nome_tratamento='Botox', descricao='Botox', duracao=60)
+        self.dia = datetime.date.today() + datetime.timedelta(days=14)
+        while self.dia.weekday() != 0:  # segunda-feira, expediente das 10h às 18h
+            self.dia += datetime.timedelta(days=1)
+
+    def _reservar(self, indice):
+        return self.client.post('/agendamento/', {
+            'nome': f'Paciente {indice}',
+            'email': f'paciente{indice}@exemplo.com',
+            'telefone': f'1199999{indice:04d}',
+            'tratamento': self.tratamento.pk,
+            'tipo_agendamento': 'AVALIACAO',
+            'data_hora': f"{self.dia:%d/%m/%Y} 10:00",
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_reserva_repetida_responde_409_com_alternativas(self):
+        primeira = self._reservar(1)
+        self.assertEqual(primeira.status_code, 200)
+        self.assertEqual(primeira.json()['status'], 'success')
+
+        conflito = self._reservar(2)
+
+        self.assertEqual(conflito.status_code, 409)
+        self.assertEqual(conflito.json()['status'], 'conflict')
+        # 10:00-11:00 ocupado: as sugestões seguem a grade de 30 min a partir do fim da reserva
+        self.assertEqual(
+            conflito.json()['alternativas'],
+            [f"{self.dia:%d/%m/%Y} {hora}" for hora in ('11:00', '11:30', '12:00', '12:30', '13:00')],
+        )
+        # nada da segunda tentativa foi gravado
+        self.assertEqual(Agendamento.objects.count(), 1)
+        self.assertEqual(Cliente.objects.count(), 1)
+
+    def test_horario_tomado_depois_da_validacao_desfaz_a_reserva(self):
+        self._reservar(1)
+
+        # o formulário viu o horário livre (reserva concorrente entre a validação e a gravação):
+        # criar_agendamento detecta a sobreposição na transação e não deixa o cliente novo órfão
+        with mock.patch('clinica.forms.horario_disponivel', return_value=True):
+            conflito = self._reservar(2)
+
+        self.assertEqual(conflito.status_code, 409)
+        self.assertEqual(len(conflito.json()['alternativas']), 5)
+        self.assertEqual(list(Cliente.objects.values_list('nome', flat=True)), ['Paciente 1'])
+
+
+@override_settings(
+    STORAGES=STORAGES_TESTE,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes'}},
+)
+class AgendamentoSobreposicaoTests(TestCase):
+    """Agendamentos ocupam [inicio, fim): sobreposições são recusadas, inclusive ao aumentar a duração."""
+
+    def setUp(self):
+        cache.clear()
+        self.botox = Tratamento.objects.create(nome_tratamento='Botox', descricao='Botox', duracao=60)
+        self.limpeza = Tratamento.objects.create(nome_tratamento='Limpeza', descricao='Limpeza', duracao=60)
+        self.dia = datetime.date.today() + datetime.timedelta(days=14)
+        while self.dia.weekday() != 0:  # segunda-feira, expediente das 10h às 18h
+            self.dia += datetime.timedelta(days=1)
+        self.ana = Cliente.objects.create(nome='Ana', telefone='11911110000', email='ana@exemplo.com')
+        self.bia = Cliente.objects.create(nome='Bia', telefone='11922220000', email='bia@exemplo.com')
+
+    def _momento(self, hora, minuto=0):
+        return timezone.make_aware(datetime.datetime.combine(self.dia, datetime.time(hora, minuto)))
+
+    def _agendar(self, cliente, tratamento, hora, minuto=0):
+        return Agendamento.objects.create(
+            cliente=cliente, tratamento=tratamento, data=self.dia,
+            hora=datetime.time(hora, minuto), tipo_agendamento='AVALIACAO',
+        )
+
+    def test_sobrepostos_pelo_intervalo(self):
+        agendamento = self._agendar(self.ana, self.botox, 10)
+        self.assertEqual((agendamento.inicio, agendamento.fim), (self._momento(10), self._momento(11)))
+
+        self.assertEqual(list(Agendamento.sobrepostos(self._momento(10, 30), self._momento(11, 30))), [agendamento])
+        self.assertEqual(list(Agendamento.sobrepostos(self._momento(9), self._momento(12))), [agendamento])
+        # intervalo semiaberto: encostar no fim ou no início não é sobrepor
+        self.assertFalse(Agendamento.sobrepostos(self._momento(11), self._momento(12)).exists())
+        self.assertFalse(Agendamento.sobrepostos(self._momento(9), self._momento(10)).exists())
+
+        agendamento.status = 'CANCELADO'
+        agendamento.save()
+        self.assertFalse(Agendamento.sobrepostos(self._momento(10, 30), self._momento(11, 30)).exists())
+
+    def test_reserva_que_sobrepoe_outra_responde_409(self):
+        self._agendar(self.ana, self.botox, 10)
+
+        resposta = self.client.post('/agendamento/', {
+            'nome': 'Bia', 'email': 'bia@exemplo.com', 'telefone': '11922220000',
+            'tratamento': self.botox.pk, 'tipo_agendamento': 'AVALIACAO',
+            'data_hora': f"{self.dia:%d/%m/%Y} 10:30",
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+        self.assertEqual(resposta.status_code, 409)
+        self.assertEqual(Agendamento.objects.count(), 1)
+
+    def test_aumentar_duracao_sobre_reserva_existente_e_recusado(self):
+        primeiro = self._agendar(self.ana, self.botox, 10)
+        self._agendar(self.bia, self.limpeza, 11)
+
+        self.botox.duracao = 90
+        with self.assertRaises(ValidationError) as erro:
+            self.botox.full_clean()
+        self.assertIn('duracao', erro.exception.message_dict)
+        with self.assertRaises(ValidationError):
+            self.botox.save()
+
+        self.assertEqual(Tratamento.objects.get(pk=self.botox.pk).duracao, 60)
+        primeiro.refresh_from_db()
+        self.assertEqual(primeiro.fim, self._momento(11))
+
+    def test_aumentar_duracao_sem_conflito_recalcula_o_fim(self):
+        self._agendar(self.ana, self.botox, 10)
+        segundo = self._agendar(self.bia, self.limpeza, 11)
+
+        self.limpeza.duracao = 90
+        self.limpeza.save()
+
+        segundo.refresh_from_db()
+        self.assertEqual(segundo.fim, self._momento(12, 30))
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class PaginacaoKeysetTests(TestCase):
+    """Changelist de tabela grande: cursores ?apos/?antes em (data, id) e contagem limitada."""
+
+    URL = '/admin/clinica/agendamento/'
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+        tratamento = Tratamento.objects.create(nome_tratamento='Botox', descricao='Botox', duracao=60)
+        cliente = Cliente.objects.create(nome='Ana', telefone='11911110000', email='ana@exemplo.com')
+        # criados fora da ordem das datas: quatro empatados no mesmo dia, desempatados pelo id
+        for dia, hora in [(2, 10), (1, 10), (2, 11), (2, 12), (1, 11), (2, 13)]:
+            Agendamento.objects.create(
+                cliente=cliente, tratamento=tratamento, data=datetime.date(2030, 3, dia),
+                hora=datetime.time(hora), tipo_agendamento='AVALIACAO',
+            )
+        self.ordem = list(Agendamento.objects.order_by('-data', '-pk').values_list('pk', flat=True))
+
+    def _pagina(self, url):
+        changelist = self.client.get(url).context['cl']
+        return [obj.pk for obj in changelist.result_list], changelist
+
+    def test_cursores_percorrem_e_voltam_sem_repetir_nem_pular(self):
+        with mock.patch.object(AgendamentoAdmin, 'list_per_page', 3):
+            primeira, cl = self._pagina(self.URL)
+            self.assertEqual(primeira, self.ordem[:3])
+            self.assertIsNone(cl.url_anterior)
+            self.assertIsNone(cl.url_inicio)
+
+            # a página vira no meio dos quatro empatados em 02/03
+            segunda, cl = self._pagina(self.URL + cl.url_proxima)
+            self.assertEqual(segunda, self.ordem[3:])
+            # 6 linhas / 3 por página: a última página cheia não oferece uma próxima vazia
+            self.assertIsNone(cl.url_proxima)
+            self.assertEqual(cl.url_inicio, '?')
+
+            volta, cl = self._pagina(self.URL + cl.url_anterior)
+            self.assertEqual(volta, primeira)
+            self.assertIsNone(cl.url_anterior)
+            self.assertIsNotNone(cl.url_proxima)
+
+    def test_pagina_do_meio_tem_os_dois_cursores(self):
+        with mock.patch.object(AgendamentoAdmin, 'list_per_page', 2):
+            _, cl = self._pagina(self.URL)
+            meio, cl = self._pagina(self.URL + cl.url_proxima)
+            self.assertEqual(meio, self.ordem[2:4])
+            self.assertIsNotNone(cl.url_anterior)
+            self.assertIsNotNone(cl.url_proxima)
+            volta, _ = self._pagina(self.URL + cl.url_anterior)
+            self.assertEqual(volta, self.ordem[:2])
+
+    def test_cursor_invalido_nao_quebra_a_pagina(self):
+        resposta = self.client.get(self.URL + '?apos=ontem,1')
+        self.assertEqual(resposta.status_code, 302)
+
+    def test_contagem_estimada_no_sqlite_conta_ate_o_limite(self):
+        consulta = Agendamento.objects.all()
+        self.assertEqual(paginacao.contagem_estimada(consulta, limite=10), (6, True))
+        self.assertEqual(paginacao.contagem_estimada(consulta, limite=6), (6, True))
+        self.assertEqual(paginacao.contagem_estimada(consulta, limite=4), (4, False))
+
+        _, cl = self._pagina(self.URL)
+        self.assertEqual(cl.result_count, 6)
+        self.assertFalse(cl.contagem_limitada)
+
+        with mock.patch('clinica.paginacao.contagem_estimada', return_value=(4, False)):
+            resposta = self.client.get(self.URL)
+        self.assertTrue(resposta.context['cl'].contagem_limitada)
+        self.assertContains(resposta, 'mais de 4')
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class ImportarCsvTests(TestCase):
+    """manage.py importar: relatório de erros, conflito no banco linha a linha, checkpoint e término recalculado."""
+
+    CABECALHO = 'nome;telefone;email;cpf\n'
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = pasta.name
+
+    def _csv(self, nome, conteudo):
+        caminho = os.path.join(self.pasta, nome)
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(conteudo)
+        return caminho
+
+    def _importar(self, *args):
+        saida = StringIO()
+        call_command('importar', *args, stdout=saida)
+        return saida.getvalue()
+
+    def _relatorio(self, caminho):
+        with open(f'{caminho}.erros.csv', encoding='utf-8-sig', newline='') as arquivo:
+            return list(csv.reader(arquivo, delimiter=';'))
+
+    def test_linha_invalida_vai_para_o_relatorio(self):
+        caminho = self._csv('clientes.csv', self.CABECALHO + (
+            'Ana;11911110000;ana@exemplo.com;529.982.247-25\n'
+            'Bia;11922220000;bia@exemplo.com;111.111.111-11\n'
+        ))
+
+        saida = self._importar('clientes', caminho)
+
+        self.assertIn('1 criados, 0 atualizados, 1 linhas com erro', saida)
+        self.assertEqual(list(Cliente.objects.values_list('nome', flat=True)), ['Ana'])
+        self.assertEqual(self._relatorio(caminho), [
+            ['linha', 'erro', 'nome', 'telefone', 'email', 'cpf'],
+            ['3', 'cpf: CPF inválido.', 'Bia', '11922220000', 'bia@exemplo.com', '111.111.111-11'],
+        ])
+
+    def test_conflito_no_banco_refaz_o_lote_linha_a_linha(self):
+        caminho = self._csv('clientes.csv', self.CABECALHO + (
+            'Ana;11911110000;ana@exemplo.com;\n'
+            'Bia;11922220000;bia@exemplo.com;\n'
+            'Cris;11933330000;cris@exemplo.com;\n'
+        ))
+        gravar_em_lote = Cliente.objects.bulk_create
+
+        def bulk_create(clientes, *args, **kwargs):
+            # cadastro concorrente gravado depois da consulta do lote: só o banco percebe
+            if any(cliente.email == 'bia@exemplo.com' for cliente in clientes):
+                raise IntegrityError('UNIQUE constraint failed: clinica_cliente.chave_contato')
+            return gravar_em_lote(clientes, *args, **kwargs)
+
+        with mock.patch.object(Cliente.objects, 'bulk_create', side_effect=bulk_create):
+            saida = self._importar('clientes', caminho)
+
+        self.assertIn('2 criados, 0 atualizados, 1 linhas com erro', saida)
+        self.assertEqual(sorted(Cliente.objects.values_list('nome', flat=True)), ['Ana', 'Cris'])
+        linha, erro = self._relatorio(caminho)[1][:2]
+        self.assertEqual(linha, '3')
+        self.assertTrue(erro.startswith('Conflito no banco:'))
+
+    def test_retoma_do_checkpoint_depois_de_uma_interrupcao(self):
+        caminho = self._csv('clientes.csv', self.CABECALHO + ''.join(
+            f'Paciente {i};1199999{i:04d};paciente{i}@exemplo.com;\n' for i in range(5)
+        ) + 'Sem contato;;;\n')
+        processar = ImportadorClientes.processar
+        lotes = []
+
+        def processar_e_cair(importador, registros):
+            lotes.append(registros)
+            if len(lotes) == 2:
+                raise KeyboardInterrupt
+            return processar(importador, registros)
+
+        with mock.patch.object(ImportadorClientes, 'processar', processar_e_cair):
+            with self.assertRaises(KeyboardInterrupt):
+                self._importar('clientes', caminho, '--chunk-size', '2')
+        self.assertEqual(Cliente.objects.count(), 2)
+
+        saida = self._importar('clientes', caminho, '--chunk-size', '2')
+
+        self.assertIn('Retomando após 2 linhas.', saida)
+        self.assertIn('clientes: 5 criados, 0 atualizados, 1 linhas com erro', saida)
+        self.assertEqual(Cliente.objects.count(), 5)
+        # o relatório continua o da primeira execução: um cabeçalho só
+        relatorio = self._relatorio(caminho)
+        self.assertEqual([linha[0] for linha in relatorio], ['linha', '7'])
+        with open(f'{caminho}.checkpoint.json') as arquivo:
+            self.assertEqual(json.load(arquivo)['registros'], 6)
+
+        self.assertIn('já foi importado', self._importar('clientes', caminho))
+
+    def test_importar_tratamento_recalcula_o_fim_dos_agendamentos_futuros(self):
+        tratamento = Tratamento.objects.create(nome_tratamento='Botox', descricao='Botox', duracao=60)
+        cliente = Cliente.objects.create(nome='Ana', telefone='11911110000', email='ana@exemplo.com')
+        dia = datetime.date.today() + datetime.timedelta(days=14)
+        futuro = Agendamento.objects.create(
+            cliente=cliente, tratamento=tratamento, data=dia, hora=datetime.time(10), tipo_agendamento='AVALIACAO',
+        )
+        caminho = self._csv('tratamentos.csv', 'nome_tratamento;descricao;duracao\nBotox;Botox;90\n')
+
+        saida = self._importar('tratamentos', caminho)
+
+        self.assertIn('0 criados, 1 atualizados, 0 linhas com erro', saida)
+        futuro.refresh_from_db()
+        self.assertEqual(futuro.fim - futuro.inicio, datetime.timedelta(minutes=90))
@@ -5,4 +5,5 @@ urlpatterns = [
     path('', index, name='index'),  # Alteração aqui
     path('tratamento/', tratamento, name='tratamentos'),
     path('agendamento/', agendamento, name='agendamento'),
+    path('agendamento/horarios/', horarios_disponiveis, name='horarios_disponiveis'),
 ]
@@ -1,68 +1,131 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
-from django.core.exceptions import ValidationError
-from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, ExtractYear
-from datetime import datetime as dt, timedelta, date
-from django.db.models import Sum, Count, F
-from django.http import JsonResponse
+from django.contrib.auth.views import redirect_to_login
+from django.urls import reverse
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from datetime import timedelta
+from django.db.models import Sum, Count, Max
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.template.loader import get_template, render_to_string
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import condition
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.cache import add_never_cache_headers, patch_cache_control
 from django.contrib import messages
-from dateutil.relativedelta import relativedelta
-import datetime
-from .models import *
-
-
+import functools
+import hashlib
+import hmac
+import json
+import logging
+import os
 import urllib.parse
 
 from .models import (
     Agendamento, Cliente, Tratamento,
-    Receita, Despesa, Caixa, Produto, ConsumoProduto
+    Receita, Despesa,
 )
 from .forms import AgendamentoForm, ClienteForm
+from . import graficos, disponibilidade, invalidacao, metricas
 
+logger = logging.getLogger(__name__)
+
+
+# =============================
+# Páginas públicas (home e catálogo)
+# =============================
+# O HTML renderizado fica em cache por versão de Tratamento (invalidada pelos
+# signals a cada save/delete); a mesma versão vira o ETag, então visitas
+# repetidas não tocam no banco nem no template e o proxy/navegador pode
+# revalidar com 304.
+PAGINAS_MAX_AGE = 300
+PAGINAS_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+@functools.lru_cache(maxsize=None)
+def _assinatura_template(nome):
+    # muda a cada deploy que altera o template ou os estáticos (URLs com hash do manifest),
+    # mesmo com a versão de Tratamento igual
+    modificado = int(os.path.getmtime(get_template(nome).origin.name))
+    return f"{modificado}:{getattr(staticfiles_storage, 'manifest_hash', '')}"
 
-def index(request):
-    nomes_tratamentos_destaque = [
-        'Harmonização Facial',
-        'Botox',
-        'Rinomodelação',
-        'Peeling',
-        'Microagulhamento',
-        'Fios de PDO',
-        'Bioestimulador de Colágeno'
-    ]
 
-    tratamentos_destaque = list(Tratamento.objects.filter(nome_tratamento__in=nomes_tratamentos_destaque))
+def _etag_pagina(request, nome):
+    if not hasattr(request, '_etag_pagina'):
+        chave = f"{nome}|{_assinatura_template(nome)}|{invalidacao.versoes(Tratamento)}"
+        request._etag_pagina = hashlib.md5(chave.encode()).hexdigest()
+    return request._etag_pagina
+
+
+def _pagina_publica(request, nome, contexto):
+    """Responde com `nome` renderizado uma vez por versão; `contexto` só é chamado num cache miss."""
+    chave = f"pagina:{_etag_pagina(request, nome)}"
+    html = cache.get(chave)
+    if html is None:
+        # sem request: nada específico do visitante pode ir para o cache
+        html = render_to_string(nome, contexto())
+        cache.set(chave, html, PAGINAS_CACHE_TIMEOUT)
+    response = HttpResponse(html)
+    patch_cache_control(response, public=True, max_age=PAGINAS_MAX_AGE)
+    return response
+
+
+def _contexto_index():
+    tratamentos_destaque = list(Tratamento.em_destaque())
 
     meio = len(tratamentos_destaque) // 2
-    col1 = tratamentos_destaque[:meio]
-    col2 = tratamentos_destaque[meio:]
+    return {
+        'coluna1': tratamentos_destaque[:meio],
+        'coluna2': tratamentos_destaque[meio:],
+    }
+
 
-    return render(request, 'index.html', {
-        'coluna1': col1,
-        'coluna2': col2,
-    })
+@condition(etag_func=lambda request: _etag_pagina(request, 'index.html'))
+def index(request):
+    return _pagina_publica(request, 'index.html', _contexto_index)
 
 
+@condition(etag_func=lambda request: _etag_pagina(request, 'tratamentos.html'))
 def tratamento(request):
-    tratamentos = Tratamento.objects.all()  # Busca todos os tratamentos
-    return render(request, 'tratamentos.html', {'tratamentos': tratamentos})
+    return _pagina_publica(request, 'tratamentos.html', lambda: {'tratamentos': Tratamento.objects.all()})
 
 
 def criar_agendamento(cliente_form, agendamento_form):
-    """Cria agendamento, valida estoque e gera link WhatsApp"""
-    cliente = cliente_form.save()
+    """
+    Cria (ou reaproveita) o cliente + agendamento em uma única transação e gera link WhatsApp.
+    Se o horário foi ocupado por outra reserva concorrente, desfaz tudo (nenhum
+    Cliente órfão fica para trás) e lança disponibilidade.HorarioIndisponivel.
+    """
     data_hora = agendamento_form.cleaned_data['data_hora']
     tratamento = agendamento_form.cleaned_data['tratamento']
     tipo_agendamento = agendamento_form.cleaned_data['tipo_agendamento']
+    data_hora_local = timezone.localtime(data_hora)
 
-    # Criar agendamento (sem ainda mexer no estoque)
-    agendamento_obj = Agendamento.objects.create(
-        cliente=cliente,
-        tratamento=tratamento,
-        data=data_hora.date(),
-        hora=data_hora.time(),
-        tipo_agendamento=tipo_agendamento,
-        status='PENDENTE'
-    )
+    with transaction.atomic():
+        # a primeira escrita já serializa reservas concorrentes no SQLite;
+        # no PostgreSQL a exclusion constraint garante a mesma coisa no INSERT
+        cliente, _ = Cliente.obter_ou_criar_por_contato(**cliente_form.cleaned_data)
+
+        if Agendamento.sobrepostos(data_hora, data_hora + tratamento.duracao_agendamento).exists():
+            raise disponibilidade.HorarioIndisponivel(data_hora, tratamento)
+
+        # Criar agendamento (sem ainda mexer no estoque)
+        try:
+            with transaction.atomic():
+                agendamento_obj = Agendamento.objects.create(
+                    cliente=cliente,
+                    tratamento=tratamento,
+                    data=data_hora_local.date(),
+                    hora=data_hora_local.time(),
+                    tipo_agendamento=tipo_agendamento,
+                    status='PENDENTE'
+                )
+        except IntegrityError:
+            # unique_horario / unique_cliente_horario / agendamento_sem_sobreposicao
+            raise disponibilidade.HorarioIndisponivel(data_hora, tratamento)
 
     # Mensagem automática do WhatsApp
     nome_tratamento = agendamento_obj.tratamento.nome_tratamento
@@ -84,6 +147,61 @@ def criar_agendamento(cliente_form, agendamento_form):
     return agendamento_obj, link_whatsapp
 
 
+def horarios_disponiveis(request):
+    """
+    JSON com os horários de início livres por dia para um tratamento:
+    ?tratamento=<id>&inicio=AAAA-MM-DD&fim=AAAA-MM-DD. Usado pelo seletor de data/hora
+    para bloquear horários já ocupados antes do envio do formulário.
+    """
+    try:
+        tratamento = Tratamento.objects.only('id', 'duracao').get(pk=request.GET.get('tratamento'))
+    except (Tratamento.DoesNotExist, ValueError, TypeError):
+        return JsonResponse({'status': 'error', 'message': 'Tratamento inválido.'}, status=400)
+
+    hoje = timezone.localdate()
+    try:
+        inicio = parse_date(request.GET.get('inicio') or '') or hoje
+        fim = parse_date(request.GET.get('fim') or '') or inicio + timedelta(days=30)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Período inválido.'}, status=400)
+    inicio = max(inicio, hoje)
+    fim = min(fim, inicio + timedelta(days=disponibilidade.MAX_DIAS_CONSULTA - 1))
+
+    chave = f"disponibilidade:{disponibilidade.versao_cache()}:{tratamento.pk}:{inicio}:{fim}"
+    dados = cache.get(chave)
+    if dados is None:
+        agora = timezone.localtime().replace(tzinfo=None)
+        livres = disponibilidade.horarios_livres(inicio, fim, tratamento, agora=agora)
+        dados = {
+            'tratamento': tratamento.pk,
+            'duracao': int(disponibilidade.duracao_tratamento(tratamento).total_seconds() // 60),
+            'dias': {
+                dia.isoformat(): [hora.strftime('%H:%M') for hora in horas]
+                for dia, horas in livres.items()
+            },
+        }
+        cache.set(chave, dados, disponibilidade.CACHE_TIMEOUT)
+
+    response = JsonResponse(dados)
+    patch_cache_control(response, max_age=30)
+    return response
+
+
+MENSAGEM_HORARIO_OCUPADO = "Este horário já foi reservado. Por favor, escolha outro horário."
+
+
+def _conflito_horario_json(data_hora, tratamento):
+    """409 com sugestões de horários livres próximos ao pedido."""
+    alternativas = [
+        h.strftime('%d/%m/%Y %H:%M')
+        for h in disponibilidade.proximos_horarios_livres(data_hora, tratamento)
+    ]
+    return JsonResponse(
+        {'status': 'conflict', 'message': MENSAGEM_HORARIO_OCUPADO, 'alternativas': alternativas},
+        status=409
+    )
+
+
 def agendamento(request):
     if request.method == 'POST':
         cliente_form = ClienteForm(request.POST)
@@ -91,7 +209,9 @@ def agendamento(request):
 
         if cliente_form.is_valid() and agendamento_form.is_valid():
             try:
-                agendamento_obj, link_whatsapp = criar_agendamento(cliente_form, agendamento_form)
+                with metricas.duracao_views.cronometrar(view='criar_agendamento'):
+                    agendamento_obj, link_whatsapp = criar_agendamento(cliente_form, agendamento_form)
+                metricas.agendamentos_criados.inc(tipo=agendamento_obj.tipo_agendamento)
                 messages.success(request, "Agendamento criado com sucesso!")
 
                 if request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -99,11 +219,27 @@ def agendamento(request):
                 else:
                     return redirect(link_whatsapp)
 
-            except Exception as e:
-                messages.error(request, f"Erro ao salvar o agendamento: {e}")
+            except disponibilidade.HorarioIndisponivel as e:
+                metricas.agendamentos_conflitos.inc(origem='concorrencia')
+                messages.error(request, MENSAGEM_HORARIO_OCUPADO)
                 if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-                    return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+                    return _conflito_horario_json(e.data_hora, e.tratamento)
+
+            except Exception:
+                logger.exception("Erro ao salvar o agendamento")
+                metricas.agendamentos_erros.inc()
+                messages.error(request, "Erro ao salvar o agendamento. Tente novamente.")
+                if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                    return JsonResponse({'status': 'error', 'message': 'Erro ao salvar o agendamento. Tente novamente.'}, status=500)
+        elif agendamento_form.has_error(NON_FIELD_ERRORS, 'horario_indisponivel') and \
+                request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            metricas.agendamentos_conflitos.inc(origem='formulario')
+            return _conflito_horario_json(
+                agendamento_form.cleaned_data['data_hora'], agendamento_form.cleaned_data['tratamento']
+            )
         else:
+            if agendamento_form.has_error(NON_FIELD_ERRORS, 'horario_indisponivel'):
+                metricas.agendamentos_conflitos.inc(origem='formulario')
             errors = {}
             for form in [cliente_form, agendamento_form]:
                 if form.errors:
@@ -127,7 +263,8 @@ def concluir_agendamento(request, agendamento_id):
     try:
         agendamento = Agendamento.objects.get(id=agendamento_id)
         try:
-            agendamento.descontar_estoque_e_concluir()
+            with metricas.duracao_views.cronometrar(view='concluir_agendamento'):
+                agendamento.descontar_estoque_e_concluir()
             messages.success(request, "Agendamento concluído e estoque atualizado!")
         except ValidationError as e:
             messages.error(request, str(e))
@@ -136,23 +273,87 @@ def concluir_agendamento(request, agendamento_id):
     return redirect("admin:clinica_agendamento_changelist")
 
 
-def admin_agendamentos_json(request):
-    """Endpoint JSON para calendário do admin"""
+def _periodo_calendario(request):
+    """Converte os parâmetros ?start=&end= do FullCalendar em datas (fim exclusivo)."""
+    def _parse(valor):
+        if not valor:
+            return None
+        valor = valor.replace(' ', '+')  # o '+' do offset chega como espaço na query string
+        data_hora = parse_datetime(valor)
+        if data_hora is not None:
+            return data_hora.date()
+        return parse_date(valor[:10])
+
+    try:
+        return _parse(request.GET.get('start')), _parse(request.GET.get('end'))
+    except ValueError:
+        return None, None
+
+
+def _agendamentos_calendario(request):
+    inicio, fim = _periodo_calendario(request)
     agendamentos = Agendamento.objects.all()
-    eventos = []
+    if inicio:
+        agendamentos = agendamentos.filter(data__gte=inicio)
+    if fim:
+        agendamentos = agendamentos.filter(data__lt=fim)
+    return agendamentos
+
+
+def _versao_calendario(request):
+    """Total e último updated_at da janela pedida — calculado uma única vez por request."""
+    if not hasattr(request, '_versao_calendario'):
+        request._versao_calendario = _agendamentos_calendario(request).order_by().aggregate(
+            total=Count('id'), ultima_alteracao=Max('updated_at')
+        )
+    return request._versao_calendario
+
+
+def _etag_calendario(request):
+    versao = _versao_calendario(request)
+    ultima = versao['ultima_alteracao']
+    # os eventos também mostram o nome do cliente e do tratamento: renomear um deles
+    # não muda o updated_at do agendamento, só a versão do model
+    chave = (
+        f"{request.GET.get('start', '')}|{request.GET.get('end', '')}|{versao['total']}|"
+        f"{ultima.isoformat() if ultima else ''}|{invalidacao.versoes(Cliente, Tratamento)}"
+    )
+    return hashlib.md5(chave.encode()).hexdigest()
+
 
-    for ag in agendamentos:
-        start = dt.combine(ag.data, ag.hora)
-        end = start + (ag.tratamento.duracao_timedelta if ag.tratamento else timedelta(hours=1))
-        eventos.append({
-            'title': f'{ag.cliente.nome} - {ag.tratamento.nome_tratamento}',
-            'start': start.isoformat(),
-            'end': end.isoformat(),
-            'extendedProps': {'tipo': ag.tipo_agendamento.upper()},
-            'color': '#f39c12' if ag.tipo_agendamento.upper() == 'AVALIACAO' else '#27ae60'
-        })
+def _last_modified_calendario(request):
+    return _versao_calendario(request)['ultima_alteracao']
 
-    return JsonResponse(eventos, safe=False)
+
+@condition(etag_func=_etag_calendario, last_modified_func=_last_modified_calendario)
+def admin_agendamentos_json(request):
+    """Endpoint JSON para calendário do admin (somente a janela visível, em uma única query)"""
+    # início/término gravados no agendamento (o término acompanha a duração do tratamento
+    # pelo signal atualizar_fim_agendamentos), no horário local como antes
+    agendamentos = _agendamentos_calendario(request).order_by('data', 'hora').values_list(
+        'inicio', 'fim', 'tipo_agendamento', 'cliente__nome', 'tratamento__nome_tratamento',
+    )
+
+    def _local(valor):
+        return timezone.localtime(valor).replace(tzinfo=None).isoformat()
+
+    def eventos():
+        yield '['
+        separador = ''
+        for inicio, fim, tipo, cliente_nome, tratamento_nome in agendamentos.iterator(chunk_size=500):
+            tipo = tipo.upper()
+            evento = {
+                'title': f'{cliente_nome} - {tratamento_nome}',
+                'start': _local(inicio),
+                'end': _local(fim),
+                'extendedProps': {'tipo': tipo},
+                'color': '#f39c12' if tipo == 'AVALIACAO' else '#27ae60'
+            }
+            yield separador + json.dumps(evento, separators=(',', ':'), ensure_ascii=False)
+            separador = ','
+        yield ']'
+
+    return StreamingHttpResponse(eventos(), content_type='application/json')
 
 
 def admin_index(request):
@@ -174,185 +375,133 @@ def admin_index(request):
 # GRAFICOS
 # ============================= #
 
+def _grafico_json(nome, request, **kwargs):
+    with metricas.duracao_views.cronometrar(view=f'grafico:{nome}'):
+        return JsonResponse(graficos.obter(nome, graficos.ContextoGraficos(request), **kwargs))
+
+
+def dashboard_bundle(request):
+    """
+    Calcula vários gráficos em um único request: ?charts=a,b,c (sem o parâmetro, todos).
+    Os gráficos vêm do cache; os ausentes compartilham o mesmo ContextoGraficos,
+    então consultas em comum rodam uma vez.
+    """
+    parametro = request.GET.get('charts', '')
+    nomes = [n.strip() for n in parametro.split(',') if n.strip()] or list(graficos.GRAFICOS)
+    desconhecidos = [n for n in nomes if n not in graficos.GRAFICOS]
+    if desconhecidos:
+        return JsonResponse({'status': 'error', 'message': f"Gráficos desconhecidos: {', '.join(desconhecidos)}"}, status=400)
+
+    with metricas.duracao_views.cronometrar(view='dashboard_bundle'):
+        return JsonResponse(graficos.obter_varios(nomes, graficos.ContextoGraficos(request)))
+
+
 # AGENDAMENTOS
 def agendamentos_por_tratamento(request):
-    data = Agendamento.objects.values('tratamento__nome_tratamento') \
-        .annotate(count=Count('id')) \
-        .order_by('-count')
-    labels = [item['tratamento__nome_tratamento'] for item in data]
-    counts = [item['count'] for item in data]
-    return JsonResponse({'labels': labels, 'counts': counts})
+    return _grafico_json('agendamentos-por-tratamento', request)
 
 def agendamentos_por_periodo(request, periodo='dia'):
-    if periodo == 'dia':
-        trunc = TruncDay('data')
-    elif periodo == 'semana':
-        trunc = TruncWeek('data')
-    else:
-        trunc = TruncMonth('data')
-
-    data = Agendamento.objects.annotate(period=trunc) \
-        .values('period') \
-        .annotate(count=Count('id')) \
-        .order_by('period')
-    labels = [item['period'].strftime('%d/%m/%Y') for item in data]
-    counts = [item['count'] for item in data]
-    return JsonResponse({'labels': labels, 'counts': counts})
+    return _grafico_json('agendamentos-por-periodo', request, periodo=periodo)
 
 def clientes_com_mais_agendamentos(request):
-    data = Agendamento.objects.values('cliente__nome') \
-        .annotate(count=Count('id')) \
-        .order_by('-count')[:10]
-    labels = [item['cliente__nome'] for item in data]
-    counts = [item['count'] for item in data]
-    return JsonResponse({'labels': labels, 'counts': counts})
+    return _grafico_json('clientes-mais-agendamentos', request)
 
 # FINANCEIRO
 def receitas_despesas_por_mes(request):
-    hoje = datetime.date.today()
-    meses = [hoje - datetime.timedelta(days=30*i) for i in range(5,-1,-1)]
-    labels = [m.strftime("%b/%Y") for m in meses]
-
-    receitas_data = [Receita.objects.filter(data_recebimento__month=m.month, data_recebimento__year=m.year)
-                     .aggregate(total=Sum('valor'))['total'] or 0 for m in meses]
-    despesas_data = [Despesa.objects.filter(data_vencimento__month=m.month, data_vencimento__year=m.year)
-                     .aggregate(total=Sum('valor'))['total'] or 0 for m in meses]
-
-    return JsonResponse({'labels': labels, 'receitas': receitas_data, 'despesas': despesas_data})
+    return _grafico_json('receitas-despesas-por-mes', request)
 
 def receita_acumulada_vs_despesa(request):
-    hoje = datetime.date.today()
-    meses = [hoje - datetime.timedelta(days=30*i) for i in range(5,-1,-1)]
-    labels = [m.strftime("%b/%Y") for m in meses]
-    receitas_acum = []
-    despesas_acum = []
-    r_total = 0
-    d_total = 0
-    for m in meses:
-        r = Receita.objects.filter(data_recebimento__month=m.month, data_recebimento__year=m.year)\
-            .aggregate(total=Sum('valor'))['total'] or 0
-        d = Despesa.objects.filter(data_vencimento__month=m.month, data_vencimento__year=m.year)\
-            .aggregate(total=Sum('valor'))['total'] or 0
-        r_total += r
-        d_total += d
-        receitas_acum.append(r_total)
-        despesas_acum.append(d_total)
-
-    return JsonResponse({'labels': labels, 'receitas': receitas_acum, 'despesas': despesas_acum})
+    return _grafico_json('receita-acumulada-vs-despesa', request)
 
 def despesas_por_categoria(request):
-    data = Despesa.objects.values('categoria__nome').annotate(total=Sum('valor'))
-    labels = [item['categoria__nome'] for item in data]
-    totals = [item['total'] for item in data]
-    return JsonResponse({'labels': labels, 'totals': totals})
+    return _grafico_json('despesas-por-categoria', request)
 
 def receitas_por_tipo_pagamento(request):
-    data = Receita.objects.values('forma_pagamento').annotate(total=Sum('valor'))
-    labels = [item['forma_pagamento'] for item in data]
-    totals = [item['total'] for item in data]
-    return JsonResponse({'labels': labels, 'totals': totals})
+    return _grafico_json('receitas-por-tipo-pagamento', request)
 
 #ESTOQUE & PRODUTOS
 def movimentacao_estoque(request):
-    hoje = datetime.date.today()
-    meses = [hoje - datetime.timedelta(days=30*i) for i in range(5,-1,-1)]
-    labels = [m.strftime("%b/%Y") for m in meses]
-    entradas = []
-    saidas = []
-    for m in meses:
-        ent = MovimentacaoEstoque.objects.filter(tipo='entrada', data__month=m.month, data__year=m.year)\
-            .aggregate(total=Sum('quantidade'))['total'] or 0
-        sai = MovimentacaoEstoque.objects.filter(tipo='saida', data__month=m.month, data__year=m.year)\
-            .aggregate(total=Sum('quantidade'))['total'] or 0
-        entradas.append(ent)
-        saidas.append(sai)
-    return JsonResponse({'labels': labels, 'entradas': entradas, 'saidas': saidas})
+    return _grafico_json('movimentacao-estoque', request)
 
 def produtos_estoque_baixo_json(request):
-    produtos = Produto.objects.filter(quantidade_estoque__lte=F('estoque_minimo')).values('nome','quantidade_estoque')
-    data = {
-        'labels':[p['nome'] for p in produtos],
-        'quantidades':[p['quantidade_estoque'] for p in produtos]
-    }
-    return JsonResponse(data)
+    return _grafico_json('produtos-estoque-baixo', request)
 
 # ---------- Clientes ----------
 def clientes_por_idade_json(request):
-    hoje = date.today()
-    clientes = Cliente.objects.annotate(
-        idade=hoje.year - ExtractYear('dt_nascimento')  # corrigido para dt_nascimento
-    ).values('idade').annotate(count=Count('id')).order_by('idade')
-    
-    data = {
-        'labels': [c['idade'] for c in clientes],
-        'counts': [c['count'] for c in clientes]
-    }
-    return JsonResponse(data)
+    return _grafico_json('clientes-por-idade', request)
 
 def novos_clientes_mes_json(request):
-    hoje = date.today()
-    meses = [hoje - relativedelta(months=i) for i in range(11, -1, -1)]
-    labels = [m.strftime("%b/%Y") for m in meses]
-
-    counts = [
-        Cliente.objects.filter(created_at__year=m.year, created_at__month=m.month).count()
-        for m in meses
-    ]
-
-    return JsonResponse({'labels': labels, 'counts': counts})
+    return _grafico_json('novos-clientes-mes', request)
 
 def top_tratamentos_por_cliente_json(request):
-    agendamentos = Agendamento.objects.values('tratamento__nome_tratamento') \
-                                      .annotate(count=Count('id')) \
-                                      .order_by('-count')[:10]
-    data = {
-        'labels': [a['tratamento__nome_tratamento'] for a in agendamentos],
-        'counts': [a['count'] for a in agendamentos]
-    }
-    return JsonResponse(data)
+    return _grafico_json('top-tratamentos-por-cliente', request)
 
 # ---------- Indicadores combinados ----------
 def agendamentos_trend_json(request):
-    hoje = date.today()
-    meses = [hoje - timedelta(days=30*i) for i in range(11,-1,-1)]
-    labels = [m.strftime("%b/%Y") for m in meses]
-    counts = [Agendamento.objects.filter(data__year=m.year, data__month=m.month).count() for m in meses]
-    return JsonResponse({'labels': labels, 'counts': counts})
+    return _grafico_json('agendamentos-trend', request)
 
 def receitas_vs_a_receber_json(request):
-    hoje = date.today()
-    meses = [hoje - timedelta(days=30*i) for i in range(11,-1,-1)]
-    labels = [m.strftime("%b/%Y") for m in meses]
-    receitas = [Receita.objects.filter(data_recebimento__year=m.year, data_recebimento__month=m.month, recebido=True).aggregate(total=Sum('valor'))['total'] or 0 for m in meses]
-    a_receber = [Receita.objects.filter(data_recebimento__year=m.year, data_recebimento__month=m.month, recebido=False).aggregate(total=Sum('valor'))['total'] or 0 for m in meses]
-    return JsonResponse({'labels': labels, 'recebidas': receitas, 'a_receber': a_receber})
+    return _grafico_json('receitas-vs-a-receber', request)
 
 def saldo_caixa_json(request):
-    hoje = date.today()
-    meses = [hoje - timedelta(days=30*i) for i in range(11,-1,-1)]
-    labels = [m.strftime("%b/%Y") for m in meses]
-    saldos = []
-    for m in meses:
-        receitas = Receita.objects.filter(data_recebimento__year=m.year, data_recebimento__month=m.month, recebido=True).aggregate(total=Sum('valor'))['total'] or 0
-        despesas = Despesa.objects.filter(data_vencimento__year=m.year, data_vencimento__month=m.month, pago=True).aggregate(total=Sum('valor'))['total'] or 0
-        saldos.append(receitas - despesas)
-    return JsonResponse({'labels': labels, 'saldos': saldos})
+    return _grafico_json('saldo-caixa', request)
 
 def produtos_criticos_json(request):
-    produtos = Produto.objects.filter(
-        quantidade_estoque__lte=F('estoque_minimo')
-    ).values('nome', 'quantidade_estoque')[:10]  # top 10
-    data = {
-        'labels':[p['nome'] for p in produtos],
-        'counts':[p['quantidade_estoque'] for p in produtos]
-    }
-    return JsonResponse(data)
+    return _grafico_json('produtos-criticos', request)
 
 def taxa_cancelamento_json(request):
-    total = Agendamento.objects.count()
-    cancelados = Agendamento.objects.filter(status='cancelado').count()
-    data = {
-        'labels':['Cancelados','Ativos'],
-        'percentuais':[cancelados, total-cancelados]
-    }
-    return JsonResponse(data)
\ No newline at end of file
+    return _grafico_json('taxa-cancelamento', request)
+
+
+# ---------- Variantes assíncronas (ASGI) ----------
+# Mesmos dados dos endpoints acima; os gráficos ausentes do cache são calculados
+# em paralelo (graficos.obter_varios_async). O admin_view do Django 4.2 só
+# envolve views síncronas, então a checagem de staff é feita aqui.
+def _staff_async(view):
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_active and request.user.is_staff)():
+            return redirect_to_login(request.get_full_path(), reverse('custom_admin:login'))
+        response = await view(request, *args, **kwargs)
+        add_never_cache_headers(response)
+        return response
+    return wrapper
+
+
+@_staff_async
+async def grafico_json_async(request, nome):
+    if nome not in graficos.GRAFICOS:
+        raise Http404
+    with metricas.duracao_views.cronometrar(view=f'grafico_async:{nome}'):
+        dados = await graficos.obter_varios_async([nome], graficos.ContextoGraficos(request))
+        return JsonResponse(dados[nome])
+
+
+@_staff_async
+async def dashboard_bundle_async(request):
+    parametro = request.GET.get('charts', '')
+    nomes = [n.strip() for n in parametro.split(',') if n.strip()] or list(graficos.GRAFICOS)
+    desconhecidos = [n for n in nomes if n not in graficos.GRAFICOS]
+    if desconhecidos:
+        return JsonResponse({'status': 'error', 'message': f"Gráficos desconhecidos: {', '.join(desconhecidos)}"}, status=400)
+
+    with metricas.duracao_views.cronometrar(view='dashboard_bundle_async'):
+        return JsonResponse(await graficos.obter_varios_async(nomes, graficos.ContextoGraficos(request)))
+
+
+# =============================
+# Métricas (Prometheus)
+# =============================
+def exportar_metricas(request):
+    """
+    Métricas no formato de texto do Prometheus, somadas entre os workers.
+    Com METRICAS_TOKEN configurado exige "Authorization: Bearer <token>";
+    sem token, só fica disponível em DEBUG.
+    """
+    token = settings.METRICAS_TOKEN
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        raise Http404
+    return HttpResponse(metricas.registro.exposicao(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # <<-- importante: após SecurityMiddleware
+    'clinica.instrumentacao.InstrumentacaoMiddleware',  # tempo/queries por view (estáticos ficam de fora)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -118,9 +119,63 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # banco de teste em arquivo: o teste de reservas concorrentes usa várias
+            # conexões, e o SQLite em memória compartilhada não espera pelos locks
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 
+# ----- Cache -----
+# REDIS_URL configurado -> Redis (compartilhado entre workers e servidores; precisa do pacote redis).
+# Sem ele: memória local em desenvolvimento e arquivos em produção, para que os
+# workers do gunicorn enxerguem as mesmas entradas e as mesmas invalidações.
+# DJANGO_CACHE=dummy desliga o cache (benchmarks que medem o cálculo a frio).
+if os.environ.get('DJANGO_CACHE') == 'dummy':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }
+    }
+elif os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+elif DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('DJANGO_CACHE_DIR', os.path.join(BASE_DIR, '.cache')),
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# ----- Instrumentação (clinica/instrumentacao.py, página admin/instrumentacao/) -----
+# fração dos requests medidos (0 desliga), limite do log de requests lentos e tamanho do buffer
+INSTRUMENTACAO_AMOSTRAGEM = float(os.environ.get('INSTRUMENTACAO_AMOSTRAGEM', '1.0' if DEBUG else '0.1'))
+INSTRUMENTACAO_LIMITE_LENTO_MS = int(os.environ.get('INSTRUMENTACAO_LIMITE_LENTO_MS', '500'))
+INSTRUMENTACAO_BUFFER = int(os.environ.get('INSTRUMENTACAO_BUFFER', '5000'))
+
+# ----- Métricas (/metrics, formato Prometheus) -----
+# METRICAS_DIR: diretório compartilhado pelos workers do gunicorn (esvaziar a cada deploy);
+# sem ele, cada processo expõe só as próprias métricas. METRICAS_TOKEN protege o endpoint.
+METRICAS_DIR = os.environ.get('METRICAS_DIR')
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')
+
+# ----- Dashboard sob ASGI -----
+# DASHBOARD_ASYNC: o dashboard usa o bundle assíncrono (ligar quando servido pelo uvicorn);
+# DASHBOARD_THREADS: gráficos calculados em paralelo por processo (cada thread abre uma conexão).
+DASHBOARD_ASYNC = os.environ.get('DASHBOARD_ASYNC', '0').lower() in ('1', 'true', 'yes')
+DASHBOARD_THREADS = int(os.environ.get('DASHBOARD_THREADS', '4'))
+
 # Password validation (mantive como você tinha)
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
@@ -140,10 +195,11 @@ STATIC_URL = '/static/'
 # pasta onde collectstatic colocará todos os arquivos para o Nginx servir
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
-# WhiteNoise storage (atenção: CompressedManifest pode quebrar se faltar arquivos referenciados)
+# WhiteNoise storage (atenção: CompressedManifest pode quebrar se faltar arquivos referenciados);
+# a subclasse também gera as derivadas WebP/AVIF das imagens (clinica/imagens.py)
 STORAGES = {
     "staticfiles": {
-        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+        "BACKEND": "clinica.imagens.ImagensStaticFilesStorage",
     },
     "default": {
         "BACKEND": "django.core.files.storage.FileSystemStorage",
@@ -153,6 +209,16 @@ STORAGES = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# cache eterno também para as derivadas de imagens (derivadas/<hash do conteúdo>/...),
+# além dos nomes com hash do manifest
+WHITENOISE_IMMUTABLE_FILE_TEST = r'(\.[0-9a-f]{12}\.\w+|/derivadas/[0-9a-f]{16}/\d+\.\w+)$'
+
+
+def _avatar(usuario):
+    from clinica.imagens import url_avatar
+    return url_avatar(usuario)
+
+
 # Mensagens
 MESSAGE_TAGS = {
     messages.INFO: 'info',
@@ -169,7 +235,7 @@ JAZZMIN_SETTINGS = {
     'site_header': 'Clínica Das Árabia',
     'site_brand': 'Clínica Das Árabia',
     'site_logo': "images/CDA.png",
-    "user_avatar": "profile_picture",
+    "user_avatar": _avatar,  # derivada WebP da foto de perfil em vez da original
     'icons': {
         'auth': 'fas fa-users-cog',
         'auth.user': 'fas fa-user',
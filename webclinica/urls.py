@@ -6,6 +6,7 @@ from clinica.admin import custom_admin_site
 
 urlpatterns = [
     path('admin/dashboard/agendamentos-json/', views.admin_agendamentos_json, name='admin_agendamentos_json'),
+    path('metrics', views.exportar_metricas, name='metricas'),
     # Substitui admin.site.urls pela custom_admin_site.urls
     path('admin/', custom_admin_site.urls),
     path('', include('clinica.urls')),